@@ -1,71 +1,355 @@
-from flask import Flask, render_template, request, redirect, jsonify, make_response
-import psycopg2
-import psycopg2.extras
+from flask import Blueprint, Flask, current_app, g, render_template, request, redirect, jsonify, make_response, Response, stream_with_context, send_file
 import jwt
 import datetime
+import importlib
+import math
+import time
 from functools import wraps
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+from db_pool import get_pool
+from database import configure_database, get_database
+from config import Config
+import employees
+import exports
+import io
+import os
+import sys
+import threading
+import uuid
+from cache import DataCache, TTLCache, create_backend
+from auth import token_cache, decode_token, issue_token, dashboard_url
+from employees import EmployeeNotFound
+import fragments
+import psycopg2
+import passwords
+from passwords import HashPoolBusy
+import ratelimit
+from ratelimit import Overloaded
+import metrics
+import statements
+import http_cache
+import logging
+from logging_config import configure_logging
+
+# Imported by the views that need them (change_feed pulls in asyncio), so a cold
+# worker only pays for them once an admin or /events asks; prewarm() loads them upfront
+LAZY_MODULES = ('jobs', 'importer', 'change_feed')
+
+logger = logging.getLogger(__name__)
+access_logger = logging.getLogger('access')
+
+# Every route and request hook lives on this blueprint; create_app() builds an app around it
+bp = Blueprint('main', __name__)
+
+
+def app_config():
+    """The Config the running app was created with."""
+    return current_app.extensions['config']
 
-app = Flask(__name__)
-app.secret_key = 'your_secret_key_here'
-CORS(app, supports_credentials=True)
 
-SECRET_KEY = "super_secret_jwt_key"
+def data_cache():
+    """Versioned query results for the dashboards (backend shared across workers when configured)."""
+    return current_app.extensions['data_cache']
+
+# Columns the admin user list renders; ?fields= may only narrow this set
+USER_LIST_COLUMNS = ('id', 'username', 'role')
 
 
 # ------------------------
 # 🔹 Database connection helper
 # ------------------------
 def get_db_connection():
-    return psycopg2.connect(
-        host="localhost",
-        database="employee_db",
-        user="postgres",
-        password="123"
-    )
+    """Check out a connection from the shared pool.
+
+    Calling conn.close() returns it to the pool instead of closing the socket.
+    """
+    return get_pool().acquire()
+
+
+def release_db_connection(exc):
+    # Hand back any connection a handler left pinned to this thread
+    get_database().disconnect()
+
+
+# ------------------------
+# 🪞 Read replicas
+# ------------------------
+# Set after a write so the browser's next few requests read from the primary,
+# whichever worker process serves them
+PRIMARY_COOKIE = 'db_primary'
+
+
+@bp.before_app_request
+def start_read_routing():
+    get_database().begin_request(primary=PRIMARY_COOKIE in request.cookies)
+
+
+@bp.after_app_request
+def remember_write(response):
+    db = get_database()
+    sticky_seconds = app_config().DB_REPLICA_STICKY_SECONDS
+    if db.wrote_in_request and db.replicas is not None and sticky_seconds > 0:
+        response.set_cookie(PRIMARY_COOKIE, '1', max_age=max(1, int(sticky_seconds)),
+                            httponly=True, samesite='Lax')
+    return response
+
+
+# ------------------------
+# 📈 Request metrics
+# ------------------------
+@bp.before_app_request
+def start_request_metrics():
+    metrics.start_request()
+
+
+@bp.after_app_request
+def record_request_metrics(response):
+    # Label by route pattern (/employees/<int:id>), not the raw path, to bound cardinality
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    timing = metrics.finish_request(request.method, endpoint, response.status_code)
+    if timing:
+        elapsed, db_time, queries = timing
+        response.headers['Server-Timing'] = (
+            f'app;dur={elapsed * 1000:.1f}, db;dur={db_time * 1000:.1f};desc="{queries} queries"'
+        )
+        access_logger.info(
+            '%s %s %s %.1fms', request.method, request.path, response.status_code, elapsed * 1000,
+            extra={'sample': True, 'endpoint': endpoint, 'status': response.status_code,
+                   'duration_ms': round(elapsed * 1000, 2), 'db_ms': round(db_time * 1000, 2),
+                   'db_queries': queries},
+        )
+    return response
+
+
+# ------------------------
+# 🗜️ Response compression
+# ------------------------
+@bp.after_app_request
+def compress_response(response):
+    # Only bodies built in memory (pages, JSON). Streamed exports and files sent with
+    # send_file (downloads, static assets) pass through untouched: encoding them would
+    # read the whole file into memory on this thread. Precompress those or let the proxy do it
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or not http_cache.compressible(response.mimetype, response.content_length or 0,
+                                           app_config().COMPRESS_MIN_SIZE)):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = http_cache.choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    response.set_data(http_cache.compress(response.get_data(), encoding, app_config().COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # The encoded bytes differ from the original, so a strong validator no longer holds
+        response.set_etag(etag, weak=True)
+    return response
+
+
+for _stat in ('size', 'in_use', 'idle', 'waiting'):
+    metrics.registry.register(metrics.Gauge(
+        f'db_pool_{_stat}', f'Connection pool {_stat.replace("_", " ")} connections',
+        lambda stat=_stat: get_database().pool.stats()[stat]))
+
+
+def feed_subscribers():
+    # Until an /events request imports change_feed no stream can be open
+    change_feed = sys.modules.get('change_feed')
+    return change_feed.get_feed(app_config()).stats()['subscribers'] if change_feed else 0
+
+
+metrics.registry.register(metrics.Gauge('change_feed_subscribers', 'Open /events streams', feed_subscribers))
+
+
+@bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@bp.route('/pool/stats', methods=['GET'])
+def pool_stats():
+    db = get_database()
+    data = db.pool.stats()
+    if db.replicas is not None:
+        data['replicas'] = db.replicas.stats()
+    return jsonify({'success': True, 'data': data})
+
+
+def table_version(table):
+    """The table_versions version @conditional read for this request, or None.
+
+    Part of every data_cache key a conditional view reads: the per-process
+    cache versions of another worker (or a bump() that has not run yet) could
+    otherwise serve a page older than the ETag it goes out with.
+    """
+    return g.get('table_versions', {}).get(table)
+
+
+def users_versioned():
+    # users.row_version (migration 0009) keys the dashboards' cached fragments;
+    # without it rows are loaded as before and rendered uncached
+    return 'row_version' in get_database().get_table_columns('users')
+
+
+def get_user_by_username(username):
+    """Fetch a users row, served from data_cache when possible."""
+    def load():
+        query = statements.USER_BY_USERNAME_VERSIONED if users_versioned() else statements.USER_BY_USERNAME
+        user = get_database().fetch_one(query, (username,))
+        return dict(user) if user else None
+    return data_cache().get_or_load('users', 'by_username', table_version('users'), username, loader=load)
+
+
+@bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    fragment_cache = current_app.jinja_env.fragment_cache
+    return jsonify({'success': True, 'data': {
+        'tokens': token_cache.stats(),
+        'data': data_cache().stats(),
+        'fragments': fragment_cache.stats() if fragment_cache is not None else None,
+        'schema': get_database().schema.stats(),
+    }})
 
 
 # ------------------------
 # 🧱 JWT Decorator
 # ------------------------
+def request_token():
+    # Check both Cookie and Header for JWT
+    if 'Authorization' in request.headers:
+        return request.headers['Authorization'].split(" ")[1]
+    return request.cookies.get('token')
+
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-
-        # Check both Cookie and Header for JWT
-        if 'Authorization' in request.headers:
-            token = request.headers['Authorization'].split(" ")[1]
-        elif request.cookies.get('token'):
-            token = request.cookies.get('token')
+        token = request_token()
 
         if not token:
             return redirect('/login')
 
         try:
-            decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+            decoded = decode_token(token)
             current_user = decoded['username']
             role = decoded['role']
-
-            # 👇 Print decoded info in your Flask terminal
-            print("\n✅ JWT Decoded Info:")
-            print(f"Username: {current_user}, Role: {role}, Exp: {decoded['exp']}")
-
         except jwt.ExpiredSignatureError:
-            print("\n❌ Token expired.")
+            logger.debug("Token expired", extra={'sample': True})
             return redirect('/login')
         except Exception as e:
-            print(f"\n❌ Invalid token: {e}")
+            logger.debug(f"Invalid token: {e}", extra={'sample': True})
             return redirect('/login')
 
+        # Read-your-writes: once this user writes, their reads skip the replicas for a while
+        get_database().set_sticky_key(current_user)
         return f(current_user, role, *args, **kwargs)
     return decorated
 
 
+# ------------------------
+# 🏷️ Conditional GET
+# ------------------------
+def conditional(*tables):
+    """Answer 304 for GET views whose output only changes when `tables` do.
+
+    Goes below @token_required: the ETag covers the URL and the caller's
+    credentials as well as the table versions. The versions are read before
+    the view runs, so a write landing in between can only make the ETag older
+    than the body, never newer. The view finds them with table_version() and
+    keys its cached data by them, so it never serves data older than the ETag.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            state = http_cache.load_table_state(get_database(), tables)
+            if state is None:
+                return f(*args, **kwargs)
+            versions, last_modified = state
+            g.table_versions = dict(zip(tables, versions))
+            credentials = request.headers.get('Authorization') or request.cookies.get('token', '')
+            etag = http_cache.make_etag(versions, request.full_path, credentials)
+            headers = http_cache.validator_headers(etag, last_modified)
+            if http_cache.not_modified(request.headers.get('If-None-Match'),
+                                       request.headers.get('If-Modified-Since'), etag, last_modified):
+                return Response(status=304, headers=headers)
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                response.headers.update(headers)
+            return response
+        return decorated
+    return decorator
+
+
+# ------------------------
+# 🚦 Rate limits and admission control
+# ------------------------
+def check_rate_limits(*checks):
+    """Take a token for each (limit name, key) in turn; returns 0, or the seconds to wait.
+
+    Stops at the first refusal, so a client over its IP limit spends nothing
+    from the username's bucket.
+    """
+    limiters = current_app.extensions['rate_limiters']
+    for name, key in checks:
+        retry_after = limiters[name].hit(key)
+        if retry_after:
+            metrics.RATE_LIMITED.inc(name)
+            return retry_after
+    return 0
+
+
+def admission_slot(name):
+    """Context manager holding one of this process's `name` slots; raises Overloaded."""
+    return current_app.extensions['concurrency_limiters'][name].slot()
+
+
+def retry_after_header(seconds):
+    return {'Retry-After': str(max(1, math.ceil(seconds)))}
+
+
+def admin_write(*methods):
+    """Rate-limit each admin's writes and cap how many run at once.
+
+    Goes below @token_required. Only `methods` are limited (every method if
+    none are given), so loading a form page is never refused.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(current_user, role, *args, **kwargs):
+            if methods and request.method not in methods:
+                return f(current_user, role, *args, **kwargs)
+            retry_after = check_rate_limits(('admin_write', current_user))
+            if retry_after:
+                body, status = api_error('Too many requests, please slow down', 429)
+                return body, status, retry_after_header(retry_after)
+            try:
+                with admission_slot('admin_write'):
+                    return f(current_user, role, *args, **kwargs)
+            except Overloaded:
+                metrics.LOAD_SHED.inc('admin_write')
+                body, status = api_error('Server busy, please try again', 503)
+                return body, status, retry_after_header(1)
+        return decorated
+    return decorator
+
+
+@bp.route('/limits/stats', methods=['GET'])
+def limit_stats():
+    limiters = current_app.extensions['rate_limiters']
+    return jsonify({'success': True, 'data': {
+        'store': next(iter(limiters.values())).store.stats(),
+        'rate': {name: limiter.stats() for name, limiter in limiters.items()},
+        'concurrency': {name: limiter.stats()
+                        for name, limiter in current_app.extensions['concurrency_limiters'].items()},
+    }})
+
+
 # ------------------------
 # 🔒 Test Token Decode API
 # ------------------------
-@app.route('/protected', methods=['GET'])
+@bp.route('/protected', methods=['GET'])
 def protected():
     token = request.headers.get('Authorization')
     if not token:
@@ -75,9 +359,7 @@ def protected():
         token = token.split(" ")[1]
 
     try:
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-        print("\n✅ DECODED TOKEN DATA:")
-        print(decoded)
+        decoded = decode_token(token)
         return jsonify({'message': 'Access granted', 'decoded': decoded})
     except jwt.ExpiredSignatureError:
         return jsonify({'error': 'Token expired'}), 401
@@ -88,12 +370,12 @@ def protected():
 # ------------------------
 # 🔸 LOGIN ROUTES (JWT version)
 # ------------------------
-@app.route('/')
+@bp.route('/')
 def home():
     token = request.cookies.get('token')
     if token:
         try:
-            data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+            data = decode_token(token)
             if data['role'] == 'admin':
                 return redirect('/admin/dashboard')
             else:
@@ -103,7 +385,7 @@ def home():
     return redirect('/login')
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'GET':
         return render_template('login.html')
@@ -111,30 +393,63 @@ def login():
     username = request.form.get('username')
     password = request.form.get('password')
 
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur.execute("SELECT * FROM users WHERE username=%s AND password=%s", (username, password))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
+    if not username or not password:
+        return render_template('login.html', error='Invalid username or password')
+
+    # Refused before any query or hash check: a credential-stuffing burst costs no connections
+    retry_after = check_rate_limits(('login_ip', request.remote_addr), ('login_user', username))
+    if retry_after:
+        return (render_template('login.html', error='Too many login attempts, please try again later'),
+                429, retry_after_header(retry_after))
+    try:
+        with admission_slot('login'):
+            return authenticate(username, password)
+    except Overloaded:
+        metrics.LOAD_SHED.inc('login')
+        return render_template('login.html', error='Server busy, please try again'), 503, retry_after_header(1)
+
+
+def authenticate(username, password):
+    """Check the credentials posted to /login; returns the login response."""
+    # Index probe on users_username_key; the hash check runs in the bounded hash pool
+    user = get_database().fetch_one(statements.USER_FOR_LOGIN, (username,))
+    hash_pool = passwords.get_hash_pool()
+    try:
+        stored = user['password'] if user else passwords.dummy_hash()
+        ok, needs_rehash = hash_pool.verify(password, stored)
+    except HashPoolBusy:
+        return render_template('login.html', error='Too many login attempts, please try again'), 503
 
-    if not user:
+    if not user or not ok:
         return render_template('login.html', error='Invalid username or password')
 
-    token = jwt.encode({
-        'username': user['username'],
-        'role': user['role'],
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
-    }, SECRET_KEY, algorithm="HS256")
+    if needs_rehash:
+        try:
+            hash_pool.submit(upgrade_password_hash, data_cache(), user['id'], password, stored)
+        except HashPoolBusy:
+            pass  # upgrade on a later login
+
+    token = issue_token(user)
 
-    response = make_response(redirect('/admin/dashboard' if user['role'] == 'admin' else '/customer/dashboard'))
+    response = make_response(redirect(dashboard_url(user['role'])))
     response.set_cookie('token', token, httponly=True, samesite='Lax', secure=False)
 
-    print("\n🎟️ Generated JWT Token:", token)
+    # Never log the token itself: it is a bearer credential
+    logger.info("Login succeeded", extra={'sample': True, 'username': user['username'], 'role': user['role']})
     return response
 
 
-@app.route('/logout')
+def upgrade_password_hash(cache, user_id, password, stored):
+    """Replace a legacy or outdated hash, unless the password changed meanwhile.
+
+    Runs in the hash pool, outside the request, so it is handed the app's data cache.
+    """
+    new_hash = passwords.hash_password(password, passwords.get_hash_pool().iterations)
+    get_database().execute_query(statements.UPGRADE_PASSWORD, (new_hash, user_id, stored))
+    cache.bump('users')
+
+
+@bp.route('/logout')
 def logout():
     response = make_response(redirect('/login'))
     response.delete_cookie('token')
@@ -144,18 +459,14 @@ def logout():
 # ------------------------
 # 👤 CUSTOMER DASHBOARD
 # ------------------------
-@app.route('/customer/dashboard')
+@bp.route('/customer/dashboard')
 @token_required
+@conditional('users')
 def customer_dashboard(current_user, role):
     if role != 'customer':
         return redirect('/login')
 
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur.execute("SELECT * FROM users WHERE username=%s", (current_user,))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
+    user = get_user_by_username(current_user)
 
     return render_template('customer_dashboard.html', user=user)
 
@@ -163,24 +474,64 @@ def customer_dashboard(current_user, role):
 # ------------------------
 # 🧑‍💼 ADMIN DASHBOARD ROUTES
 # ------------------------
-@app.route('/admin/dashboard')
+@bp.route('/admin/dashboard')
 @token_required
+@conditional('users')
 def admin_dashboard(current_user, role):
     if role != 'admin':
         return redirect('/login')
 
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur.execute("SELECT * FROM users ORDER BY id ASC")
-    users = cur.fetchall()
-    cur.close()
-    conn.close()
+    config = app_config()
+    try:
+        after = max(int(request.args.get('after', 0)), 0)
+        limit = int(request.args.get('limit', config.ADMIN_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'after and limit must be integers'}), 400
+    limit = min(max(limit, 1), config.ADMIN_PAGE_SIZE_MAX)
+
+    fields = request.args.get('fields')
+    if fields:
+        columns = [c.strip().lower() for c in fields.split(',') if c.strip()]
+        unknown = [c for c in columns if c not in USER_LIST_COLUMNS]
+        if unknown:
+            return jsonify({'success': False, 'error': 'Unknown fields', 'details': unknown}), 400
+    else:
+        columns = list(USER_LIST_COLUMNS)
 
-    return render_template('admin_dashboard.html', users=users)
+    def load_page():
+        versioned = users_versioned()
+        if tuple(columns) == USER_LIST_COLUMNS:
+            # Default page: prepared statement, same keyset query as fetch_page()
+            query = statements.USER_PAGE_VERSIONED if versioned else statements.USER_PAGE
+            rows = get_database().execute_query(query, (after, limit + 1))
+            next_id = rows[limit - 1]['id'] if len(rows) > limit else None
+            rows = rows[:limit]
+        else:
+            query_columns = columns + ['row_version'] if versioned else columns
+            rows, next_id = get_database().fetch_page('users', query_columns, after_id=after, limit=limit)
+        return [dict(r) for r in rows], next_id
+
+    users, next_after = data_cache().get_or_load(
+        'users', 'page', table_version('users'), after, limit, ','.join(columns), loader=load_page
+    )
+
+    if request.args.get('format') == 'json':
+        # row_version only keys the rendered rows; it is not part of the API
+        return jsonify({
+            'success': True,
+            'data': [{c: u[c] for c in columns} for u in users],
+            'count': len(users),
+            'next_after': next_after,
+            'limit': limit,
+        })
+
+    return render_template('admin_dashboard.html', users=users, columns=columns, fields=fields,
+                           after=after, next_after=next_after, limit=limit)
 
 
-@app.route('/admin/add_user', methods=['GET', 'POST'])
+@bp.route('/admin/add_user', methods=['GET', 'POST'])
 @token_required
+@admin_write('POST')
 def add_user(current_user, role):
     if role != 'admin':
         return redirect('/login')
@@ -190,72 +541,595 @@ def add_user(current_user, role):
         password = request.form['password']
         user_role = request.form['role']
 
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO users (username, password, role) VALUES (%s, %s, %s)",
-            (username, password, user_role)
-        )
-        conn.commit()
-        cur.close()
-        conn.close()
+        try:
+            get_database().execute_query(
+                statements.INSERT_USER, (username, passwords.get_hash_pool().hash(password), user_role)
+            )
+        except psycopg2.errors.UniqueViolation:
+            return render_template('add_user.html', error='Username already exists'), 409
+        data_cache().bump('users')
 
         return redirect('/admin/dashboard')
 
     return render_template('add_user.html')
 
 
-@app.route('/admin/edit_user/<int:id>', methods=['GET', 'POST'])
+@bp.route('/admin/edit_user/<int:id>', methods=['GET', 'POST'])
 @token_required
+@admin_write('POST')
 def edit_user(current_user, role, id):
     if role != 'admin':
         return redirect('/login')
 
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
     if request.method == 'POST':
         username = request.form['username']
-        password = request.form['password']
+        password = request.form.get('password')
         user_role = request.form['role']
 
-        cur.execute(
-            "UPDATE users SET username=%s, password=%s, role=%s WHERE id=%s",
-            (username, password, user_role, id)
-        )
-        conn.commit()
-        cur.close()
-        conn.close()
+        try:
+            if password:
+                get_database().execute_query(
+                    statements.UPDATE_USER, (username, passwords.get_hash_pool().hash(password), user_role, id)
+                )
+            else:
+                # Blank password keeps the current hash
+                get_database().execute_query(statements.UPDATE_USER_KEEP_PASSWORD, (username, user_role, id))
+        except psycopg2.errors.UniqueViolation:
+            user = {'id': id, 'username': username, 'role': user_role}
+            return render_template('edit_user.html', user=user, error='Username already exists'), 409
+        # Invalidate cached user rows and pages in every worker
+        data_cache().bump('users')
         return redirect('/admin/dashboard')
 
-    cur.execute("SELECT * FROM users WHERE id=%s", (id,))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
+    user = get_database().fetch_one(statements.USER_BY_ID, (id,))
 
     return render_template('edit_user.html', user=user)
 
 
-@app.route('/admin/delete_user/<int:id>')
+@bp.route('/admin/delete_user/<int:id>')
 @token_required
+@admin_write()
 def delete_user(current_user, role, id):
     if role != 'admin':
         return redirect('/login')
     
     
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM users WHERE id=%s", (id,))
-    conn.commit()
-    cur.close()
-    conn.close()
+    get_database().execute_query(statements.DELETE_USER, (id,))
+    data_cache().bump('users')
 
     return redirect('/admin/dashboard')
 
 
+# ------------------------
+# 📤 DATA EXPORT
+# ------------------------
+@bp.route('/admin/export/<table>')
+@token_required
+def export_table(current_user, role, table):
+    if role != 'admin':
+        return redirect('/login')
+    if table not in exports.EXPORT_COLUMNS:
+        return jsonify({'success': False, 'error': f'Unknown table: {table}'}), 404
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        return jsonify({'success': False, 'error': 'format must be csv or ndjson'}), 400
+
+    if request.args.get('background'):
+        return enqueue_job('export', {'table': table, 'format': fmt}, current_user)
+
+    body = exports.stream_export(get_database(), table, fmt)
+    return Response(
+        stream_with_context(body),
+        mimetype=exports.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename={table}.{fmt}'}
+    )
+
+
+# ------------------------
+# 📥 DATA IMPORT
+# ------------------------
+@bp.route('/admin/import/<table>', methods=['POST'])
+@token_required
+@admin_write()
+def import_table(current_user, role, table):
+    if role != 'admin':
+        return redirect('/login')
+    if table not in ('users', 'employees'):
+        return jsonify({'success': False, 'error': f'Unknown table: {table}'}), 404
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'success': False, 'error': 'Upload a CSV file in the "file" field'}), 400
+
+    if request.args.get('background'):
+        import jobs
+        # The worker reads the file from JOB_FILES_DIR and deletes it when done
+        path = jobs.job_file_path(app_config(), f"import-{uuid.uuid4().hex}.csv")
+        upload.save(path)
+        return enqueue_job('import', {'table': table, 'path': path}, current_user)
+
+    import importer
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+    try:
+        result = importer.import_csv(get_database(), table, stream)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if result.inserted:
+        data_cache().bump(table)
+    return jsonify({'success': True, 'data': result.to_dict()})
+
+
+# ------------------------
+# ⏳ BACKGROUND JOBS
+# ------------------------
+def enqueue_job(kind, payload, current_user):
+    import jobs
+    job = jobs.enqueue(get_database(), kind, payload, created_by=current_user)
+    status_url = f"/admin/jobs/{job['id']}"
+    response = jsonify({'success': True, 'data': jobs.serialize_job(job), 'status_url': status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+
+@bp.route('/admin/jobs', methods=['POST'])
+@token_required
+@admin_write()
+def create_job(current_user, role):
+    if role != 'admin':
+        return api_error('Admin only', 403)
+    import jobs
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return api_error('Request body must be a JSON object', 400)
+    kind = body.get('kind')
+    if kind not in jobs.API_KINDS:
+        return api_error(f"kind must be one of {', '.join(jobs.API_KINDS)}", 400)
+    payload = body.get('payload') or {}
+    if not isinstance(payload, dict):
+        return api_error('payload must be a JSON object', 400)
+    payload, errors = jobs.HANDLERS[kind].validate(dict(payload))
+    if errors:
+        return api_error('Invalid job payload', 400, errors)
+    return enqueue_job(kind, payload, current_user)
+
+
+@bp.route('/admin/jobs', methods=['GET'])
+@token_required
+def list_jobs(current_user, role):
+    if role != 'admin':
+        return api_error('Admin only', 403)
+    import jobs
+    status = request.args.get('status')
+    if status and status not in jobs.STATUSES:
+        return api_error(f"status must be one of {', '.join(jobs.STATUSES)}", 400)
+    rows = jobs.list_jobs(get_database(), status, min(max(request.args.get('limit', 50, type=int), 1), 500))
+    return jsonify({'success': True, 'data': [jobs.serialize_job(r) for r in rows], 'count': len(rows)})
+
+
+@bp.route('/admin/jobs/<int:id>', methods=['GET'])
+@token_required
+def job_status(current_user, role, id):
+    if role != 'admin':
+        return api_error('Admin only', 403)
+    import jobs
+    job = jobs.get_job(get_database(), id)
+    if not job:
+        return api_error('Job not found', 404)
+    return jsonify({'success': True, 'data': jobs.serialize_job(job)})
+
+
+@bp.route('/admin/jobs/<int:id>/cancel', methods=['POST'])
+@token_required
+@admin_write()
+def cancel_job(current_user, role, id):
+    if role != 'admin':
+        return api_error('Admin only', 403)
+    import jobs
+    job = jobs.cancel(get_database(), id, app_config())
+    if not job:
+        return api_error('Only queued jobs can be cancelled', 409)
+    return jsonify({'success': True, 'data': jobs.serialize_job(job)})
+
+
+@bp.route('/admin/jobs/<int:id>/download', methods=['GET'])
+@token_required
+def download_job_result(current_user, role, id):
+    if role != 'admin':
+        return api_error('Admin only', 403)
+    import jobs
+    job = jobs.get_job(get_database(), id)
+    if not job or job['kind'] != 'export':
+        return api_error('Export job not found', 404)
+    if job['status'] != 'succeeded':
+        return api_error(f"Export is {job['status']}", 409)
+    result = job['result']
+    if not os.path.exists(result['path']):
+        return api_error('Export file is no longer available', 410)
+    response = send_file(result['path'], mimetype=result['mimetype'], as_attachment=True,
+                         download_name=result['filename'])
+    # Read from disk in blocks as it is sent; compress_response() never buffers passthrough files
+    response.direct_passthrough = True
+    return response
+
+
+# ------------------------
+# 🩺 HEALTH CHECK
+# ------------------------
+@bp.route('/health', methods=['GET'])
+def health():
+    timestamp = datetime.datetime.utcnow().isoformat()
+    try:
+        get_database().execute_query("SELECT 1")
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'status': 'unhealthy',
+            'database': 'disconnected',
+            'error': str(e),
+            'timestamp': timestamp
+        }), 503
+    return jsonify({
+        'success': True,
+        'status': 'healthy',
+        'database': 'connected',
+        'timestamp': timestamp
+    })
+
+
+# ------------------------
+# 👥 EMPLOYEES API
+# ------------------------
+def api_error(message, status, details=None):
+    body = {'success': False, 'error': message}
+    if details:
+        body['details'] = details
+    return jsonify(body), status
+
+
+def db_error_response(e):
+    """Map integrity errors raised by PostgreSQL to API responses."""
+    if isinstance(e, psycopg2.errors.UniqueViolation):
+        return api_error('Employee with this email already exists', 409)
+    if isinstance(e, (psycopg2.errors.CheckViolation, psycopg2.errors.NotNullViolation,
+                      psycopg2.errors.ForeignKeyViolation, psycopg2.DataError)):
+        return api_error('Invalid employee data', 400, [e.pgerror.strip()] if e.pgerror else None)
+    return api_error('Database error', 503)
+
+
+@bp.route('/employees', methods=['GET'])
+@conditional('employees')
+def list_employees():
+    rows = employees.list_employees(get_database())
+    data = [employees.serialize_employee(r) for r in rows]
+    return jsonify({'success': True, 'data': data, 'count': len(data)})
+
+
+@bp.route('/employees/search', methods=['GET'])
+@conditional('employees')
+def search_employees():
+    filters, errors = employees.parse_search_args(request.args)
+    if errors:
+        return api_error('Invalid search parameters', 400, errors)
+    columns = get_database().get_table_columns('employees')
+    rows, next_after = employees.search_employees(get_database(), columns, filters)
+    data = [employees.serialize_employee(r) for r in rows]
+    return jsonify({
+        'success': True,
+        'data': data,
+        'count': len(data),
+        'limit': filters['limit'],
+        'next_after': next_after,
+    })
+
+
+@bp.route('/employees/stats', methods=['GET'])
+@conditional('employees')
+def employee_stats():
+    return jsonify({'success': True, 'data': employees.employee_stats(get_database())})
+
+
+@bp.route('/employees/<int:id>', methods=['GET'])
+@conditional('employees')
+def get_employee(id):
+    row = employees.get_employee(get_database(), id)
+    if not row:
+        return api_error('Employee not found', 404)
+    return jsonify({'success': True, 'data': employees.serialize_employee(row)})
+
+
+@bp.route('/employees', methods=['POST'])
+@token_required
+@admin_write()
+def create_employee(current_user, role):
+    if role != 'admin':
+        return api_error('Admin only', 403)
+    columns = get_database().get_table_columns('employees')
+    clean, errors = employees.validate_employee(request.get_json(silent=True), columns)
+    if errors:
+        return api_error('Validation failed', 400, errors)
+    try:
+        row = employees.create_employee(get_database(), clean)
+    except psycopg2.Error as e:
+        return db_error_response(e)
+    return jsonify({
+        'success': True,
+        'data': employees.serialize_employee(row),
+        'message': 'Employee created successfully'
+    }), 201
+
+
+@bp.route('/employees/<int:id>', methods=['PUT'])
+@token_required
+@admin_write()
+def update_employee(current_user, role, id):
+    if role != 'admin':
+        return api_error('Admin only', 403)
+    columns = get_database().get_table_columns('employees')
+    clean, errors = employees.validate_employee(request.get_json(silent=True), columns, partial=True)
+    if errors:
+        return api_error('Validation failed', 400, errors)
+    try:
+        row = employees.update_employee(get_database(), id, clean, columns)
+    except psycopg2.Error as e:
+        return db_error_response(e)
+    if not row:
+        return api_error('Employee not found', 404)
+    return jsonify({
+        'success': True,
+        'data': employees.serialize_employee(row),
+        'message': 'Employee updated successfully'
+    })
+
+
+@bp.route('/employees/<int:id>', methods=['DELETE'])
+@token_required
+@admin_write()
+def delete_employee(current_user, role, id):
+    if role != 'admin':
+        return api_error('Admin only', 403)
+    if not employees.delete_employee(get_database(), id):
+        return api_error('Employee not found', 404)
+    return jsonify({'success': True, 'message': 'Employee deleted successfully'})
+
+
+def bulk_payload():
+    """Return the JSON array sent to a bulk endpoint, or an error response."""
+    records = request.get_json(silent=True)
+    if isinstance(records, dict):
+        records = records.get('data')
+    if not isinstance(records, list) or not records:
+        return None, api_error('Request body must be a non-empty JSON array', 400)
+    limit = app_config().BULK_MAX_RECORDS
+    if len(records) > limit:
+        return None, api_error(f'At most {limit} records per request', 413)
+    return records, None
+
+
+@bp.route('/employees/bulk', methods=['POST'])
+@token_required
+@admin_write()
+def bulk_create_employees(current_user, role):
+    if role != 'admin':
+        return api_error('Admin only', 403)
+    records, error = bulk_payload()
+    if error:
+        return error
+    columns = get_database().get_table_columns('employees')
+    cleaned, details = [], []
+    for index, record in enumerate(records):
+        clean, errors = employees.validate_employee(record, columns)
+        if errors:
+            details.append({'index': index, 'errors': errors})
+        cleaned.append(clean)
+    if details:
+        return api_error('Validation failed', 400, details)
+    try:
+        ids = employees.bulk_create_employees(get_database(), cleaned)
+    except psycopg2.Error as e:
+        return db_error_response(e)
+    return jsonify({
+        'success': True,
+        'data': {'ids': ids},
+        'count': len(ids),
+        'message': f'{len(ids)} employees created successfully'
+    }), 201
+
+
+@bp.route('/employees/bulk', methods=['PUT'])
+@token_required
+@admin_write()
+def bulk_update_employees(current_user, role):
+    if role != 'admin':
+        return api_error('Admin only', 403)
+    records, error = bulk_payload()
+    if error:
+        return error
+    columns = get_database().get_table_columns('employees')
+    updates, details = [], []
+    for index, record in enumerate(records):
+        employee_id = record.get('id') if isinstance(record, dict) else None
+        if not isinstance(employee_id, int):
+            details.append({'index': index, 'errors': ['id must be an integer']})
+            continue
+        clean, errors = employees.validate_employee(record, columns, partial=True)
+        if errors:
+            details.append({'index': index, 'errors': errors})
+        updates.append((employee_id, clean))
+    if details:
+        return api_error('Validation failed', 400, details)
+    try:
+        count = employees.bulk_update_employees(get_database(), updates, columns)
+    except EmployeeNotFound as e:
+        return api_error('Employee not found', 404, e.ids)
+    except psycopg2.Error as e:
+        return db_error_response(e)
+    return jsonify({'success': True, 'count': count, 'message': f'{count} employees updated successfully'})
+
+
+@bp.route('/employees/bulk', methods=['DELETE'])
+@token_required
+@admin_write()
+def bulk_delete_employees(current_user, role):
+    if role != 'admin':
+        return api_error('Admin only', 403)
+    records, error = bulk_payload()
+    if error:
+        return error
+    if not all(isinstance(i, int) for i in records):
+        return api_error('Request body must be an array of employee ids', 400)
+    count = employees.bulk_delete_employees(get_database(), records)
+    return jsonify({'success': True, 'count': count, 'message': f'{count} employees deleted successfully'})
+
+
+# ------------------------
+# 📡 CHANGE FEED (Server-Sent Events)
+# ------------------------
+def feed_tables():
+    """Tables requested with ?tables=, checked against what the caller may see.
+
+    Returns (tables, error response). Employee changes are public like the
+    employees API; user changes need an admin token.
+    """
+    import change_feed
+    requested = request.args.get('tables', ','.join(change_feed.TABLES))
+    tables = [t.strip() for t in requested.split(',') if t.strip()]
+    unknown = [t for t in tables if t not in change_feed.TABLES]
+    if unknown or not tables:
+        return None, api_error('Unknown tables', 400, unknown or None)
+    if 'users' in tables:
+        token = request_token()
+        try:
+            role = decode_token(token)['role'] if token else None
+        except jwt.InvalidTokenError:
+            role = None
+        if role != 'admin':
+            return None, api_error('User changes require an admin token', 403)
+    return tables, None
+
+
+@bp.route('/events', methods=['GET'])
+def change_events():
+    tables, error = feed_tables()
+    if error:
+        return error
+    import change_feed
+    db = get_database()
+    triggers = change_feed.notify_triggers(tables)
+    # A 503 (unlike a stream that never sends anything) makes EventSource give up, so
+    # clients keep reloading after their own saves instead of waiting for events
+    if (not db.supports_notify
+            or db.fetch_one(change_feed.NOTIFY_TRIGGER_COUNT, (triggers,))['installed'] < len(triggers)):
+        return api_error('Live updates need PostgreSQL with migration 0007_row_change_notify', 503)
+    feed = change_feed.get_feed(app_config())
+    last_event_id = request.headers.get('Last-Event-ID')
+    keepalive = app_config().CHANGE_FEED_KEEPALIVE
+
+    def stream():
+        # Subscribe inside the generator so the finally below always pairs with it
+        subscription, replay = feed.subscribe(tables, last_event_id)
+        try:
+            yield 'retry: 3000\n\n'
+            for event in replay:
+                yield change_feed.format_event(event)
+            while True:
+                event = subscription.get(timeout=keepalive)
+                yield change_feed.KEEPALIVE if event is None else change_feed.format_event(event)
+        finally:
+            # Runs when the client disconnects and the server closes the generator
+            feed.unsubscribe(subscription)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# ------------------------
+# 🏭 App factory
+# ------------------------
+def create_app(config=None):
+    """Build the Flask app.
+
+    Nothing here touches the database: the engine and its pool are built from
+    `config`, but connect, and templates compile (or load from the bytecode
+    cache), on first use, unless config.APP_PREWARM asks for prewarm().
+    """
+    config = config or Config()
+    configure_logging(config)
+    # The process-wide engine, pools and hash pool follow this config (built, not connected)
+    configure_database(config)
+    passwords.configure_hash_pool(config)
+
+    app = Flask(__name__)
+    app.secret_key = 'your_secret_key_here'
+    # Browsers reuse static assets without asking; after max-age they revalidate with the file's ETag
+    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = config.STATIC_MAX_AGE
+    app.extensions['config'] = config
+    app.extensions['data_cache'] = DataCache(create_backend(config))
+    app.jinja_env.add_extension(fragments.FragmentCacheExtension)
+    if config.FRAGMENT_CACHE_SIZE > 0:
+        app.jinja_env.fragment_cache = TTLCache(maxsize=config.FRAGMENT_CACHE_SIZE, ttl=config.FRAGMENT_CACHE_TTL)
+    if config.TEMPLATE_BYTECODE_CACHE:
+        app.jinja_env.bytecode_cache = fragments.bytecode_cache(config.TEMPLATE_CACHE_DIR)
+    app.extensions['rate_limiters'] = ratelimit.create_rate_limiters(config)
+    app.extensions['concurrency_limiters'] = ratelimit.create_concurrency_limiters(
+        config, pool_stats=lambda: get_database().pool.stats())
+    if config.PROXY_COUNT > 0:
+        # request.remote_addr (the per-IP rate limit key) becomes the client's, not the proxy's
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=config.PROXY_COUNT)
+    CORS(app, supports_credentials=True)
+    app.register_blueprint(bp)
+    app.teardown_appcontext(release_db_connection)
+
+    if config.APP_PREWARM:
+        prewarm(app)
+    return app
+
+
+def prewarm(app):
+    """Pay the first-request costs now: pool connections, schema cache, templates, lazy modules.
+
+    A database that is not reachable yet is logged and left to the first request.
+    """
+    started = time.perf_counter()
+    try:
+        db = get_database()
+        # All table columns in one query, on a connection the pool keeps
+        db.schema.load()
+        db.disconnect()
+    except Exception as e:
+        logger.warning(f"Prewarm could not reach the database: {e}")
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    for module in LAZY_MODULES:
+        importlib.import_module(module)
+    logger.info(f"Prewarmed in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+_default_app = None
+_default_app_lock = threading.Lock()
+
+
+def __getattr__(name):
+    # `from app import app` (benchmarks, `flask run`) gets one app built with the default Config
+    global _default_app
+    if name == 'app':
+        if _default_app is None:
+            with _default_app_lock:
+                if _default_app is None:
+                    _default_app = create_app()
+        return _default_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # ------------------------
 # 🚀 Run App
 # ------------------------
 if __name__ == '__main__':
-    app.run(debug=True)
+    config = Config()
+    # Serving right away: load the schema before the first request needs it
+    config.APP_PREWARM = True
+    app = create_app(config)
+    if config.PASSWORD_REHASH_ON_STARTUP:
+        passwords.start_background_rehash(get_database())
+    # FLASK_ENV=production: no debugger, no reloader (serve with gunicorn there anyway)
+    app.run(debug=config.DEBUG, use_reloader=config.DEBUG)
@@ -0,0 +1,717 @@
+"""
+ASGI serving mode: the same routes as app.py on an asyncio stack.
+
+Request handlers await the database instead of holding a thread each, so one
+process keeps many slow queries in flight. Password hashing still runs in the
+bounded hash pool threads. Run with:
+
+    uvicorn asgi_app:app --workers 4
+"""
+
+import asyncio
+import datetime
+import logging
+import math
+import os
+from contextlib import asynccontextmanager
+from functools import wraps
+
+import jwt
+import psycopg
+from psycopg import sql
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+from starlette.templating import Jinja2Templates
+
+import change_feed
+import employees
+import http_cache
+import passwords
+import ratelimit
+import statements
+from async_database import AsyncDatabase
+from auth import token_cache, decode_token, issue_token, dashboard_url
+from cache import DataCache, create_backend
+from config import Config
+from employees import EmployeeNotFound
+from logging_config import configure_logging
+from passwords import HashPoolBusy
+
+
+_config = Config()
+configure_logging(_config)
+logger = logging.getLogger(__name__)
+
+db = AsyncDatabase(_config)
+data_cache = DataCache(create_backend(_config))
+# Same buckets as app.py; with RATE_LIMIT_STORE=sqlite both modes share them
+rate_limiters = ratelimit.create_rate_limiters(_config)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+templates = Jinja2Templates(directory=os.path.join(BASE_DIR, 'templates'))
+
+USER_LIST_COLUMNS = ('id', 'username', 'role')
+
+# Strong references to fire-and-forget tasks so they are not garbage collected
+_background_tasks = set()
+
+
+def redirect(url):
+    return RedirectResponse(url, status_code=302)
+
+
+def render(request, name, status_code=200, **context):
+    return templates.TemplateResponse(request, name, context, status_code=status_code)
+
+
+async def run_hash(fn, *args):
+    """Run a password hash job in the hash pool without blocking the event loop."""
+    # timeout=0: never wait for a slot on the event loop thread, fail fast instead
+    future = passwords.get_hash_pool().submit(fn, *args, timeout=0)
+    return await asyncio.wrap_future(future)
+
+
+def spawn(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+# ------------------------
+# 🧱 JWT Decorator
+# ------------------------
+def request_token(request):
+    if 'authorization' in request.headers:
+        return request.headers['authorization'].split(" ")[-1]
+    return request.cookies.get('token')
+
+
+def token_required(handler):
+    @wraps(handler)
+    async def decorated(request):
+        token = request_token(request)
+
+        if not token:
+            return redirect('/login')
+        try:
+            decoded = decode_token(token)
+        except jwt.InvalidTokenError:
+            return redirect('/login')
+        return await handler(request, decoded['username'], decoded['role'])
+    return decorated
+
+
+# ------------------------
+# 🏷️ Conditional GET
+# ------------------------
+async def load_table_state(tables):
+    try:
+        rows = await db.execute_query(statements.TABLE_VERSIONS.sql, (list(tables),))
+    except psycopg.errors.UndefinedTable:
+        # Migration 0006 has not run yet
+        return None
+    return http_cache.table_state(rows, tables)
+
+
+def conditional(*tables):
+    """Async twin of app.conditional: 304 when `tables` are unchanged since the client's copy."""
+    def decorator(handler):
+        @wraps(handler)
+        async def decorated(request, *args):
+            state = await load_table_state(tables)
+            if state is None:
+                return await handler(request, *args)
+            versions, last_modified = state
+            # Keys the view's data_cache reads, as app.table_version() does
+            request.state.table_versions = dict(zip(tables, versions))
+            credentials = request.headers.get('authorization') or request.cookies.get('token', '')
+            full_path = f"{request.url.path}?{request.url.query}"
+            etag = http_cache.make_etag(versions, full_path, credentials)
+            headers = http_cache.validator_headers(etag, last_modified)
+            if http_cache.not_modified(request.headers.get('if-none-match'),
+                                       request.headers.get('if-modified-since'), etag, last_modified):
+                return Response(status_code=304, headers=headers)
+            response = await handler(request, *args)
+            if response.status_code == 200:
+                response.headers.update(headers)
+            return response
+        return decorated
+    return decorator
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with the same Cache-Control as Flask's SEND_FILE_MAX_AGE_DEFAULT."""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers['Cache-Control'] = f'public, max-age={_config.STATIC_MAX_AGE}'
+        return response
+
+
+async def pool_stats(request):
+    return JSONResponse({'success': True, 'data': db.pool.get_stats()})
+
+
+async def cache_stats(request):
+    return JSONResponse({'success': True, 'data': {
+        'tokens': token_cache.stats(),
+        'data': data_cache.stats(),
+    }})
+
+
+def table_version(request, table):
+    return getattr(request.state, 'table_versions', {}).get(table)
+
+
+async def get_user_by_username(username, version=None):
+    """Async twin of app.get_user_by_username, sharing the same data_cache keys."""
+    key = data_cache.key('users', 'by_username', version, username)
+    user = data_cache.backend.get(key)
+    if user is None:
+        user = await db.fetch_one("SELECT * FROM users WHERE username=%s", (username,))
+        if user is not None:
+            data_cache.backend.set(key, user)
+    return user
+
+
+# ------------------------
+# 🔸 LOGIN ROUTES
+# ------------------------
+async def home(request):
+    token = request.cookies.get('token')
+    if token:
+        try:
+            return redirect(dashboard_url(decode_token(token)['role']))
+        except jwt.InvalidTokenError:
+            pass
+    return redirect('/login')
+
+
+async def login(request):
+    if request.method == 'GET':
+        return render(request, 'login.html')
+
+    form = await request.form()
+    username = form.get('username')
+    password = form.get('password')
+
+    if not username or not password:
+        return render(request, 'login.html', error='Invalid username or password')
+
+    for name, key in (('login_ip', request.client.host if request.client else None), ('login_user', username)):
+        retry_after = rate_limiters[name].hit(key)
+        if retry_after:
+            response = render(request, 'login.html', status_code=429,
+                              error='Too many login attempts, please try again later')
+            response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+            return response
+
+    user = await db.fetch_one(
+        "SELECT id, username, password, role FROM users WHERE username=%s LIMIT 1", (username,)
+    )
+    stored = user['password'] if user else passwords.dummy_hash()
+    try:
+        ok, needs_rehash = await run_hash(passwords.verify_password, password, stored)
+    except HashPoolBusy:
+        return render(request, 'login.html', status_code=503, error='Too many login attempts, please try again')
+
+    if not user or not ok:
+        return render(request, 'login.html', error='Invalid username or password')
+
+    if needs_rehash:
+        spawn(upgrade_password_hash(user['id'], password, stored))
+
+    response = redirect(dashboard_url(user['role']))
+    response.set_cookie('token', issue_token(user), httponly=True, samesite='lax', secure=False)
+    return response
+
+
+async def upgrade_password_hash(user_id, password, stored):
+    """Replace a legacy or outdated hash, unless the password changed meanwhile."""
+    try:
+        new_hash = await run_hash(passwords.hash_password, password)
+    except HashPoolBusy:
+        return  # upgrade on a later login
+    await db.execute_query(
+        "UPDATE users SET password=%s WHERE id=%s AND password=%s", (new_hash, user_id, stored)
+    )
+    data_cache.bump('users')
+
+
+async def logout(request):
+    response = redirect('/login')
+    response.delete_cookie('token')
+    return response
+
+
+# ------------------------
+# 👤 CUSTOMER DASHBOARD
+# ------------------------
+@token_required
+@conditional('users')
+async def customer_dashboard(request, current_user, role):
+    if role != 'customer':
+        return redirect('/login')
+    user = await get_user_by_username(current_user, table_version(request, 'users'))
+    return render(request, 'customer_dashboard.html', user=user)
+
+
+# ------------------------
+# 🧑‍💼 ADMIN DASHBOARD ROUTES
+# ------------------------
+@token_required
+@conditional('users')
+async def admin_dashboard(request, current_user, role):
+    if role != 'admin':
+        return redirect('/login')
+
+    args = request.query_params
+    try:
+        after = max(int(args.get('after', 0)), 0)
+        limit = int(args.get('limit', _config.ADMIN_PAGE_SIZE))
+    except ValueError:
+        return JSONResponse({'success': False, 'error': 'after and limit must be integers'}, status_code=400)
+    limit = min(max(limit, 1), _config.ADMIN_PAGE_SIZE_MAX)
+
+    fields = args.get('fields')
+    if fields:
+        columns = [c.strip().lower() for c in fields.split(',') if c.strip()]
+        unknown = [c for c in columns if c not in USER_LIST_COLUMNS]
+        if unknown:
+            return JSONResponse({'success': False, 'error': 'Unknown fields', 'details': unknown}, status_code=400)
+    else:
+        columns = list(USER_LIST_COLUMNS)
+
+    key = data_cache.key('users', 'page', table_version(request, 'users'), after, limit, ','.join(columns))
+    page = data_cache.backend.get(key)
+    if page is None:
+        page = await db.fetch_page('users', columns, after_id=after, limit=limit)
+        data_cache.backend.set(key, page)
+    users, next_after = page
+
+    if args.get('format') == 'json':
+        return JSONResponse({
+            'success': True,
+            'data': users,
+            'count': len(users),
+            'next_after': next_after,
+            'limit': limit,
+        })
+
+    return render(request, 'admin_dashboard.html', users=users, columns=columns, fields=fields,
+                  after=after, next_after=next_after, limit=limit)
+
+
+@token_required
+async def add_user(request, current_user, role):
+    if role != 'admin':
+        return redirect('/login')
+
+    if request.method == 'POST':
+        form = await request.form()
+        try:
+            hashed = await run_hash(passwords.hash_password, form['password'])
+            await db.execute_query(
+                "INSERT INTO users (username, password, role) VALUES (%s, %s, %s)",
+                (form['username'], hashed, form['role'])
+            )
+        except HashPoolBusy:
+            return render(request, 'add_user.html', status_code=503, error='Server busy, please try again')
+        except psycopg.errors.UniqueViolation:
+            return render(request, 'add_user.html', status_code=409, error='Username already exists')
+        data_cache.bump('users')
+        return redirect('/admin/dashboard')
+
+    return render(request, 'add_user.html')
+
+
+@token_required
+async def edit_user(request, current_user, role):
+    if role != 'admin':
+        return redirect('/login')
+    id = request.path_params['id']
+
+    if request.method == 'POST':
+        form = await request.form()
+        username = form['username']
+        password = form.get('password')
+        user_role = form['role']
+        try:
+            if password:
+                hashed = await run_hash(passwords.hash_password, password)
+                await db.execute_query(
+                    "UPDATE users SET username=%s, password=%s, role=%s WHERE id=%s",
+                    (username, hashed, user_role, id)
+                )
+            else:
+                # Blank password keeps the current hash
+                await db.execute_query(
+                    "UPDATE users SET username=%s, role=%s WHERE id=%s", (username, user_role, id)
+                )
+        except (HashPoolBusy, psycopg.errors.UniqueViolation) as e:
+            user = {'id': id, 'username': username, 'role': user_role}
+            if isinstance(e, HashPoolBusy):
+                return render(request, 'edit_user.html', status_code=503, user=user,
+                              error='Server busy, please try again')
+            return render(request, 'edit_user.html', status_code=409, user=user, error='Username already exists')
+        data_cache.bump('users')
+        return redirect('/admin/dashboard')
+
+    user = await db.fetch_one("SELECT id, username, role FROM users WHERE id=%s", (id,))
+    return render(request, 'edit_user.html', user=user)
+
+
+@token_required
+async def delete_user(request, current_user, role):
+    if role != 'admin':
+        return redirect('/login')
+    await db.execute_query("DELETE FROM users WHERE id=%s", (request.path_params['id'],))
+    data_cache.bump('users')
+    return redirect('/admin/dashboard')
+
+
+# ------------------------
+# 🩺 HEALTH CHECK
+# ------------------------
+async def health(request):
+    timestamp = datetime.datetime.utcnow().isoformat()
+    try:
+        await db.execute_query("SELECT 1")
+    except Exception as e:
+        return JSONResponse({
+            'success': False,
+            'status': 'unhealthy',
+            'database': 'disconnected',
+            'error': str(e),
+            'timestamp': timestamp
+        }, status_code=503)
+    return JSONResponse({
+        'success': True,
+        'status': 'healthy',
+        'database': 'connected',
+        'timestamp': timestamp
+    })
+
+
+# ------------------------
+# 👥 EMPLOYEES API
+# ------------------------
+def api_error(message, status, details=None):
+    body = {'success': False, 'error': message}
+    if details:
+        body['details'] = details
+    return JSONResponse(body, status_code=status)
+
+
+def db_error_response(e):
+    """Map integrity errors raised by PostgreSQL to API responses."""
+    if isinstance(e, psycopg.errors.UniqueViolation):
+        return api_error('Employee with this email already exists', 409)
+    if isinstance(e, (psycopg.errors.CheckViolation, psycopg.errors.NotNullViolation,
+                      psycopg.errors.ForeignKeyViolation, psycopg.DataError)):
+        return api_error('Invalid employee data', 400, [e.diag.message_primary] if e.diag.message_primary else None)
+    return api_error('Database error', 503)
+
+
+async def json_body(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+@conditional('employees')
+async def list_employees(request):
+    rows = await employees.list_employees(db)
+    data = [employees.serialize_employee(r) for r in rows]
+    return JSONResponse({'success': True, 'data': data, 'count': len(data)})
+
+
+@conditional('employees')
+async def search_employees(request):
+    filters, errors = employees.parse_search_args(request.query_params)
+    if errors:
+        return api_error('Invalid search parameters', 400, errors)
+    columns = await db.get_table_columns('employees')
+    query, params = employees.search_query(columns, filters, sqlmod=sql)
+    rows, next_after = employees.search_page(await db.execute_query(query, params), filters['limit'])
+    data = [employees.serialize_employee(r) for r in rows]
+    return JSONResponse({
+        'success': True,
+        'data': data,
+        'count': len(data),
+        'limit': filters['limit'],
+        'next_after': next_after,
+    })
+
+
+@conditional('employees')
+async def employee_stats(request):
+    query = employees.stats_query(await db.get_table_columns('employee_stats'),
+                                  await db.get_table_columns('employees'))
+    return JSONResponse({'success': True, 'data': employees.summarize_stats(await db.execute_query(query))})
+
+
+@conditional('employees')
+async def get_employee(request):
+    row = await employees.get_employee(db, request.path_params['id'])
+    if not row:
+        return api_error('Employee not found', 404)
+    return JSONResponse({'success': True, 'data': employees.serialize_employee(row)})
+
+
+@token_required
+async def create_employee(request, current_user, role):
+    if role != 'admin':
+        return api_error('Admin only', 403)
+    columns = await db.get_table_columns('employees')
+    clean, errors = employees.validate_employee(await json_body(request), columns)
+    if errors:
+        return api_error('Validation failed', 400, errors)
+    try:
+        row = await db.fetch_one(employees.insert_query(list(clean), sqlmod=sql), tuple(clean.values()))
+    except psycopg.Error as e:
+        return db_error_response(e)
+    return JSONResponse({
+        'success': True,
+        'data': employees.serialize_employee(row),
+        'message': 'Employee created successfully'
+    }, status_code=201)
+
+
+@token_required
+async def update_employee(request, current_user, role):
+    if role != 'admin':
+        return api_error('Admin only', 403)
+    id = request.path_params['id']
+    columns = await db.get_table_columns('employees')
+    clean, errors = employees.validate_employee(await json_body(request), columns, partial=True)
+    if errors:
+        return api_error('Validation failed', 400, errors)
+    query = employees.update_query(list(clean), columns, sqlmod=sql) + sql.SQL(" RETURNING *")
+    try:
+        row = await db.fetch_one(query, tuple(clean.values()) + (id,))
+    except psycopg.Error as e:
+        return db_error_response(e)
+    if not row:
+        return api_error('Employee not found', 404)
+    return JSONResponse({
+        'success': True,
+        'data': employees.serialize_employee(row),
+        'message': 'Employee updated successfully'
+    })
+
+
+@token_required
+async def delete_employee(request, current_user, role):
+    if role != 'admin':
+        return api_error('Admin only', 403)
+    if not await employees.delete_employee(db, request.path_params['id']):
+        return api_error('Employee not found', 404)
+    return JSONResponse({'success': True, 'message': 'Employee deleted successfully'})
+
+
+async def bulk_payload(request):
+    """Return the JSON array sent to a bulk endpoint, or an error response."""
+    records = await json_body(request)
+    if isinstance(records, dict):
+        records = records.get('data')
+    if not isinstance(records, list) or not records:
+        return None, api_error('Request body must be a non-empty JSON array', 400)
+    limit = _config.BULK_MAX_RECORDS
+    if len(records) > limit:
+        return None, api_error(f'At most {limit} records per request', 413)
+    return records, None
+
+
+@token_required
+async def bulk_create_employees(request, current_user, role):
+    if role != 'admin':
+        return api_error('Admin only', 403)
+    records, error = await bulk_payload(request)
+    if error:
+        return error
+    columns = await db.get_table_columns('employees')
+    cleaned, details = [], []
+    for index, record in enumerate(records):
+        clean, errors = employees.validate_employee(record, columns)
+        if errors:
+            details.append({'index': index, 'errors': errors})
+        cleaned.append(clean)
+    if details:
+        return api_error('Validation failed', 400, details)
+
+    # psycopg 3 pipelines executemany, so each field-set group costs one round trip
+    ids = [None] * len(cleaned)
+    try:
+        async with db.transaction():
+            for fields, group in employees._group_by_fields(enumerate(cleaned)).items():
+                query = sql.SQL("INSERT INTO employees ({cols}) VALUES ({vals}) RETURNING id").format(
+                    cols=sql.SQL(', ').join(sql.Identifier(c) for c in fields),
+                    vals=sql.SQL(', ').join(sql.Placeholder() * len(fields)),
+                )
+                rows = await db.executemany(query, [tuple(r.values()) for _, r in group], returning=True)
+                for (index, _), row in zip(group, rows):
+                    ids[index] = row['id']
+    except psycopg.Error as e:
+        return db_error_response(e)
+    return JSONResponse({
+        'success': True,
+        'data': {'ids': ids},
+        'count': len(ids),
+        'message': f'{len(ids)} employees created successfully'
+    }, status_code=201)
+
+
+@token_required
+async def bulk_update_employees(request, current_user, role):
+    if role != 'admin':
+        return api_error('Admin only', 403)
+    records, error = await bulk_payload(request)
+    if error:
+        return error
+    columns = await db.get_table_columns('employees')
+    updates, details = [], []
+    for index, record in enumerate(records):
+        employee_id = record.get('id') if isinstance(record, dict) else None
+        if not isinstance(employee_id, int):
+            details.append({'index': index, 'errors': ['id must be an integer']})
+            continue
+        clean, errors = employees.validate_employee(record, columns, partial=True)
+        if errors:
+            details.append({'index': index, 'errors': errors})
+        updates.append((employee_id, clean))
+    if details:
+        return api_error('Validation failed', 400, details)
+
+    ids = [employee_id for employee_id, _ in updates]
+    try:
+        async with db.transaction():
+            found = await db.execute_query("SELECT id FROM employees WHERE id = ANY(%s)", (ids,))
+            missing = sorted(set(ids) - {row['id'] for row in found})
+            if missing:
+                raise EmployeeNotFound(missing)
+            for fields, group in employees._group_by_fields(updates).items():
+                query = employees.update_query(fields, columns, sqlmod=sql)
+                await db.executemany(query, [tuple(clean.values()) + (eid,) for eid, clean in group])
+    except EmployeeNotFound as e:
+        return api_error('Employee not found', 404, e.ids)
+    except psycopg.Error as e:
+        return db_error_response(e)
+    count = len(updates)
+    return JSONResponse({'success': True, 'count': count, 'message': f'{count} employees updated successfully'})
+
+
+@token_required
+async def bulk_delete_employees(request, current_user, role):
+    if role != 'admin':
+        return api_error('Admin only', 403)
+    records, error = await bulk_payload(request)
+    if error:
+        return error
+    if not all(isinstance(i, int) for i in records):
+        return api_error('Request body must be an array of employee ids', 400)
+    count = await db.execute_query("DELETE FROM employees WHERE id = ANY(%s)", (records,), fetch=False)
+    return JSONResponse({'success': True, 'count': count, 'message': f'{count} employees deleted successfully'})
+
+
+# ------------------------
+# 📡 CHANGE FEED (Server-Sent Events)
+# ------------------------
+def feed_tables(request):
+    """Async twin of app.feed_tables; returns (tables, error response)."""
+    requested = request.query_params.get('tables', ','.join(change_feed.TABLES))
+    tables = [t.strip() for t in requested.split(',') if t.strip()]
+    unknown = [t for t in tables if t not in change_feed.TABLES]
+    if unknown or not tables:
+        return None, api_error('Unknown tables', 400, unknown or None)
+    if 'users' in tables:
+        token = request_token(request)
+        try:
+            role = decode_token(token)['role'] if token else None
+        except jwt.InvalidTokenError:
+            role = None
+        if role != 'admin':
+            return None, api_error('User changes require an admin token', 403)
+    return tables, None
+
+
+async def change_events(request):
+    tables, error = feed_tables(request)
+    if error:
+        return error
+    triggers = change_feed.notify_triggers(tables)
+    if (await db.fetch_one(change_feed.NOTIFY_TRIGGER_COUNT, (triggers,)))['installed'] < len(triggers):
+        return api_error('Live updates need migration 0007_row_change_notify', 503)
+    feed = change_feed.get_feed(_config)
+    last_event_id = request.headers.get('last-event-id')
+    keepalive = _config.CHANGE_FEED_KEEPALIVE
+
+    async def stream():
+        subscription, replay = feed.subscribe(tables, last_event_id, loop=asyncio.get_running_loop())
+        try:
+            yield 'retry: 3000\n\n'
+            for event in replay:
+                yield change_feed.format_event(event)
+            while True:
+                event = await subscription.get(timeout=keepalive)
+                yield change_feed.KEEPALIVE if event is None else change_feed.format_event(event)
+        finally:
+            # Starlette cancels the stream when the client disconnects
+            feed.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# ------------------------
+# 🚀 App
+# ------------------------
+@asynccontextmanager
+async def lifespan(app):
+    await db.open()
+    try:
+        yield
+    finally:
+        await db.close()
+
+
+routes = [
+    Route('/', home),
+    Route('/login', login, methods=['GET', 'POST']),
+    Route('/logout', logout),
+    Route('/customer/dashboard', customer_dashboard),
+    Route('/admin/dashboard', admin_dashboard),
+    Route('/admin/add_user', add_user, methods=['GET', 'POST']),
+    Route('/admin/edit_user/{id:int}', edit_user, methods=['GET', 'POST']),
+    Route('/admin/delete_user/{id:int}', delete_user),
+    Route('/health', health),
+    Route('/pool/stats', pool_stats),
+    Route('/cache/stats', cache_stats),
+    Route('/employees', list_employees, methods=['GET']),
+    Route('/employees', create_employee, methods=['POST']),
+    Route('/employees/search', search_employees, methods=['GET']),
+    Route('/employees/stats', employee_stats, methods=['GET']),
+    Route('/employees/bulk', bulk_create_employees, methods=['POST']),
+    Route('/employees/bulk', bulk_update_employees, methods=['PUT']),
+    Route('/employees/bulk', bulk_delete_employees, methods=['DELETE']),
+    Route('/employees/{id:int}', get_employee, methods=['GET']),
+    Route('/employees/{id:int}', update_employee, methods=['PUT']),
+    Route('/employees/{id:int}', delete_employee, methods=['DELETE']),
+    Route('/events', change_events),
+    Mount('/static', CachedStaticFiles(directory=os.path.join(BASE_DIR, 'static')), name='static'),
+]
+
+app = Starlette(
+    routes=routes,
+    lifespan=lifespan,
+    middleware=[Middleware(CORSMiddleware, allow_origin_regex='.*', allow_credentials=True,
+                           allow_methods=['*'], allow_headers=['*']),
+                # gzip only; Starlette has no brotli middleware
+                Middleware(GZipMiddleware, minimum_size=_config.COMPRESS_MIN_SIZE,
+                           compresslevel=_config.COMPRESS_LEVEL)],
+)
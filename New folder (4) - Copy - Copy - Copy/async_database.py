@@ -0,0 +1,141 @@
+"""
+asyncio counterpart of database.Database for the ASGI serving mode.
+
+Built on psycopg 3's async driver and psycopg_pool.AsyncConnectionPool,
+which accept the same %s-style SQL as psycopg2, so the statements used by
+app.py run unchanged. Install the extras with `pip install -r requirements-async.txt`.
+"""
+
+import contextvars
+import logging
+from contextlib import asynccontextmanager
+
+from config import Config
+
+try:
+    import psycopg
+    from psycopg.conninfo import make_conninfo
+    from psycopg import sql
+    from psycopg.rows import dict_row
+    from psycopg_pool import AsyncConnectionPool
+except ImportError as e:  # pragma: no cover - optional dependency
+    raise ImportError(
+        "The async serving mode needs psycopg 3: pip install -r requirements-async.txt"
+    ) from e
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabase:
+    """Async data-access engine on an asyncio connection pool.
+
+    Mirrors Database: execute_query() runs a statement on a pooled connection
+    and commits it; inside `async with db.transaction():` every statement of the
+    current task shares one connection and commits once.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or Config()
+        self.pool = None
+        # Connection pinned by transaction() for the current asyncio task
+        self._conn = contextvars.ContextVar('async_db_connection', default=None)
+
+    async def open(self):
+        if self.pool is None:
+            c = self.config
+            conninfo = make_conninfo(
+                host=c.DB_HOST, port=c.DB_PORT, dbname=c.DB_NAME, user=c.DB_USER, password=c.DB_PASSWORD,
+                # psycopg 3 returns bytes for text columns of SQL_ASCII databases unless told otherwise
+                client_encoding='utf8',
+            )
+            self.pool = AsyncConnectionPool(
+                conninfo,
+                min_size=c.ASYNC_DB_POOL_MIN,
+                max_size=c.ASYNC_DB_POOL_MAX,
+                timeout=c.DB_POOL_TIMEOUT,
+                max_idle=c.DB_POOL_IDLE_TIMEOUT,
+                kwargs={'row_factory': dict_row},
+                check=AsyncConnectionPool.check_connection,
+                open=False,
+            )
+            await self.pool.open()
+            logger.info(f"Opened async database pool (min={c.ASYNC_DB_POOL_MIN}, max={c.ASYNC_DB_POOL_MAX})")
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    @asynccontextmanager
+    async def transaction(self):
+        conn = self._conn.get()
+        if conn is not None:
+            # Nested block joins the outer transaction
+            yield self
+            return
+        async with self.pool.connection() as conn:
+            token = self._conn.set(conn)
+            try:
+                async with conn.transaction():
+                    yield self
+            finally:
+                self._conn.reset(token)
+
+    async def execute_query(self, query, params=None, fetch=True):
+        """Same contract as Database.execute_query: rows for SELECT/RETURNING, else rowcount."""
+        conn = self._conn.get()
+        if conn is not None:
+            return await self._run(conn, query, params, fetch)
+        # pool.connection() commits on success and rolls back on error
+        async with self.pool.connection() as conn:
+            return await self._run(conn, query, params, fetch)
+
+    async def fetch_one(self, query, params=None):
+        rows = await self.execute_query(query, params, fetch=True)
+        return rows[0] if rows else None
+
+    async def executemany(self, query, params_seq, returning=False):
+        """Run one statement for many parameter sets (pipelined by psycopg)."""
+        async with self.transaction():
+            conn = self._conn.get()
+            async with conn.cursor() as cur:
+                await cur.executemany(query, params_seq, returning=returning)
+                if not returning:
+                    return cur.rowcount
+                rows = []
+                while True:
+                    rows.extend(await cur.fetchall())
+                    if not cur.nextset():
+                        break
+                return rows
+
+    async def get_table_columns(self, table_name):
+        rows = await self.execute_query(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = 'public' AND table_name = %s", (table_name,)
+        )
+        return {row['column_name'].lower() for row in rows}
+
+    async def fetch_page(self, table_name, columns, after_id=0, limit=50):
+        """Async twin of Database.fetch_page (keyset pagination on id)."""
+        columns = list(columns)
+        if 'id' not in columns:
+            columns.insert(0, 'id')
+        query = sql.SQL("SELECT {cols} FROM {table} WHERE id > %s ORDER BY id ASC LIMIT %s").format(
+            cols=sql.SQL(', ').join(sql.Identifier(c) for c in columns),
+            table=sql.Identifier(table_name),
+        )
+        rows = await self.execute_query(query, (after_id, limit + 1))
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, rows[-1]['id']
+        return rows, None
+
+    @staticmethod
+    async def _run(conn, query, params, fetch):
+        async with conn.cursor() as cur:
+            await cur.execute(query, params)
+            if fetch and cur.description is not None:
+                return await cur.fetchall()
+            return cur.rowcount
@@ -0,0 +1,40 @@
+import datetime
+import time
+
+import jwt
+
+from cache import TTLCache
+from config import Config
+
+
+SECRET_KEY = "super_secret_jwt_key"
+TOKEN_LIFETIME = datetime.timedelta(hours=1)
+
+# Decoded JWT claims keyed by raw token (per process)
+_config = Config()
+token_cache = TTLCache(maxsize=_config.TOKEN_CACHE_SIZE, ttl=_config.TOKEN_CACHE_TTL)
+
+
+def decode_token(token):
+    """Decode and verify a JWT, reusing earlier results for the same token.
+
+    Only successfully verified claims are cached, and never past their `exp`.
+    """
+    decoded = token_cache.get(token)
+    if decoded is None:
+        decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        token_cache.set(token, decoded, ttl=min(token_cache.ttl, decoded['exp'] - time.time()))
+    return decoded
+
+
+def issue_token(user):
+    """Create the session JWT for a users row."""
+    return jwt.encode({
+        'username': user['username'],
+        'role': user['role'],
+        'exp': datetime.datetime.utcnow() + TOKEN_LIFETIME
+    }, SECRET_KEY, algorithm="HS256")
+
+
+def dashboard_url(role):
+    return '/admin/dashboard' if role == 'admin' else '/customer/dashboard'
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Measure dashboard latency during a login flood, with and without rate limits and admission control.
+
+`--attackers` threads POST wrong passwords for random usernames to /login,
+`--attack-rate` attempts per second between them, spread over `--ips` client
+addresses, while `--readers` threads load /admin/dashboard. Each mode runs
+for `--seconds` on its own app:
+
+    off     no rate limits, no admission control
+    on      the limits configured in .env (defaults: see config.py)
+
+Reports dashboard requests/s and p50/p95/p99 latency, and how the login
+attempts were answered (checked, 429, 503). Also times one take() on the
+local and the SQLite bucket stores.
+
+Uses the database configured in .env.
+
+Usage:
+    python benchmarks/benchmark_admission.py [--attackers 32] [--attack-rate 200] [--ips 4]
+                                             [--readers 4] [--seconds 10]
+"""
+
+import argparse
+import collections
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ratelimit  # noqa: E402
+from app import create_app  # noqa: E402
+from auth import issue_token  # noqa: E402
+from config import Config  # noqa: E402
+from database import get_database  # noqa: E402
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def make_config(mode):
+    config = Config()
+    if mode == 'off':
+        config.RATE_LIMIT_ENABLED = False
+        config.ADMISSION_POOL_RESERVE = -1
+        config.LOGIN_CONCURRENCY = 0
+        config.ADMIN_WRITE_CONCURRENCY = 0
+    return config
+
+
+def run_mode(mode, attackers, attack_rate, ips, readers, seconds):
+    app = create_app(make_config(mode))
+    token = issue_token({'username': '__bench_admin', 'role': 'admin'})
+    stop = time.perf_counter() + seconds
+    latencies = []
+    logins = collections.Counter()
+    lock = threading.Lock()
+
+    def attacker(i):
+        client = app.test_client()
+        address = f'198.51.100.{i % ips + 1}'
+        # Open loop: attempts go out on schedule however fast the previous ones were answered
+        interval = attackers / attack_rate
+        next_at = time.perf_counter() + interval * i / attackers
+        try:
+            while time.perf_counter() < stop:
+                time.sleep(max(0.0, next_at - time.perf_counter()))
+                next_at += interval
+                r = client.post('/login', data={'username': f'stuffed{uuid.uuid4().hex[:8]}', 'password': 'x'},
+                                environ_base={'REMOTE_ADDR': address})
+                status = {200: 'checked', 429: '429', 503: '503'}.get(r.status_code, str(r.status_code))
+                with lock:
+                    logins[status] += 1
+        finally:
+            get_database().disconnect()
+
+    def reader():
+        client = app.test_client()
+        client.set_cookie('token', token)
+        try:
+            while time.perf_counter() < stop:
+                started = time.perf_counter()
+                client.get('/admin/dashboard')
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+        finally:
+            get_database().disconnect()
+
+    threads = ([threading.Thread(target=attacker, args=(i,)) for i in range(attackers)]
+               + [threading.Thread(target=reader) for _ in range(readers)])
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'dashboard_rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'logins': {status: round(count / elapsed, 1) for status, count in sorted(logins.items())},
+    }
+
+
+def store_take_us(store, iterations):
+    started = time.perf_counter()
+    for i in range(iterations):
+        store.take(f'bench:{i % 1000}', 1.0, 20)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--attackers', type=int, default=32)
+    parser.add_argument('--attack-rate', type=float, default=200.0, help="login attempts per second, in total")
+    parser.add_argument('--ips', type=int, default=4, help="distinct client addresses the attackers use")
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--modes', default='off,on')
+    args = parser.parse_args()
+
+    config = Config()
+    print(f"attackers={args.attackers} attack_rate={args.attack_rate}/s ips={args.ips} readers={args.readers} "
+          f"seconds={args.seconds} pool max={config.DB_POOL_MAX} pool reserve={config.ADMISSION_POOL_RESERVE} "
+          f"login concurrency={config.LOGIN_CONCURRENCY}")
+    print(f"{'mode':<5} {'dash/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  logins/s by answer")
+    for mode in args.modes.split(','):
+        r = run_mode(mode, args.attackers, args.attack_rate, args.ips, args.readers, args.seconds)
+        print(f"{mode:<5} {r['dashboard_rps']:>8.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}  "
+              f"{r['logins']}")
+
+    path = os.path.join(tempfile.mkdtemp(prefix='bench-ratelimit-'), 'buckets.sqlite3')
+    for name, store in (('local', ratelimit.LocalRateLimitStore()), ('sqlite', ratelimit.SQLiteRateLimitStore(path))):
+        print(f"{name} store take(): {store_take_us(store, 20000):.1f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
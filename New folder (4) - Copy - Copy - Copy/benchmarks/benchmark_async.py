@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Compare the threaded Flask server (app.py) with the ASGI app (asgi_app.py).
+
+Both servers are started as subprocesses on the database configured in .env.
+For every endpoint, `--concurrency` clients issue requests for `--seconds`
+against each server; requests/s and p50/p99 latency are reported.
+
+Usage:
+    python benchmarks/benchmark_async.py [--concurrency 64] [--seconds 5]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    'flask': [sys.executable, '-c',
+              "import sys; from app import app; app.run(port=int(sys.argv[1]), threaded=True, debug=False)"],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi_app:app', '--log-level', 'warning', '--port'],
+}
+
+ENDPOINTS = ['/health', '/employees/{employee_id}', '/admin/dashboard?format=json&limit=50']
+
+
+def start_server(name, port):
+    proc = subprocess.Popen(SERVERS[name] + [str(port)], cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            if httpx.get(f'http://127.0.0.1:{port}/health', timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{name} server did not start on port {port}")
+
+
+async def drive(base_url, path, concurrency, seconds, cookies):
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, cookies=cookies, limits=limits, timeout=30) as client:
+        stop = time.perf_counter() + seconds
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < stop:
+                started = time.perf_counter()
+                try:
+                    r = await client.get(path)
+                    ok = r.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--port', type=int, default=8710)
+    args = parser.parse_args()
+
+    print(f"concurrency={args.concurrency}  seconds={args.seconds}")
+    print(f"{'server':>6} {'endpoint':<40} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for offset, name in enumerate(SERVERS):
+        port = args.port + offset
+        base_url = f'http://127.0.0.1:{port}'
+        proc = start_server(name, port)
+        try:
+            login = httpx.post(f'{base_url}/login', data={'username': args.username, 'password': args.password})
+            cookies = {'token': login.cookies.get('token')} if login.cookies.get('token') else {}
+            employees = httpx.get(f'{base_url}/employees').json().get('data')
+            for path in ENDPOINTS:
+                if '{employee_id}' in path and not employees:
+                    continue  # empty employees table
+                path = path.format(employee_id=employees[0]['id'] if employees else None)
+                latencies, errors, elapsed = asyncio.run(
+                    drive(base_url, path, args.concurrency, args.seconds, cookies)
+                )
+                print(f"{name:>6} {path:<40} {len(latencies) / elapsed:>9.1f} "
+                      f"{statistics.median(latencies) * 1000 if latencies else 0:>8.1f} "
+                      f"{percentile(latencies, 99) * 1000:>8.1f} {errors:>7}")
+        finally:
+            proc.terminate()
+            proc.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
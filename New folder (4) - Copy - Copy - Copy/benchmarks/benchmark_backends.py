@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Compare the PostgreSQL and SQLite engines on the app's own data-access calls.
+
+Both engines run the same PostgreSQL-dialect queries (the SQLite engine
+translates them): point lookups by id, keyset pages, employee searches,
+department stats, single-row inserts and updates that commit on their own, a bulk insert
+through execute_values() and a batch update through execute_batch(). Reports
+the mean latency per call, or rows/sec for the bulk operations.
+
+PostgreSQL is the database configured in .env (synthetic employees use
+emails ending in @backends.example.com and are deleted afterwards); SQLite
+uses a fresh file under the system temp directory unless --sqlite-path is given.
+
+Usage:
+    python benchmarks/benchmark_backends.py [--rows 10000] [--iterations 500] [--backends postgres,sqlite]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import employees  # noqa: E402
+from database import Database  # noqa: E402
+from sqlite_database import SQLiteDatabase  # noqa: E402
+
+BENCH_DOMAIN = '@backends.example.com'
+DEPARTMENTS = ['Engineering', 'Sales', 'Marketing', 'Finance', 'Support', 'Operations']
+
+
+def make_rows(start, count):
+    return [(f'Employee{n}', f'employee{n}{BENCH_DOMAIN}', DEPARTMENTS[n % len(DEPARTMENTS)],
+             30000 + (n % 90) * 1000) for n in range(start, start + count)]
+
+
+def cleanup(db):
+    db.execute_query("DELETE FROM employees WHERE email LIKE %s", ('%' + BENCH_DOMAIN,), fetch=False)
+
+
+def timed(iterations, call):
+    started = time.perf_counter()
+    for i in range(iterations):
+        call(i)
+    return (time.perf_counter() - started) / iterations
+
+
+def run(db, rows, iterations):
+    results = {}
+    insert = "INSERT INTO employees (name, email, department, salary) VALUES %s RETURNING id"
+    started = time.perf_counter()
+    with db.transaction():
+        ids = [row['id'] for row in db.execute_values(insert, make_rows(0, rows), fetch=True)]
+    results['bulk insert'] = ('rows/s', rows / (time.perf_counter() - started))
+
+    started = time.perf_counter()
+    db.execute_batch("UPDATE employees SET salary = salary + %s WHERE id = %s", [(1, i) for i in ids])
+    results['batch update'] = ('rows/s', rows / (time.perf_counter() - started))
+
+    columns = db.get_table_columns('employees')
+    results['point lookup'] = ('ms', timed(iterations, lambda i: db.fetch_one(
+        "SELECT * FROM employees WHERE id = %s", (ids[i % len(ids)],))) * 1000)
+    results['keyset page'] = ('ms', timed(iterations, lambda i: db.fetch_page(
+        'employees', sorted(columns), after_id=ids[(i * 97) % len(ids)], limit=50)) * 1000)
+    filters, _ = employees.parse_search_args({'q': 'employee12', 'match': 'prefix'})
+    results['prefix search'] = ('ms', timed(iterations, lambda i: employees.search_employees(
+        db, columns, filters)) * 1000)
+    results['stats'] = ('ms', timed(iterations, lambda i: employees.employee_stats(db)) * 1000)
+    results['single insert'] = ('ms', timed(iterations, lambda i: db.execute_query(
+        "INSERT INTO employees (name, email, department, salary) VALUES (%s, %s, %s, %s)",
+        make_rows(rows + i, 1)[0], fetch=False)) * 1000)
+    results['single update'] = ('ms', timed(iterations, lambda i: db.execute_query(
+        "UPDATE employees SET salary = salary + 1 WHERE id = %s", (ids[i % len(ids)],), fetch=False)) * 1000)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--backends', default='postgres,sqlite')
+    parser.add_argument('--sqlite-path', help="SQLite file to use (default: a new temporary file)")
+    args = parser.parse_args()
+
+    engines = {}
+    for name in args.backends.split(','):
+        if name == 'postgres':
+            engines[name] = Database()
+        elif name == 'sqlite':
+            path = args.sqlite_path or os.path.join(tempfile.mkdtemp(prefix='bench-sqlite-'), 'bench.db')
+            engines[name] = SQLiteDatabase(path)
+        else:
+            parser.error(f"unknown backend: {name}")
+
+    results = {}
+    for name, db in engines.items():
+        cleanup(db)
+        try:
+            results[name] = run(db, args.rows, args.iterations)
+        finally:
+            cleanup(db)
+
+    print(f"rows={args.rows} iterations={args.iterations}")
+    print(f"{'operation':<15} {'unit':>6} " + ' '.join(f"{name:>10}" for name in results))
+    for operation, (unit, _) in next(iter(results.values())).items():
+        values = ' '.join(f"{results[name][operation][1]:>10.{0 if unit == 'rows/s' else 3}f}" for name in results)
+        print(f"{operation:<15} {unit:>6} {values}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Compare what a polling client costs with and without conditional requests.
+
+For each endpoint the same GET is repeated `--iterations` times three ways:
+a plain refresh, a refresh accepting gzip, and a revalidation sending the
+previous ETag (answered 304 while nothing changes). Reports mean latency,
+bytes on the wire and database queries per request.
+
+Uses the database configured in .env; run migrations.py first and log in
+with --username/--password (an admin account).
+
+Usage:
+    python benchmarks/benchmark_conditional.py [--iterations 300]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
+from database import db_instance  # noqa: E402
+
+ENDPOINTS = ['/admin/dashboard', '/admin/dashboard?format=json', '/employees', '/employees/stats']
+
+
+def poll(client, path, iterations, headers):
+    started = time.perf_counter()
+    trips = db_instance.round_trips()
+    size = status = 0
+    for _ in range(iterations):
+        response = client.get(path, headers=headers)
+        size, status = len(response.data), response.status_code
+    elapsed = time.perf_counter() - started
+    return elapsed / iterations, size, (db_instance.round_trips() - trips) / iterations, status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin')
+    args = parser.parse_args()
+
+    client = app.test_client()
+    response = client.post('/login', data={'username': args.username, 'password': args.password})
+    if response.status_code != 302:
+        raise SystemExit("Login failed; pass an admin account with --username/--password")
+
+    print(f"iterations={args.iterations}")
+    print(f"{'endpoint':<30} {'mode':<12} {'status':>6} {'mean ms':>8} {'bytes':>8} {'queries':>8}")
+    for path in ENDPOINTS:
+        etag = client.get(path).headers.get('ETag')
+        modes = {
+            'full': {},
+            'gzip': {'Accept-Encoding': 'gzip'},
+            'revalidate': {'If-None-Match': etag} if etag else None,
+        }
+        for mode, headers in modes.items():
+            if headers is None:
+                print(f"{path:<30} {mode:<12} {'-':>6}  no ETag (has migrations.py run?)")
+                continue
+            mean, size, queries, status = poll(client, path, args.iterations, headers)
+            print(f"{path:<30} {mode:<12} {status:>6} {mean * 1000:>8.2f} {size:>8} {queries:>8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
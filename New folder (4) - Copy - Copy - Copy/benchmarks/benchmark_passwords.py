@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark login throughput (logins/sec) at several password hash costs.
+
+For each PBKDF2 iteration count a temporary user is given a hash of that
+cost, then `--threads` clients POST /login for `--seconds` through the Flask
+test client. Uses the database configured in .env.
+
+Usage:
+    python benchmarks/benchmark_passwords.py [--costs 100000,260000,600000] [--threads 8] [--seconds 5]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# One user logging in from one address: measure the hash cost, not the rate limits
+os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+os.environ.setdefault('ADMISSION_POOL_RESERVE', '-1')
+os.environ.setdefault('LOGIN_CONCURRENCY', '0')
+
+import passwords  # noqa: E402
+from app import app  # noqa: E402
+from database import db_instance  # noqa: E402
+
+BENCH_USER = '__bench_login_user'
+BENCH_PASSWORD = 'bench-password'
+
+
+def run_logins(threads, seconds):
+    stop = time.perf_counter() + seconds
+    counts = [0] * threads
+    failures = [0] * threads
+
+    def worker(i):
+        client = app.test_client()
+        while time.perf_counter() < stop:
+            r = client.post('/login', data={'username': BENCH_USER, 'password': BENCH_PASSWORD})
+            if r.status_code == 302:
+                counts[i] += 1
+            else:
+                failures[i] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return sum(counts) / elapsed, sum(failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--costs', default='50000,100000,260000,600000')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    costs = [int(c) for c in args.costs.split(',')]
+    db_instance.execute_query("DELETE FROM users WHERE username=%s", (BENCH_USER,))
+    db_instance.execute_query(
+        "INSERT INTO users (username, password, role) VALUES (%s, %s, 'customer')",
+        (BENCH_USER, BENCH_PASSWORD)
+    )
+    print(f"hash workers={passwords.get_hash_pool().workers}  client threads={args.threads}")
+    print(f"{'iterations':>12} {'hash ms':>9} {'logins/s':>10} {'failed':>7}")
+    try:
+        for cost in costs:
+            # Verification uses the cost stored in the hash; make it "current" so
+            # logins do not trigger a background rehash during the run
+            os.environ['PASSWORD_HASH_ITERATIONS'] = str(cost)
+            passwords.Config.PASSWORD_HASH_ITERATIONS = cost
+            started = time.perf_counter()
+            hashed = passwords.hash_password(BENCH_PASSWORD, iterations=cost)
+            hash_ms = (time.perf_counter() - started) * 1000
+            db_instance.execute_query("UPDATE users SET password=%s WHERE username=%s", (hashed, BENCH_USER))
+            rate, failed = run_logins(args.threads, args.seconds)
+            print(f"{cost:>12} {hash_ms:>9.1f} {rate:>10.1f} {failed:>7}")
+    finally:
+        db_instance.execute_query("DELETE FROM users WHERE username=%s", (BENCH_USER,))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Measure /employees/search latency as the employees table grows.
+
+Synthetic employees (emails ending in @bench.example.com) are added up to
+each size in `--sizes`; at every size the prefix, substring and filtered
+searches are timed and the plan's access path is reported, so a missing
+index shows up as a sequential scan whose latency grows with the table.
+The synthetic rows are deleted afterwards.
+
+Uses the database configured in .env; run migrations.py first.
+
+Usage:
+    python benchmarks/benchmark_search.py [--sizes 1000,10000,100000] [--iterations 200]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from psycopg2 import sql  # noqa: E402
+
+import employees  # noqa: E402
+from database import db_instance  # noqa: E402
+
+BENCH_DOMAIN = '@bench.example.com'
+DEPARTMENTS = ['Engineering', 'Sales', 'Marketing', 'Finance', 'Support', 'Operations']
+
+SEARCHES = {
+    'prefix': {'q': 'employee4242', 'match': 'prefix'},
+    'short': {'q': 'em', 'match': 'auto'},
+    'substring': {'q': 'yee1234', 'match': 'auto'},
+    'filtered': {'q': 'emp', 'department': 'Sales', 'min_salary': '50000'},
+}
+
+
+def add_rows(start, stop):
+    """Insert synthetic employees numbered [start, stop) in one statement."""
+    db_instance.execute_query(
+        "INSERT INTO employees (name, email, department, salary) "
+        "SELECT 'Employee' || n, 'employee' || n || %s, "
+        "       (%s::text[])[1 + n %% %s], 30000 + (n %% 90) * 1000 "
+        "FROM generate_series(%s, %s) AS n",
+        (BENCH_DOMAIN, DEPARTMENTS, len(DEPARTMENTS), start, stop - 1),
+        fetch=False,
+    )
+    db_instance.execute_query("ANALYZE employees", fetch=False)
+
+
+def access_path(columns, filters):
+    query, params = employees.search_query(columns, filters)
+    rows = db_instance.execute_query(sql.SQL("EXPLAIN ") + query, params)
+    # The innermost scan node, e.g. "Bitmap Index Scan on employees_email_trgm_idx"
+    scans = [row['QUERY PLAN'] for row in rows if 'Scan' in row['QUERY PLAN']]
+    return scans[-1].split('(cost')[0].strip(' ->') if scans else '?'
+
+
+def time_search(columns, filters, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        employees.search_employees(db_instance, columns, filters)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+    sizes = sorted(int(s) for s in args.sizes.split(','))
+
+    columns = db_instance.get_table_columns('employees')
+    print(f"iterations={args.iterations}")
+    print(f"{'rows':>8} {'search':<9} {'p50 ms':>8} {'p95 ms':>8}  plan")
+    added = 0
+    try:
+        for size in sizes:
+            add_rows(added, size)
+            added = size
+            for label, raw in SEARCHES.items():
+                filters, errors = employees.parse_search_args(raw)
+                if errors:
+                    raise SystemExit(f"{label}: {errors}")
+                p50, p95 = time_search(columns, filters, args.iterations)
+                print(f"{size:>8} {label:<9} {p50 * 1000:>8.2f} {p95 * 1000:>8.2f}  "
+                      f"{access_path(columns, filters)}")
+    finally:
+        db_instance.execute_query("DELETE FROM employees WHERE email LIKE %s",
+                                  ('%' + BENCH_DOMAIN,), fetch=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Measure cold start: from `import app` to the first response, in fresh interpreters.
+
+Each run starts a new Python process that imports app.py, calls create_app()
+and sends GET `--path` twice through the test client, timing every step.
+Runs alternate between lazy startup (the default) and APP_PREWARM=true, which
+moves the pool, schema and template work from the first request into
+create_app(). Reports the median of `--runs` processes per mode.
+
+Uses the database configured in .env.
+
+Usage:
+    python benchmarks/benchmark_startup.py [--runs 10] [--path /employees]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child process; prints one JSON object of millisecond timings
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+client = flask_app.test_client()
+status = client.get(sys.argv[1]).status_code
+first = time.perf_counter()
+client.get(sys.argv[1])
+second = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (first - created) * 1000,
+    'import_to_first_response_ms': (first - started) * 1000,
+    'second_request_ms': (second - first) * 1000,
+    'status': status,
+}))
+"""
+
+MODES = {'lazy': 'false', 'prewarm': 'true'}
+
+
+def run_once(path, prewarm):
+    env = dict(os.environ, APP_PREWARM=prewarm, PYTHONPATH=ROOT)
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', CHILD, path], cwd=ROOT, env=env,
+                          capture_output=True, text=True)
+    elapsed = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        raise SystemExit(f"child failed:\n{proc.stderr[-2000:]}")
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    timings['process_ms'] = elapsed
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/employees')
+    args = parser.parse_args()
+
+    results = {mode: [] for mode in MODES}
+    for _ in range(args.runs):
+        for mode, prewarm in MODES.items():
+            results[mode].append(run_once(args.path, prewarm))
+
+    columns = ['import_ms', 'create_app_ms', 'first_request_ms', 'import_to_first_response_ms',
+               'second_request_ms', 'process_ms']
+    print(f"runs={args.runs} path={args.path} (median ms; status {results['lazy'][0]['status']})")
+    print(f"{'step':<30} " + ' '.join(f"{mode:>9}" for mode in MODES))
+    for column in columns:
+        values = ' '.join(f"{statistics.median(r[column] for r in results[mode]):>9.1f}" for mode in MODES)
+        print(f"{column:<30} {values}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Measure what server-side prepared statements save on the hot user queries.
+
+For each read statement in statements.py it reports:
+  - mean client-side latency per call, sent as plain text vs as EXECUTE
+  - PostgreSQL's own planning time (EXPLAIN ANALYZE) for both forms
+
+Uses the database configured in .env. Writes are not exercised, since their
+planning cost is the same kind as the reads'.
+
+Usage:
+    python benchmarks/benchmark_statements.py [--iterations 5000]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import statements  # noqa: E402
+from database import db_instance  # noqa: E402
+
+PLANNING_RE = re.compile(r'Planning Time: ([\d.]+) ms')
+
+
+def sample_params():
+    user = db_instance.fetch_one("SELECT id, username FROM users ORDER BY id LIMIT 1")
+    if user is None:
+        raise SystemExit("The users table is empty; add a user first")
+    return {
+        statements.USER_BY_USERNAME: (user['username'],),
+        statements.USER_FOR_LOGIN: (user['username'],),
+        statements.USER_BY_ID: (user['id'],),
+        statements.USER_PAGE: (0, 51),
+    }
+
+
+def time_calls(statement, params, iterations, prepared):
+    statements.registry.enabled = prepared
+    with db_instance.transaction():
+        # Warm up: prepares the statement and lets PostgreSQL pick a generic plan
+        for _ in range(10):
+            db_instance.execute_query(statement, params)
+        started = time.perf_counter()
+        for _ in range(iterations):
+            db_instance.execute_query(statement, params)
+        return (time.perf_counter() - started) / iterations
+
+
+def planning_ms(statement, params, prepared):
+    sql_text = statement.execute_sql if prepared else statement.sql
+    with db_instance.transaction():
+        if prepared:
+            # Make sure the session has it prepared and past the custom-plan phase
+            statements.registry.enabled = True
+            for _ in range(10):
+                db_instance.execute_query(statement, params)
+        rows = db_instance.execute_query(f"EXPLAIN (ANALYZE, SUMMARY) {sql_text}", params)
+    plan = '\n'.join(row['QUERY PLAN'] for row in rows)
+    match = PLANNING_RE.search(plan)
+    return float(match.group(1)) if match else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"iterations={args.iterations}")
+    print(f"{'statement':<18} {'text us':>9} {'prepared us':>12} {'saved':>7} {'plan ms text':>13} {'plan ms prep':>13}")
+    enabled = statements.registry.enabled
+    try:
+        for statement, params in sample_params().items():
+            text = time_calls(statement, params, args.iterations, prepared=False)
+            prepared = time_calls(statement, params, args.iterations, prepared=True)
+            plan_text = planning_ms(statement, params, prepared=False)
+            plan_prepared = planning_ms(statement, params, prepared=True)
+            print(f"{statement.name:<18} {text * 1e6:>9.1f} {prepared * 1e6:>12.1f} "
+                  f"{(1 - prepared / text) * 100:>6.1f}% {plan_text:>13.3f} {plan_prepared:>13.3f}")
+    finally:
+        statements.registry.enabled = enabled
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
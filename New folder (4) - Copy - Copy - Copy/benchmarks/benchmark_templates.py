@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Measure dashboard render time against row count, with and without fragment caching.
+
+admin_dashboard.html is rendered for pages of synthetic users four ways:
+without the fragment cache, with an empty cache (every row rendered and
+stored), with every row cached, and with `--changed` percent of the rows
+updated (new row_version) before each render. The customer dashboard is
+timed uncached and cached. Also reports what loading the admin template
+costs a new process: compiling it from source vs loading the bytecode cache.
+
+Needs no database.
+
+Usage:
+    python benchmarks/benchmark_templates.py [--rows 50,500,5000] [--iterations 50] [--changed 1]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jinja2 import FileSystemBytecodeCache  # noqa: E402
+
+from app import USER_LIST_COLUMNS, create_app  # noqa: E402
+from cache import TTLCache  # noqa: E402
+
+
+def make_users(count):
+    return [{'id': n, 'username': f'user{n}', 'role': 'customer' if n % 10 else 'admin', 'row_version': 1}
+            for n in range(1, count + 1)]
+
+
+def timed(iterations, render, before=None):
+    samples = []
+    for _ in range(iterations):
+        if before:
+            before()
+        started = time.perf_counter()
+        render()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def template_load_ms(app, name, bytecode_cache, iterations):
+    """Median time for a fresh environment (as in a new worker) to load `name`."""
+    samples = []
+    for _ in range(iterations):
+        env = app.jinja_env.overlay(bytecode_cache=bytecode_cache, cache_size=0)
+        started = time.perf_counter()
+        env.get_template(name)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', default='50,500,5000')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--changed', type=float, default=1.0, help="percent of rows updated between renders")
+    args = parser.parse_args()
+
+    app = create_app()
+    env = app.jinja_env
+    admin = env.get_template('admin_dashboard.html')
+    customer = env.get_template('customer_dashboard.html')
+    columns = list(USER_LIST_COLUMNS)
+
+    with app.test_request_context('/admin/dashboard'):
+        print(f"iterations={args.iterations} changed={args.changed}% (median ms per render)")
+        print(f"{'rows':>6} {'uncached':>9} {'cold':>9} {'cached':>9} {'changed':>9}")
+        for count in [int(n) for n in args.rows.split(',')]:
+            users = make_users(count)
+
+            def render():
+                admin.render(users=users, columns=columns, fields=None, after=0, next_after=None, limit=count)
+
+            env.fragment_cache = None
+            uncached = timed(args.iterations, render)
+
+            env.fragment_cache = TTLCache(maxsize=count * 4, ttl=3600)
+            cold = timed(args.iterations, render, before=env.fragment_cache.clear)
+            cached = timed(args.iterations, render)
+
+            step = max(1, int(100 / args.changed)) if args.changed > 0 else count + 1
+
+            def update_rows():
+                for user in users[::step]:
+                    user['row_version'] += 1
+            changed = timed(args.iterations, render, before=update_rows)
+            print(f"{count:>6} {uncached:>9.3f} {cold:>9.3f} {cached:>9.3f} {changed:>9.3f}")
+
+        user = make_users(1)[0]
+        env.fragment_cache = None
+        uncached = timed(args.iterations, lambda: customer.render(user=user))
+        env.fragment_cache = TTLCache(maxsize=16, ttl=3600)
+        cached = timed(args.iterations, lambda: customer.render(user=user))
+        print(f"\ncustomer dashboard: uncached {uncached:.3f} ms, cached {cached:.3f} ms")
+
+    bytecode_cache = FileSystemBytecodeCache(tempfile.mkdtemp(prefix='bench-jinja-'))
+    compile_ms = template_load_ms(app, 'admin_dashboard.html', None, args.iterations)
+    template_load_ms(app, 'admin_dashboard.html', bytecode_cache, 1)
+    bytecode_ms = template_load_ms(app, 'admin_dashboard.html', bytecode_cache, args.iterations)
+    print(f"admin template load: compile {compile_ms:.3f} ms, from bytecode cache {bytecode_ms:.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
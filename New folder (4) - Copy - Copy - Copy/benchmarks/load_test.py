@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Concurrent load test for the Flask app.
+
+Each workload runs `--threads` clients for `--seconds` through Flask's test
+client, against the database configured in .env (or a SQLite file with
+--backend sqlite, see DB_BACKEND / SQLITE_PATH):
+
+    login       POST /login
+    dashboard   GET /admin/dashboard and /customer/dashboard
+    user_crud   add, edit and delete a user through the admin pages
+    employees   create, read, update and delete through /employees
+
+For every workload it reports requests/s, p50/p95/p99 latency and database
+round trips per request. Results are written as JSON so runs on different
+commits can be compared with --compare.
+
+Usage:
+    python benchmarks/load_test.py [--workloads login,employees] [--threads 8] [--seconds 10]
+                                   [--backend postgres|sqlite]
+                                   [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BACKENDS = ('postgres', 'sqlite')
+# The backend is picked when database.py is imported, so read it before the app is
+_backend_parser = argparse.ArgumentParser(add_help=False)
+_backend_parser.add_argument('--backend', choices=BACKENDS)
+_backend = _backend_parser.parse_known_args()[0].backend
+if _backend:
+    os.environ['DB_BACKEND'] = _backend
+# Every client logs in as one user from one address: measure the app, not the rate limits
+os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+os.environ.setdefault('ADMISSION_POOL_RESERVE', '-1')
+os.environ.setdefault('LOGIN_CONCURRENCY', '0')
+os.environ.setdefault('ADMIN_WRITE_CONCURRENCY', '0')
+
+import passwords  # noqa: E402
+from app import app  # noqa: E402
+from auth import issue_token  # noqa: E402
+from config import Config  # noqa: E402
+from database import db_instance  # noqa: E402
+
+BENCH_PREFIX = '__bench_'
+BENCH_PASSWORD = 'bench-password'
+
+
+class Recorder:
+    """Latencies and round trips of one workload, shared by its client threads."""
+
+    def __init__(self):
+        self.latencies = []
+        self.round_trips = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def call(self, client, method, path, expect, **kwargs):
+        """Issue one request; returns the response, or None if it failed."""
+        trips = db_instance.round_trips()
+        started = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        elapsed = time.perf_counter() - started
+        # The test client runs the view in this thread, so the thread's
+        # round-trip counter covers exactly this request
+        trips = db_instance.round_trips() - trips
+        ok = response.status_code == expect
+        with self._lock:
+            self.latencies.append(elapsed)
+            self.round_trips += trips
+            if not ok:
+                self.errors += 1
+        return response if ok else None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+# ------------------------
+# Fixtures
+# ------------------------
+def create_bench_user(role):
+    """A user to log in as; its hash uses the current cost so no rehash is triggered."""
+    username = f'{BENCH_PREFIX}{role}'
+    db_instance.execute_query("DELETE FROM users WHERE username=%s", (username,))
+    db_instance.execute_query(
+        "INSERT INTO users (username, password, role) VALUES (%s, %s, %s)",
+        (username, passwords.hash_password(BENCH_PASSWORD), role)
+    )
+    return {'username': username, 'role': role}
+
+
+def cleanup():
+    db_instance.execute_query("DELETE FROM users WHERE username LIKE %s", (BENCH_PREFIX.replace('_', r'\_') + '%',))
+    if 'email' in db_instance.get_table_columns('employees'):
+        db_instance.execute_query("DELETE FROM employees WHERE email LIKE %s", ('bench+%@example.com',))
+
+
+def employee_payload():
+    return {
+        'name': 'Bench Employee',
+        'email': f'bench+{uuid.uuid4().hex}@example.com',
+        'department': 'Benchmarking',
+        'salary': 50000,
+    }
+
+
+# ------------------------
+# Workloads (one iteration each)
+# ------------------------
+def login_workload(client, rec, ctx):
+    rec.call(client, 'POST', '/login', 302, data={'username': ctx['customer'], 'password': BENCH_PASSWORD})
+
+
+def dashboard_workload(client, rec, ctx):
+    client.set_cookie('token', ctx['admin_token'])
+    rec.call(client, 'GET', '/admin/dashboard', 200)
+    client.set_cookie('token', ctx['customer_token'])
+    rec.call(client, 'GET', '/customer/dashboard', 200)
+
+
+def user_crud_workload(client, rec, ctx):
+    client.set_cookie('token', ctx['admin_token'])
+    username = f'{BENCH_PREFIX}{uuid.uuid4().hex[:12]}'
+    if not rec.call(client, 'POST', '/admin/add_user', 302,
+                    data={'username': username, 'password': BENCH_PASSWORD, 'role': 'customer'}):
+        return
+    user = db_instance.fetch_one("SELECT id FROM users WHERE username=%s", (username,))
+    rec.call(client, 'POST', f"/admin/edit_user/{user['id']}", 302,
+             data={'username': username, 'password': '', 'role': 'customer'})
+    rec.call(client, 'GET', f"/admin/delete_user/{user['id']}", 302)
+
+
+def employees_workload(client, rec, ctx):
+    client.set_cookie('token', ctx['admin_token'])
+    response = rec.call(client, 'POST', '/employees', 201, json=employee_payload())
+    if response is None:
+        return
+    employee_id = response.get_json()['data']['id']
+    rec.call(client, 'GET', f'/employees/{employee_id}', 200)
+    rec.call(client, 'PUT', f'/employees/{employee_id}', 200, json={'salary': 55000})
+    rec.call(client, 'DELETE', f'/employees/{employee_id}', 200)
+
+
+WORKLOADS = {
+    'login': login_workload,
+    'dashboard': dashboard_workload,
+    'user_crud': user_crud_workload,
+    'employees': employees_workload,
+}
+
+
+def run_workload(workload, threads, seconds, ctx):
+    rec = Recorder()
+    stop = time.perf_counter() + seconds
+
+    def client_thread():
+        client = app.test_client()
+        try:
+            while time.perf_counter() < stop:
+                workload(client, rec, ctx)
+        finally:
+            db_instance.disconnect()
+
+    workers = [threading.Thread(target=client_thread) for _ in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(rec.latencies)
+    requests = len(latencies)
+    return {
+        'requests': requests,
+        'errors': rec.errors,
+        'elapsed_sec': round(elapsed, 3),
+        'requests_per_sec': round(requests / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'db_round_trips_per_request': round(rec.round_trips / requests, 2) if requests else 0.0,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    print(f"{'workload':<12} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'trips/req':>10} {'errors':>7}")
+    for name, r in results.items():
+        print(f"{name:<12} {r['requests_per_sec']:>9} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} "
+              f"{r['db_round_trips_per_request']:>10} {r['errors']:>7}")
+        old = (baseline or {}).get(name)
+        if old:
+            def delta(key):
+                return f"{(r[key] - old[key]) / old[key] * 100:+.0f}%" if old[key] else 'n/a'
+            print(f"{'  vs base':<12} {delta('requests_per_sec'):>9} {delta('p50_ms'):>8} {delta('p95_ms'):>8} "
+                  f"{delta('p99_ms'):>8} {delta('db_round_trips_per_request'):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workloads', default=','.join(WORKLOADS))
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--backend', choices=BACKENDS, help="Database backend (default: DB_BACKEND from .env)")
+    parser.add_argument('--output', help="JSON file to write (default: benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument('--compare', help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    names = [w.strip() for w in args.workloads.split(',') if w.strip()]
+    unknown = [w for w in names if w not in WORKLOADS]
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(unknown)}")
+
+    cleanup()
+    customer = create_bench_user('customer')
+    ctx = {
+        'customer': customer['username'],
+        'admin_token': issue_token(create_bench_user('admin')),
+        'customer_token': issue_token(customer),
+    }
+
+    results = {}
+    try:
+        for name in names:
+            results[name] = run_workload(WORKLOADS[name], args.threads, args.seconds, ctx)
+    finally:
+        cleanup()
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.datetime.utcnow().isoformat(timespec='seconds'),
+        'backend': Config.DB_BACKEND,
+        'threads': args.threads,
+        'seconds': args.seconds,
+        'results': results,
+    }
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f"{commit or 'nogit'}-{datetime.datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+    print(f"\nSaved results to {output}")
+    return 1 if any(r['errors'] for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a TTL.
+
+    Holds at most `maxsize` entries; the least recently used one is evicted
+    first. Each entry lives `ttl` seconds unless set() is given its own ttl.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# ------------------------
+# Dashboard cache backends
+# ------------------------
+class CacheBackend:
+    """Interface for the shared dashboard cache.
+
+    Values must be picklable. incr() is an atomic counter used for the
+    per-table version numbers that DataCache folds into its keys.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def incr(self, key):
+        raise NotImplementedError
+
+    def counter(self, key):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+class LocalCacheBackend(CacheBackend):
+    """In-process LRU backend; each worker process has its own copy."""
+
+    def __init__(self, maxsize=10000, ttl=60.0):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl=None):
+        self._cache.set(key, value, ttl)
+
+    def delete(self, key):
+        self._cache.delete(key)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def counter(self, key):
+        return self._counters.get(key, 0)
+
+    def stats(self):
+        return dict(self._cache.stats(), backend='local')
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """Backend stored in a SQLite file, shared by every worker on the host.
+
+    Uses WAL mode so readers never block on the occasional writer, and one
+    connection per thread. Expired rows are purged lazily on write.
+    """
+
+    def __init__(self, path, ttl=60.0, purge_every=500):
+        self.path = path
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None,
+                                         check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time() + ttl),
+        )
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % self.purge_every == 0
+        if purge:
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def incr(self, key):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR IGNORE INTO counters (key, value) VALUES (?, 0)", (key,))
+            conn.execute("UPDATE counters SET value = value + 1 WHERE key = ?", (key,))
+            value = conn.execute("SELECT value FROM counters WHERE key = ?", (key,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def counter(self, key):
+        row = self._conn().execute("SELECT value FROM counters WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def stats(self):
+        size = self._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'sqlite',
+                'path': self.path,
+                'size': size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class DataCache:
+    """Versioned cache for query results, keyed per table ("namespace").
+
+    Every key embeds the namespace's current version, so bump() after a write
+    makes all cached entries for that table unreachable at once, in every
+    worker sharing the backend. Stale entries then simply age out.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def version(self, namespace):
+        return self.backend.counter(f"version:{namespace}")
+
+    def bump(self, namespace):
+        return self.backend.incr(f"version:{namespace}")
+
+    def key(self, namespace, *parts):
+        return f"{namespace}:v{self.version(namespace)}:" + ':'.join(str(p) for p in parts)
+
+    def get_or_load(self, namespace, *parts, loader, ttl=None):
+        """Return the cached value, or call loader() and cache its result.
+
+        The key (and so the version) is fixed before loader() runs: if a write
+        bumps the version meanwhile, the freshly loaded value lands under the
+        old version and is never served.
+        """
+        key = self.key(namespace, *parts)
+        value = self.backend.get(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.backend.set(key, value, ttl)
+        return value
+
+    def stats(self):
+        return self.backend.stats()
+
+
+def create_backend(config):
+    """Build the backend selected by Config.CACHE_BACKEND ('local' or 'sqlite')."""
+    if config.CACHE_BACKEND == 'sqlite':
+        return SQLiteCacheBackend(config.CACHE_SQLITE_PATH, ttl=config.CACHE_TTL)
+    if config.CACHE_BACKEND == 'local':
+        return LocalCacheBackend(maxsize=config.CACHE_SIZE, ttl=config.CACHE_TTL)
+    raise ValueError(f"Unknown CACHE_BACKEND: {config.CACHE_BACKEND}")
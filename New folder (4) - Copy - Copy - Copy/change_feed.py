@@ -0,0 +1,224 @@
+"""
+Fan-out of row changes to Server-Sent Events subscribers.
+
+Triggers on users/employees (migration 0007) NOTIFY 'table_changes' with one
+JSON message per changed row. The process-wide NotificationListener receives
+them on its single connection and the ChangeFeed hands each one to every
+subscriber interested in that table, so subscribers cost a queue each, not a
+database connection.
+
+A subscriber that falls behind (its queue is full) or that reconnects after
+events have left the replay buffer is sent a 'reload' event and should
+refetch its data; so is everyone when the listener itself had to reconnect.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import queue
+import threading
+import uuid
+from collections import deque
+
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'table_changes'
+TABLES = ('users', 'employees')
+
+# Events are (event id, change) pairs; this one tells the client to refetch everything
+RELOAD = (None, {'table': None, 'op': 'reload'})
+
+# How many of the given trigger names exist; without them nothing ever NOTIFYs
+NOTIFY_TRIGGER_COUNT = "SELECT count(*) AS installed FROM pg_trigger WHERE tgname = ANY(%s)"
+
+
+def notify_triggers(tables):
+    """Names of the row triggers migration 0007 creates on `tables`."""
+    return [f'{table}_notify_{op}' for table in tables for op in ('insert', 'update', 'delete')]
+
+
+class Subscription:
+    """One subscriber's queue of pending events, filtered by table."""
+
+    def __init__(self, tables, maxsize):
+        self.tables = frozenset(tables)
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Next event, a reload after an overflow, or None on timeout."""
+        if self.overflowed:
+            self._drain()
+            return self._reload()
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _drain(self):
+        self.overflowed = False
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def _reload(self):
+        return RELOAD
+
+
+class AsyncSubscription(Subscription):
+    """Subscription consumed from an event loop; push() may be called from any thread."""
+
+    def __init__(self, tables, maxsize, loop):
+        super().__init__(tables, maxsize)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def push(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Event loop already closed (server shutting down)
+            pass
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        if self.overflowed:
+            self._drain()
+            return self._reload()
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def _drain(self):
+        self.overflowed = False
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+
+class ChangeFeed:
+    def __init__(self, listener_factory, queue_size=1000, replay_size=1000):
+        self._listener_factory = listener_factory
+        self.queue_size = queue_size
+        # Event ids are "<feed id>-<sequence>", so a client reconnecting to a
+        # different process (or after a restart) is told to reload
+        self.feed_id = uuid.uuid4().hex[:8]
+        self._sequence = itertools.count(1)
+        self._replay = deque(maxlen=replay_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._listening = False
+        self.published = 0
+
+    def subscribe(self, tables, last_event_id=None, loop=None):
+        """Register a subscriber; returns (subscription, events to replay first)."""
+        self._ensure_listening()
+        if loop is None:
+            subscription = Subscription(tables, self.queue_size)
+        else:
+            subscription = AsyncSubscription(tables, self.queue_size, loop)
+        with self._lock:
+            self._subscribers.add(subscription)
+            replay = self._events_since(last_event_id, subscription.tables)
+        return subscription, replay
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _events_since(self, last_event_id, tables):
+        if not last_event_id:
+            return []
+        feed_id, _, sequence = last_event_id.partition('-')
+        if feed_id != self.feed_id or not sequence.isdigit():
+            return [RELOAD]
+        sequence = int(sequence)
+        if self._replay and self._replay[0][0] > sequence + 1:
+            # Some of the events the client missed were already dropped from the buffer
+            return [RELOAD]
+        return [event for seq, event in self._replay if seq > sequence and event[1]['table'] in tables]
+
+    def _ensure_listening(self):
+        if self._listening:
+            return
+        with self._lock:
+            if not self._listening:
+                self._listener_factory().subscribe(CHANNEL, self._on_notify)
+                self._listening = True
+
+    def _on_notify(self, channel, payload):
+        if payload is None:
+            # The listener reconnected; anything sent meanwhile was lost
+            for table in TABLES:
+                self.publish({'table': table, 'op': 'reload'})
+            return
+        try:
+            change = json.loads(payload)
+        except ValueError:
+            logger.warning(f"Ignoring malformed {CHANNEL} payload: {payload[:200]}")
+            return
+        self.publish(change)
+
+    def publish(self, change):
+        with self._lock:
+            sequence = next(self._sequence)
+            event = (f'{self.feed_id}-{sequence}', change)
+            self._replay.append((sequence, event))
+            subscribers = [s for s in self._subscribers if change.get('table') in s.tables]
+            self.published += 1
+        for subscription in subscribers:
+            subscription.push(event)
+
+    def stats(self):
+        return {
+            'subscribers': len(self._subscribers),
+            'published': self.published,
+            'listening': self._listening,
+        }
+
+
+def format_event(event):
+    """Serialize an (event id, change) pair in text/event-stream framing."""
+    event_id, change = event
+    lines = [f'id: {event_id}'] if event_id else []
+    lines.append('event: change')
+    lines.append('data: ' + json.dumps(change, default=str))
+    return '\n'.join(lines) + '\n\n'
+
+
+# Sent when nothing happened for a while, so proxies keep the stream open
+KEEPALIVE = ': keepalive\n\n'
+
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def get_feed(config=None):
+    """Return the process-wide feed, listening through notifications.get_listener().
+
+    Its queue size comes from `config` (default: Config()) when it is first built.
+    """
+    global _feed
+    if _feed is None:
+        with _feed_lock:
+            if _feed is None:
+                from config import Config
+                from notifications import get_listener
+                config = config or Config()
+                _feed = ChangeFeed(get_listener, queue_size=config.CHANGE_FEED_QUEUE_SIZE)
+    return _feed
@@ -1,24 +1,180 @@
 import os
-from dotenv import load_dotenv
+import tempfile
+
+
+def _find_env_file():
+    """The .env python-dotenv would load: next to this file or in a parent directory."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, '.env')
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+# Load environment variables from .env file; deployments that set the environment
+# directly ship none, and then python-dotenv is not even imported
+_env_file = _find_env_file()
+if _env_file:
+    from dotenv import load_dotenv
+    load_dotenv(_env_file)
 
-# Load environment variables from .env file
-load_dotenv()
 
 class Config:
+    # 'postgres', or 'sqlite' for the embedded single-file engine (sqlite_database.py)
+    DB_BACKEND = os.getenv('DB_BACKEND', 'postgres').lower()
+
     # Database configuration
     DB_HOST = os.getenv('DB_HOST', 'localhost')
     DB_PORT = os.getenv('DB_PORT', '5432')
     #DB_NAME = os.getenv('DB_NAME', 'postgres')
-    DB_NAME = os.getenv('DB_NAME')
+    DB_NAME = os.getenv('DB_NAME', 'employee_db')
 
     DB_USER = os.getenv('DB_USER', 'postgres')
     DB_PASSWORD = os.getenv('DB_PASSWORD', '123')
 
+    # Connection pool configuration
+    DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+    DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))              # seconds to wait for a free connection
+    DB_POOL_IDLE_TIMEOUT = float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300'))    # close idle connections after this
+    DB_POOL_HEALTH_CHECK_AFTER = float(os.getenv('DB_POOL_HEALTH_CHECK_AFTER', '30'))  # ping on checkout if idle this long
+
+    # SQLite backend: database file, how long a writer waits for the write lock, fsync level
+    # (NORMAL is safe with WAL: a power loss can only drop the last commits) and page cache size
+    SQLITE_PATH = os.getenv('SQLITE_PATH', 'employee.db')
+    SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '5'))          # seconds
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+    SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', '65536'))
+
+    # Read replicas: comma-separated host[:port] entries or libpq DSNs (user, password and
+    # database default to the primary's). Read-only statements go to a replica picked
+    # 'round_robin' or 'least_loaded'; a user's reads stay on the primary for
+    # DB_REPLICA_STICKY_SECONDS after they write. A replica that fails is skipped for
+    # DB_REPLICA_EJECT_SECONDS; every DB_REPLICA_CHECK_INTERVAL seconds replicas are pinged
+    # and those more than DB_REPLICA_MAX_LAG_BYTES of WAL behind are skipped (0 = no limit)
+    DB_REPLICAS = [s.strip() for s in os.getenv('DB_REPLICAS', '').split(',') if s.strip()]
+    DB_REPLICA_SELECTION = os.getenv('DB_REPLICA_SELECTION', 'round_robin')
+    DB_REPLICA_POOL_MAX = int(os.getenv('DB_REPLICA_POOL_MAX', os.getenv('DB_POOL_MAX', '10')))
+    DB_REPLICA_STICKY_SECONDS = float(os.getenv('DB_REPLICA_STICKY_SECONDS', '5'))
+    DB_REPLICA_EJECT_SECONDS = float(os.getenv('DB_REPLICA_EJECT_SECONDS', '30'))
+    DB_REPLICA_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '5'))
+    DB_REPLICA_MAX_LAG_BYTES = int(os.getenv('DB_REPLICA_MAX_LAG_BYTES', str(16 * 1024 * 1024)))
+
+    # Run the hot user queries as server-side prepared statements (see statements.py);
+    # turn off behind a transaction-mode pooler such as PgBouncer
+    DB_PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', 'True').lower() == 'true'
+
+    # Table/column metadata cache; also refreshed by NOTIFY schema_changed when SCHEMA_LISTEN is on
+    SCHEMA_CACHE_TTL = float(os.getenv('SCHEMA_CACHE_TTL', '300'))
+    SCHEMA_LISTEN = os.getenv('SCHEMA_LISTEN', 'True').lower() == 'true'
+
+    # Admin user list pagination
+    ADMIN_PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', '50'))
+    ADMIN_PAGE_SIZE_MAX = int(os.getenv('ADMIN_PAGE_SIZE_MAX', '500'))
+
+    # Largest array accepted by the /employees/bulk endpoints
+    BULK_MAX_RECORDS = int(os.getenv('BULK_MAX_RECORDS', '100000'))
+
+    # In-process cache for decoded JWTs
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '10000'))
+    TOKEN_CACHE_TTL = float(os.getenv('TOKEN_CACHE_TTL', '300'))
+
+    # Dashboard data cache: 'local' (per process) or 'sqlite' (shared by all workers on the host)
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'local')
+    CACHE_SIZE = int(os.getenv('CACHE_SIZE', '10000'))
+    CACHE_TTL = float(os.getenv('CACHE_TTL', '60'))
+    CACHE_SQLITE_PATH = os.getenv('CACHE_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'customer_app_cache.sqlite3'))
+
+    # Rendered template fragments ({% cache %} blocks, see fragments.py), per process; 0 disables.
+    # Compiled templates are kept as bytecode in TEMPLATE_CACHE_DIR (default: a per-user
+    # directory under the system temp dir), so new workers skip parsing and compiling them
+    FRAGMENT_CACHE_SIZE = int(os.getenv('FRAGMENT_CACHE_SIZE', '20000'))
+    FRAGMENT_CACHE_TTL = float(os.getenv('FRAGMENT_CACHE_TTL', '3600'))
+    TEMPLATE_BYTECODE_CACHE = os.getenv('TEMPLATE_BYTECODE_CACHE', 'True').lower() == 'true'
+    TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR') or None
+
+    # Password hashing (PBKDF2-SHA256); raising the iterations rehashes users on their next login
+    PASSWORD_HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', '260000'))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 2)))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '64'))
+    PASSWORD_REHASH_ON_STARTUP = os.getenv('PASSWORD_REHASH_ON_STARTUP', 'False').lower() == 'true'
+
+    # Rate limits (token buckets, see ratelimit.py): BURST requests at once, then RATE per second.
+    # Logins are limited per client IP and per username, admin writes per admin; a rate of 0
+    # disables one limit. 'local' keeps the buckets per process, 'sqlite' shares them between
+    # all workers on the host
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+    RATE_LIMIT_STORE = os.getenv('RATE_LIMIT_STORE', 'local')
+    RATE_LIMIT_SQLITE_PATH = os.getenv('RATE_LIMIT_SQLITE_PATH',
+                                       os.path.join(tempfile.gettempdir(), 'customer_app_ratelimit.sqlite3'))
+    LOGIN_RATE_PER_IP = float(os.getenv('LOGIN_RATE_PER_IP', '1'))
+    LOGIN_BURST_PER_IP = int(os.getenv('LOGIN_BURST_PER_IP', '20'))
+    LOGIN_RATE_PER_USER = float(os.getenv('LOGIN_RATE_PER_USER', '0.1'))
+    LOGIN_BURST_PER_USER = int(os.getenv('LOGIN_BURST_PER_USER', '10'))
+    ADMIN_WRITE_RATE = float(os.getenv('ADMIN_WRITE_RATE', '5'))
+    ADMIN_WRITE_BURST = int(os.getenv('ADMIN_WRITE_BURST', '50'))
+    # Number of proxies in front of the app whose X-Forwarded-For entries are trusted for the client IP
+    PROXY_COUNT = int(os.getenv('PROXY_COUNT', '0'))
+
+    # Logins and admin writes are admitted while nobody waits for a pooled connection and more
+    # than ADMISSION_POOL_RESERVE are free (-1 = don't look at the pool), so the reserve is
+    # left for the dashboards and API. *_CONCURRENCY optionally caps how many run at once per
+    # process (0 = no cap). A request waits ADMISSION_TIMEOUT seconds for room, then gets a 503
+    ADMISSION_POOL_RESERVE = int(os.getenv('ADMISSION_POOL_RESERVE', str(max(1, DB_POOL_MAX // 4))))
+    LOGIN_CONCURRENCY = int(os.getenv('LOGIN_CONCURRENCY', '0'))
+    ADMIN_WRITE_CONCURRENCY = int(os.getenv('ADMIN_WRITE_CONCURRENCY', '0'))
+    ADMISSION_TIMEOUT = float(os.getenv('ADMISSION_TIMEOUT', '0.2'))
+
+    # asyncio connection pool used by the ASGI app (asgi_app.py)
+    ASYNC_DB_POOL_MIN = int(os.getenv('ASYNC_DB_POOL_MIN', '1'))
+    ASYNC_DB_POOL_MAX = int(os.getenv('ASYNC_DB_POOL_MAX', '20'))
+
+    # Statements slower than this are logged to the `slow_query` logger
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+
+    # HTTP caching: static assets may be reused for this long without revalidating;
+    # HTML/JSON bodies of at least COMPRESS_MIN_SIZE bytes are gzip/brotli encoded
+    STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', '3600'))
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '6'))
+    # /events change feed: events buffered per subscriber before it is told to reload,
+    # and seconds between keepalive comments on an idle stream
+    CHANGE_FEED_QUEUE_SIZE = int(os.getenv('CHANGE_FEED_QUEUE_SIZE', '1000'))
+    CHANGE_FEED_KEEPALIVE = float(os.getenv('CHANGE_FEED_KEEPALIVE', '15'))
+
+    # Background jobs (jobs.py): worker processes per `python jobs.py worker`, seconds between
+    # queue polls when no NOTIFY arrives, heartbeat age after which a running job is requeued,
+    # base retry delay (doubled per attempt), and where uploads/export files are kept
+    # (must be shared storage if workers run on other hosts)
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '5'))
+    JOB_STALE_AFTER = float(os.getenv('JOB_STALE_AFTER', '300'))
+    JOB_RETRY_DELAY = float(os.getenv('JOB_RETRY_DELAY', '10'))
+    JOB_FILES_DIR = os.getenv('JOB_FILES_DIR', os.path.join(tempfile.gettempdir(), 'customer_app_jobs'))
+
+    # Folded into every ETag; set it per release when hosts behind one load balancer
+    # may have different file mtimes (by default it is derived from them)
+    APP_BUILD_ID = os.getenv('APP_BUILD_ID', '')
+
     DEBUG = True
     
-    # Flask configuration
+    # Flask configuration; FLASK_ENV=production turns off debug/reloader and switches to JSON logs
     FLASK_ENV = os.getenv('FLASK_ENV', 'development')
-    DEBUG = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
+    DEBUG = os.getenv('FLASK_DEBUG', str(FLASK_ENV == 'development')).lower() == 'true'
+
+    # Logging (see logging_config.py)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text' if FLASK_ENV == 'development' else 'json')
+    LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0' if FLASK_ENV == 'development' else '0.01'))
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+    # create_app() builds nothing it does not need; with APP_PREWARM it opens the pool, loads
+    # the schema cache and compiles the templates before serving instead of on first use
+    APP_PREWARM = os.getenv('APP_PREWARM', 'False').lower() == 'true'
     
     @property
     def DATABASE_URL(self):
@@ -26,4 +182,8 @@ class Config:
     
     @property
     def SQLITE_URL(self):
-        return "sqlite:///employee.db"
+        return f"sqlite:///{self.SQLITE_PATH}"
+
+    def same_as(self, other):
+        """Whether `other` holds the same settings (two plain Config() objects do)."""
+        return other is self or (type(other) is type(self) and vars(other) == vars(self))
@@ -1,94 +1,539 @@
 import psycopg2
+from psycopg2 import sql
 from psycopg2.extras import RealDictCursor
+from psycopg2 import extras
 from config import Config
+from db_pool import configure_pools, get_pool, get_replica_set, PoolTimeout
+from contextlib import contextmanager
+from functools import lru_cache
+import threading
 import logging
+import re
+import time
+import uuid
+
+import metrics
+from statements import Statement, registry as statement_registry
+from schema_cache import SchemaCache
+from cache import TTLCache
 
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class Database:
+# Errors that mean the connection itself is gone (server restart, network drop, ...)
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
 
+# Statements that may run on a read replica start with SELECT/WITH and contain none of
+# the constructs that write or lock (SELECT ... INTO, FOR UPDATE, nextval(), pg_notify(), ...)
+_READ_START_RE = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+_WRITE_RE = re.compile(
+    r'\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE|INTO|SHARE|NEXTVAL|SETVAL|PG_NOTIFY|PG_ADVISORY_\w+)\b',
+    re.IGNORECASE,
+)
 
+# execute_query() result when no replica could run a read
+_NO_REPLICA = object()
 
-    def __init__(self):
-        self.config = Config()
-        self.connection = None
-        
-        
-    def connect(self):
-        """Establish connection to PostgreSQL database"""
+
+class BaseDatabase:
+    """What every engine shares: per-thread bookkeeping and query helpers.
+
+    Engines implement connect/disconnect, transaction(), execute_query(),
+    stream_query(), execute_values(), execute_batch(), copy_expert() and
+    load_table_columns() with the same signatures as Database, and accept
+    queries written for PostgreSQL through psycopg2 (%s placeholders,
+    psycopg2.sql compositions, statements.Statement objects).
+    """
+
+    replicas = None
+    # Whether LISTEN/NOTIFY (the /events change feed, SCHEMA_LISTEN) can work on this engine
+    supports_notify = False
+
+    def __init__(self, config=None):
+        self.config = config or Config()
+        self._local = threading.local()
+
+    def begin_request(self, primary=False):
+        """Reset the current thread's read routing at the start of a request.
+
+        With primary=True every read of the request goes to the primary (the
+        client wrote through another process moments ago).
+        """
+        self._local.wrote = False
+        self._local.force_primary = primary
+        self._local.sticky_key = None
+
+    def set_sticky_key(self, key):
+        """Name the user behind the current request, for read-your-writes.
+
+        Once they write, their reads go to the primary for
+        DB_REPLICA_STICKY_SECONDS, so they never see a replica that has not
+        replayed their change yet.
+        """
+        self._local.sticky_key = key
+
+    @property
+    def wrote_in_request(self):
+        return getattr(self._local, 'wrote', False)
+
+    def round_trips(self):
+        """Statements and commits sent to the server by the current thread so far.
+
+        Take the difference between two calls to count the round trips of
+        one request (see benchmarks/load_test.py).
+        """
+        return getattr(self._local, 'round_trips', 0)
+
+    def _count_round_trips(self, n=1):
+        self._local.round_trips = getattr(self._local, 'round_trips', 0) + n
+
+    @property
+    def in_transaction(self):
+        return getattr(self._local, 'depth', 0) > 0
+
+    @contextmanager
+    def quiet_errors(self):
+        """Log statements failing inside the block at DEBUG instead of ERROR.
+
+        For callers that expect some statements to fail and handle the
+        errors themselves (the importer's row-by-row fallback).
+        """
+        previous = getattr(self._local, 'quiet', False)
+        self._local.quiet = True
         try:
-            self.connection = psycopg2.connect(
-                host=self.config.DB_HOST,
-                port=self.config.DB_PORT,
-                database=self.config.DB_NAME,
-                user=self.config.DB_USER,
-                password=self.config.DB_PASSWORD
-            )
-            logger.info("Successfully connected to PostgreSQL database")
+            yield self
+        finally:
+            self._local.quiet = previous
+
+    def _log_query_error(self, e):
+        level = logging.DEBUG if getattr(self._local, 'quiet', False) else logging.ERROR
+        logger.log(level, f"Database query error: {e}")
+
+    def get_table_columns(self, table_name: str):
+        """Return the (lowercased) column names of a table, from the schema cache."""
+        return self.schema.columns(table_name)
+
+    def fetch_page(self, table_name, columns, after_id=0, limit=50):
+        """Keyset-paginate a table by its `id` primary key.
+
+        Returns (rows, next_after); next_after is the id to pass as `after_id`
+        for the following page, or None on the last page. Each page is an
+        index range scan on id, so its cost does not grow with the table.
+        """
+        columns = list(columns)
+        if 'id' not in columns:
+            columns.insert(0, 'id')
+        query = sql.SQL("SELECT {cols} FROM {table} WHERE id > %s ORDER BY id ASC LIMIT %s").format(
+            cols=sql.SQL(', ').join(sql.Identifier(c) for c in columns),
+            table=sql.Identifier(table_name),
+        )
+        # Ask for one extra row to learn whether another page exists
+        rows = self.execute_query(query, (after_id, limit + 1), fetch=True)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, rows[-1]['id']
+        return rows, None
+
+    def fetch_one(self, query, params=None):
+        """Run a SELECT (or RETURNING) statement and return the first row or None."""
+        rows = self.execute_query(query, params, fetch=True)
+        return rows[0] if rows else None
+
+    def load_table_columns(self):
+        """table_name/column_name rows for every table, for the schema cache."""
+        raise NotImplementedError
+
+
+class Database(BaseDatabase):
+    """Data-access engine on top of the shared connection pool.
+
+    Each thread gets its own pooled connection: a plain execute_query() checks
+    one out, runs, commits and returns it, while `with db.transaction():` pins
+    a single connection to the current thread until the block ends, so every
+    statement inside it commits (or rolls back) together.
+    """
+
+    supports_notify = True
+
+    def __init__(self, pool=None, replicas=None, config=None):
+        super().__init__(config)
+        self._pool = pool
+        self._replicas = replicas
+        # Sticky keys (usernames) that wrote recently; their reads stay on the primary
+        self._recent_writers = TTLCache(maxsize=100000, ttl=self.config.DB_REPLICA_STICKY_SECONDS)
+        self.schema = SchemaCache(self, ttl=self.config.SCHEMA_CACHE_TTL, listen=self.config.SCHEMA_LISTEN)
+
+    @property
+    def pool(self):
+        return self._pool or get_pool(self.config)
+
+    @property
+    def replicas(self):
+        """The ReplicaSet reads are routed to, or None without DB_REPLICAS."""
+        if self._replicas is None and self.config.DB_REPLICAS:
+            self._replicas = get_replica_set(self.config)
+        return self._replicas
+
+    def _note_write(self):
+        self._local.wrote = True
+        key = getattr(self._local, 'sticky_key', None)
+        if key is not None:
+            self._recent_writers.set(key, True)
+
+    def _replicas_for(self, query):
+        """The ReplicaSet to run `query` on, or None if it must go to the primary."""
+        replicas = self.replicas
+        if replicas is None or self.in_transaction or self.connection is not None:
+            return None
+        local = self._local
+        if getattr(local, 'wrote', False) or getattr(local, 'force_primary', False):
+            return None
+        key = getattr(local, 'sticky_key', None)
+        if key is not None and self._recent_writers.get(key):
+            return None
+        return replicas if is_read_only(query) else None
+
+    @property
+    def connection(self):
+        """Connection held by the current thread, if any."""
+        return getattr(self._local, 'connection', None)
+
+    def connect(self):
+        """Check out a connection to PostgreSQL for the current thread"""
+        if self.connection is not None:
             return self.connection
+        try:
+            started = time.perf_counter()
+            self._local.connection = self.pool.acquire()
+            metrics.record_acquire(time.perf_counter() - started)
+            logger.debug("Checked out PostgreSQL connection from pool")
+            return self._local.connection
         except psycopg2.Error as e:
             logger.error(f"Error connecting to database: {e}")
             raise
-            
 
     def disconnect(self):
-        """Close database connection"""
-        if self.connection:
-            self.connection.close()
-            logger.info("Database connection closed")
-            
+        """Return the current thread's connection to the pool"""
+        conn = self.connection
+        if conn is not None:
+            self._local.connection = None
+            self._local.depth = 0
+            self.pool.release(conn, discard=conn.closed)
+            logger.debug("Returned PostgreSQL connection to pool")
+
     def get_cursor(self):
         """Get database cursor with RealDictCursor for easier JSON conversion"""
-        if not self.connection:
+        if self.connection is None or self.connection.closed:
+            self.disconnect()
             self.connect()
         return self.connection.cursor(cursor_factory=RealDictCursor)
 
-    def get_table_columns(self, table_name: str):
-        """Return a set of column names for given table (lowercased)."""
-        query = (
-            "SELECT column_name FROM information_schema.columns "
-            "WHERE table_schema = 'public' AND table_name = %s"
+    @contextmanager
+    def transaction(self):
+        """Run a block of statements as one unit of work.
+
+        Nested transaction() blocks join the outermost one; only the outermost
+        block commits or rolls back.
+        """
+        if self.in_transaction:
+            self._local.depth += 1
+            try:
+                yield self
+            finally:
+                self._local.depth -= 1
+            return
+
+        owns_connection = self.connection is None
+        conn = self.connect()
+        self._local.depth = 1
+        try:
+            yield self
+            conn.commit()
+            self._count_round_trips()
+            if self.replicas is not None:
+                self._note_write()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self._local.depth = 0
+            if owns_connection or conn.closed:
+                self.disconnect()
+
+    def load_table_columns(self):
+        return self.execute_query(
+            "SELECT table_name, column_name FROM information_schema.columns "
+            "WHERE table_schema = 'public'"
         )
-        rows = self.execute_query(query, (table_name,), fetch=True)
-        return {row['column_name'].lower() for row in rows}
-        
+
     def execute_query(self, query, params=None, fetch=True):
         """Execute a database query and return results.
 
         - SELECT queries return a list of rows (dicts)
         - INSERT/UPDATE/DELETE without RETURNING return affected rowcount
         - Any statement with RETURNING returns a list of rows
+
+        Outside of transaction() the statement commits on its own. If the
+        pooled connection turns out to be dead, it is replaced and the
+        statement retried once, but only while that cannot apply it twice:
+        before COMMIT was sent the server rolls the statement back with the
+        lost connection, after it the write may already be committed.
         """
-        #any
+        if self.in_transaction:
+            return self._run(self.connection, query, params, fetch)
+
+        replicas = self._replicas_for(query)
+        if replicas is not None:
+            result = self._execute_on_replica(replicas, query, params, fetch)
+            if result is not _NO_REPLICA:
+                return result
+
+        for attempt in (1, 2):
+            owns_connection = self.connection is None
+            conn = self.connect()
+            # In autocommit mode the statement commits as it runs
+            committing = conn.autocommit
+            try:
+                result = self._run(conn, query, params, fetch)
+                committing = True
+                conn.commit()
+                self._count_round_trips()
+                if self.replicas is not None and not is_read_only(query):
+                    self._note_write()
+                return result
+            except CONNECTION_ERRORS as e:
+                if not conn.closed or attempt == 2 or (committing and not is_read_only(query)):
+                    self._rollback_quietly(conn)
+                    raise
+                logger.warning(f"Database connection lost, reconnecting: {e}")
+                self.disconnect()
+            except psycopg2.Error:
+                self._rollback_quietly(conn)
+                raise
+            finally:
+                if owns_connection:
+                    self.disconnect()
+
+    def _execute_on_replica(self, replicas, query, params, fetch):
+        """Run a read on the first replica that answers; _NO_REPLICA if none did."""
+        for replica in replicas.ordered():
+            conn = None
+            try:
+                started = time.perf_counter()
+                conn = replica.pool.acquire()
+                metrics.record_acquire(time.perf_counter() - started)
+                result = self._run(conn, query, params, fetch)
+                conn.commit()
+                self._count_round_trips()
+                replica.reads += 1
+                return result
+            except (psycopg2.errors.ReadOnlySqlTransaction, psycopg2.errors.SerializationFailure) as e:
+                # A write that looked like a read, or a query cancelled by WAL replay
+                logger.warning(f"Read on replica {replica.name} failed, retrying on the primary: {e}")
+                break
+            except CONNECTION_ERRORS as e:
+                # QueryCanceled (statement_timeout) and other server-side errors are
+                # OperationalErrors too, but leave the replica and its connection healthy
+                if conn is not None and not conn.closed:
+                    raise
+                replicas.eject(replica, e)
+            except PoolTimeout:
+                # Busy rather than broken: try the next replica, then the primary
+                continue
+            finally:
+                if conn is not None:
+                    replica.pool.release(conn, discard=conn.closed)
+        return _NO_REPLICA
+
+    def _acquire_for_read(self, query):
+        """(pool, connection) for a dedicated read: a replica's if one can take it."""
+        replicas = self._replicas_for(query)
+        for replica in replicas.ordered() if replicas is not None else ():
+            try:
+                conn = replica.pool.acquire()
+                replica.reads += 1
+                return replica.pool, conn
+            except CONNECTION_ERRORS as e:
+                replicas.eject(replica, e)
+            except PoolTimeout:
+                continue
+        return self.pool, self.pool.acquire()
+
+    def stream_query(self, query, params=None, chunk_size=2000):
+        """Yield the rows of a SELECT in lists of `chunk_size` rows.
+
+        Uses a server-side (named) cursor on a dedicated pooled connection (a
+        replica's when read replicas are configured), so only one chunk is
+        ever held in memory. The connection goes back to the pool when the
+        generator is exhausted or closed early.
+        """
+        started = time.perf_counter()
+        pool, conn = self._acquire_for_read(query)
+        metrics.record_acquire(time.perf_counter() - started)
+        cursor = None
         try:
-            cursor = self.get_cursor()
+            cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=RealDictCursor)
+            cursor.itersize = chunk_size
+            started = time.perf_counter()
             cursor.execute(query, params)
+            self._observe(query, conn, started)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                self._count_round_trips()
+                if not rows:
+                    break
+                yield rows
+        finally:
+            if cursor is not None and not conn.closed:
+                try:
+                    cursor.close()
+                except psycopg2.Error:
+                    pass
+            pool.release(conn, discard=conn.closed)
 
-            upper_query = query.strip().upper()
+    def execute_values(self, query, argslist, template=None, page_size=1000, fetch=False):
+        """Run a multi-row `INSERT ... VALUES %s` for many rows.
 
-            if fetch:
-                if upper_query.startswith('SELECT') or ' RETURNING ' in upper_query:
-                    result = cursor.fetchall()
-                    self.connection.commit()
-                    return result
-                # Non-select and no RETURNING: return rowcount
-                self.connection.commit()
-                return cursor.rowcount
-            else:
-                self.connection.commit()
+        Rows are sent `page_size` at a time, all inside one transaction (the
+        caller's, if one is open). With fetch=True the RETURNING rows come back.
+        """
+        with self.transaction():
+            cursor = self.connection.cursor(cursor_factory=RealDictCursor)
+            self._count_round_trips(max(1, -(-len(argslist) // page_size)))
+            started = time.perf_counter()
+            try:
+                return extras.execute_values(cursor, query, argslist, template=template,
+                                             page_size=page_size, fetch=fetch)
+            finally:
+                self._observe(query, self.connection, started)
+                cursor.close()
+
+    def execute_batch(self, query, argslist, page_size=1000):
+        """Run one statement for many parameter sets, `page_size` per round trip."""
+        with self.transaction():
+            cursor = self.connection.cursor()
+            self._count_round_trips(max(1, -(-len(argslist) // page_size)))
+            started = time.perf_counter()
+            try:
+                extras.execute_batch(cursor, query, argslist, page_size=page_size)
+            finally:
+                self._observe(query, self.connection, started)
+                cursor.close()
+
+    def copy_expert(self, query, file):
+        """Run a COPY ... FROM STDIN / TO STDOUT statement against `file`."""
+        with self.transaction():
+            cursor = self.connection.cursor()
+            self._count_round_trips()
+            started = time.perf_counter()
+            try:
+                cursor.copy_expert(query, file)
                 return cursor.rowcount
+            finally:
+                self._observe(query, self.connection, started)
+                cursor.close()
+
+    def _run(self, conn, query, params, fetch):
+        cursor = None
+        try:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            sql_text = query
+            if isinstance(query, Statement):
+                sql_text = self._prepare(conn, cursor, query)
+            self._count_round_trips()
+            started = time.perf_counter()
+            cursor.execute(sql_text, params)
+
+            # cursor.description is set whenever the statement produced rows
+            # (SELECT, WITH ... SELECT, or anything with RETURNING)
+            if fetch and cursor.description is not None:
+                rows = cursor.fetchall()
+                self._observe(query, conn, started)
+                return rows
+            # Non-select and no RETURNING: return rowcount
+            self._observe(query, conn, started)
+            return cursor.rowcount
 
         except psycopg2.Error as e:
-            logger.error(f"Database query error: {e}")
-            self.connection.rollback()
+            self._log_query_error(e)
+            if isinstance(query, Statement):
+                self._forget_prepared(conn, query, e)
             raise
         finally:
-            if cursor:
+            if cursor is not None and not cursor.closed:
                 cursor.close()
 
+    def _prepare(self, conn, cursor, statement):
+        """Make sure `statement` is prepared on `conn`; return the SQL to run it."""
+        if not statement_registry.enabled:
+            return statement.sql
+        if statement.name in conn.stale_statements:
+            cursor.execute(f"DEALLOCATE {statement.name}")
+            conn.stale_statements.discard(statement.name)
+            conn.prepared_statements.discard(statement.name)
+        if statement.name not in conn.prepared_statements:
+            # PREPARE survives a rollback, so record it as soon as it succeeds
+            self._count_round_trips()
+            cursor.execute(statement.prepare_sql)
+            conn.prepared_statements.add(statement.name)
+        return statement.execute_sql
+
+    @staticmethod
+    def _forget_prepared(conn, statement, error):
+        if isinstance(error, psycopg2.errors.InvalidSqlStatementName):
+            # Session lost it (e.g. DISCARD ALL); prepare again next time
+            conn.prepared_statements.discard(statement.name)
+        elif isinstance(error, psycopg2.errors.FeatureNotSupported):
+            # "cached plan must not change result type" after an ALTER TABLE
+            conn.stale_statements.add(statement.name)
+
+    @staticmethod
+    def _observe(query, conn, started):
+        """Report a statement's duration; the SQL text is only built if it was slow."""
+        metrics.record_query(time.perf_counter() - started, lambda: _sql_text(query, conn))
+
+    @staticmethod
+    def _rollback_quietly(conn):
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+
+def _sql_fragments(query):
+    """SQL keywords and syntax of a query, without identifiers or literals."""
+    if isinstance(query, Statement):
+        return query.sql
+    if isinstance(query, (str, bytes)):
+        return query if isinstance(query, str) else query.decode('utf-8', 'replace')
+    if isinstance(query, sql.SQL):
+        return query.string
+    if isinstance(query, sql.Composed):
+        return ' '.join(_sql_fragments(part) for part in query.seq)
+    return ''
+
+
+@lru_cache(maxsize=4096)
+def _is_read_only_sql(text):
+    return bool(_READ_START_RE.match(text)) and not _WRITE_RE.search(text)
+
+
+def is_read_only(query):
+    """True if `query` only reads, so a read replica may run it."""
+    return _is_read_only_sql(_sql_fragments(query))
+
+
+def _sql_text(query, conn):
+    """SQL of a plain string or psycopg2.sql composition (placeholders, not values)."""
+    if isinstance(query, (str, bytes)):
+        return query if isinstance(query, str) else query.decode('utf-8', 'replace')
+    try:
+        return query.as_string(getattr(conn, 'raw', conn))
+    except (psycopg2.Error, TypeError):
+        return repr(query)
+
+
 def init_database():
     """Ensure DB is reachable without altering existing schemas.
 
@@ -105,5 +550,47 @@ def init_database():
     finally:
         db.disconnect()
 
-# Global database instance
-db_instance = Database()
+def create_database(config=None):
+    """The engine selected by DB_BACKEND: 'postgres' (Database) or 'sqlite'."""
+    config = config or Config()
+    if config.DB_BACKEND == 'sqlite':
+        from sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(config.SQLITE_PATH, config=config)
+    if config.DB_BACKEND != 'postgres':
+        raise ValueError(f"Unknown DB_BACKEND {config.DB_BACKEND!r}; use 'postgres' or 'sqlite'")
+    return Database(config=config)
+
+
+_db = None
+_db_lock = threading.Lock()
+
+
+def get_database(config=None):
+    """Return the process-wide engine, creating it from `config` on first use."""
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                _db = create_database(config)
+    return _db
+
+
+def configure_database(config):
+    """Make the process-wide engine one built from `config`; create_app() calls this.
+
+    An engine (and shared pools) built from other settings is replaced. Nothing
+    connects here: the pool still opens on first use.
+    """
+    global _db
+    with _db_lock:
+        if _db is None or not _db.config.same_as(config):
+            configure_pools(config)
+            _db = create_database(config)
+    return _db
+
+
+def __getattr__(name):
+    # `from database import db_instance` still works; the engine is only built when asked for
+    if name == 'db_instance':
+        return get_database()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,561 @@
+import itertools
+import threading
+import time
+import logging
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+from config import Config
+
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+class PooledConnection:
+    """Thin proxy around a psycopg2 connection that belongs to a pool.
+
+    It behaves like the raw connection (cursor, commit, rollback, ...), but
+    close() hands the connection back to the pool instead of closing the
+    socket, so existing `conn.close()` calls keep working unchanged.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self._checked_out = False
+        # Names of statements.Statement objects PREPAREd on this session
+        self.prepared_statements = set()
+        self.stale_statements = set()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    @property
+    def raw(self):
+        return self._raw
+
+    @property
+    def autocommit(self):
+        return self._raw.autocommit
+
+    @autocommit.setter
+    def autocommit(self, value):
+        self._raw.autocommit = value
+
+    def close(self):
+        """Return the connection to its pool."""
+        if self._checked_out:
+            self._pool.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._raw.commit()
+        else:
+            self._raw.rollback()
+        self.close()
+
+
+class ConnectionPool:
+    """Thread-safe PostgreSQL connection pool.
+
+    - keeps at least `minconn` and at most `maxconn` physical connections
+    - blocks callers for up to `timeout` seconds when the pool is exhausted
+    - runs a cheap `SELECT 1` on checkout when a connection sat idle longer
+      than `health_check_after` seconds, replacing it if it is broken
+    - closes connections idle longer than `idle_timeout` (down to `minconn`)
+    """
+
+    def __init__(self, minconn=1, maxconn=10, timeout=30.0, idle_timeout=300.0,
+                 health_check_after=30.0, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size: need 0 <= minconn <= maxconn and maxconn >= 1")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.connect_kwargs = connect_kwargs
+
+        self._idle = []          # LIFO stack of idle PooledConnection
+        self._in_use = set()
+        self._size = 0           # physical connections, including ones being opened
+        self._waiting = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._reaped = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+
+        for _ in range(minconn):
+            conn = self._open()
+            with self._cond:
+                self._size += 1
+                self._idle.append(conn)
+
+        self._reaper = None
+        if idle_timeout and idle_timeout > 0:
+            self._reaper = threading.Thread(target=self._reap_loop, name="db-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    # ------------------------
+    # Checkout / return
+    # ------------------------
+    def acquire(self, timeout=None):
+        """Check out a healthy connection, waiting if the pool is exhausted."""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            conn = None
+            must_open = False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+                    if self._idle:
+                        conn = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        must_open = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"Timed out after {timeout:.1f}s waiting for a database connection "
+                            f"({self._size}/{self.maxconn} in use)"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            if must_open:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(conn):
+                self._discard(conn)
+                continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                conn._checked_out = True
+                self._in_use.add(conn)
+                self._checkouts += 1
+                self._checkout_time_total += waited
+                self._checkout_time_max = max(self._checkout_time_max, waited)
+            return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, rolling back any open transaction."""
+        with self._cond:
+            if conn not in self._in_use:
+                return
+            self._in_use.discard(conn)
+            conn._checked_out = False
+
+        raw = conn.raw
+        if not discard and not raw.closed:
+            try:
+                status = raw.get_transaction_status()
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    raw.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        if discard or raw.closed or self._closed:
+            self._discard(conn)
+            return
+
+        conn.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager that checks out a connection and always returns it."""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    # ------------------------
+    # Maintenance
+    # ------------------------
+    def reap_idle(self):
+        """Close connections that have been idle longer than idle_timeout."""
+        if not self.idle_timeout:
+            return 0
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            keep = []
+            # _idle is a LIFO stack, so the oldest idle connections sit at the bottom
+            for conn in self._idle:
+                surplus = self._size - len(expired) > self.minconn
+                if surplus and now - conn.last_used > self.idle_timeout:
+                    expired.append(conn)
+                else:
+                    keep.append(conn)
+            self._idle = keep
+            self._size -= len(expired)
+            self._reaped += len(expired)
+        for conn in expired:
+            self._close_raw(conn)
+        if expired:
+            logger.debug(f"Reaped {len(expired)} idle database connection(s)")
+        return len(expired)
+
+    def closeall(self):
+        """Close every idle connection and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_raw(conn)
+
+    def load(self):
+        """Connections checked out plus callers waiting for one."""
+        with self._cond:
+            return len(self._in_use) + self._waiting
+
+    def stats(self):
+        """Snapshot of pool usage for monitoring."""
+        with self._cond:
+            avg = self._checkout_time_total / self._checkouts if self._checkouts else 0.0
+            return {
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'discarded': self._discarded,
+                'reaped': self._reaped,
+                'checkout_avg_ms': round(avg * 1000, 3),
+                'checkout_max_ms': round(self._checkout_time_max * 1000, 3),
+            }
+
+    # ------------------------
+    # Internals
+    # ------------------------
+    def _open(self):
+        raw = psycopg2.connect(**self.connect_kwargs)
+        logger.debug("Opened new pooled database connection")
+        return PooledConnection(self, raw)
+
+    def _is_healthy(self, conn):
+        raw = conn.raw
+        if raw.closed:
+            return False
+        if time.monotonic() - conn.last_used < self.health_check_after:
+            return True
+        try:
+            with raw.cursor() as cur:
+                cur.execute("SELECT 1")
+            raw.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self._close_raw(conn)
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_raw(conn):
+        try:
+            conn.raw.close()
+        except psycopg2.Error:
+            pass
+
+    def _reap_loop(self):
+        interval = max(1.0, self.idle_timeout / 2)
+        while not self._closed:
+            time.sleep(interval)
+            try:
+                self.reap_idle()
+            except Exception as e:
+                logger.error(f"Error reaping idle connections: {e}")
+
+
+# ------------------------
+# Read replicas
+# ------------------------
+class Replica:
+    """One read replica: its pool plus health bookkeeping."""
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.ejected_until = 0.0
+        self.lag_bytes = None
+        self.last_error = None
+        self.reads = 0
+        self.ejections = 0
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.ejected_until
+
+
+class ReplicaSet:
+    """Read replicas of the primary, each with its own ConnectionPool.
+
+    ordered() lists the healthy replicas to try for a read, best first:
+    in turn ('round_robin') or by fewest connections in use ('least_loaded').
+    A replica whose connection fails is ejected for `eject_for` seconds. A
+    background thread pings every replica each `check_interval` seconds,
+    readmitting recovered ones and ejecting any that replays more than
+    `max_lag_bytes` of WAL behind the primary.
+    """
+
+    SELECTIONS = ('round_robin', 'least_loaded')
+
+    def __init__(self, replicas, selection='round_robin', eject_for=30.0,
+                 check_interval=5.0, max_lag_bytes=0, primary_pool=None):
+        if selection not in self.SELECTIONS:
+            raise ValueError(f"Unknown replica selection {selection!r}; use one of {', '.join(self.SELECTIONS)}")
+        self.replicas = list(replicas)
+        self.selection = selection
+        self.eject_for = eject_for
+        self.check_interval = check_interval
+        self.max_lag_bytes = max_lag_bytes
+        self._primary_pool = primary_pool
+        self._turn = itertools.count()
+        self._closed = False
+
+        self._monitor = None
+        if check_interval and check_interval > 0:
+            self._monitor = threading.Thread(target=self._monitor_loop, name="db-replica-monitor", daemon=True)
+            self._monitor.start()
+
+    def ordered(self):
+        """Healthy replicas in the order a read should try them."""
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return []
+        # Rotate first, so plain round-robin and least-loaded ties both spread the reads
+        start = next(self._turn) % len(healthy)
+        healthy = healthy[start:] + healthy[:start]
+        if self.selection == 'least_loaded':
+            healthy.sort(key=lambda r: r.pool.load())
+        return healthy
+
+    def eject(self, replica, reason):
+        if replica.healthy:
+            replica.ejections += 1
+            logger.warning(f"Ejecting read replica {replica.name} for {self.eject_for:.0f}s: {reason}")
+        replica.ejected_until = time.monotonic() + self.eject_for
+        replica.last_error = str(reason)
+
+    def readmit(self, replica):
+        if not replica.healthy:
+            logger.info(f"Read replica {replica.name} is healthy again")
+        replica.ejected_until = 0.0
+
+    def check(self):
+        """Ping every replica and compare its replay position with the primary's."""
+        primary_lsn = None
+        if self.max_lag_bytes and self._primary_pool is not None:
+            try:
+                with self._primary_pool.connection(timeout=self.check_interval) as conn:
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT pg_current_wal_lsn()::text")
+                        primary_lsn = cur.fetchone()[0]
+            except (psycopg2.Error, PoolTimeout) as e:
+                logger.warning(f"Could not read the primary's WAL position: {e}")
+
+        for replica in self.replicas:
+            try:
+                with replica.pool.connection(timeout=self.check_interval) as conn:
+                    with conn.cursor() as cur:
+                        # NULL unless the server is a standby and the primary's position is known
+                        cur.execute("SELECT pg_wal_lsn_diff(%s::pg_lsn, pg_last_wal_replay_lsn())",
+                                    (primary_lsn,))
+                        lag = cur.fetchone()[0]
+            except (psycopg2.Error, PoolTimeout) as e:
+                self.eject(replica, e)
+                continue
+            replica.lag_bytes = max(0, int(lag)) if lag is not None else None
+            if self.max_lag_bytes and (replica.lag_bytes or 0) > self.max_lag_bytes:
+                self.eject(replica, f"{replica.lag_bytes} bytes of WAL behind the primary")
+            else:
+                self.readmit(replica)
+
+    def closeall(self):
+        self._closed = True
+        for replica in self.replicas:
+            replica.pool.closeall()
+
+    def stats(self):
+        return {
+            'selection': self.selection,
+            'replicas': [{
+                'name': r.name,
+                'healthy': r.healthy,
+                'lag_bytes': r.lag_bytes,
+                'reads': r.reads,
+                'ejections': r.ejections,
+                'last_error': r.last_error,
+                'pool': r.pool.stats(),
+            } for r in self.replicas],
+        }
+
+    def _monitor_loop(self):
+        while not self._closed:
+            time.sleep(self.check_interval)
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Error checking read replicas: {e}")
+
+
+def replica_connect_kwargs(spec, defaults):
+    """psycopg2.connect() arguments for one DB_REPLICAS entry.
+
+    An entry is `host[:port]` or a libpq DSN/URI; whatever it leaves out
+    (user, password, database, ...) is taken from `defaults`.
+    """
+    if '=' in spec or '://' in spec:
+        params = extensions.parse_dsn(spec)
+        if 'dbname' in params:
+            params['database'] = params.pop('dbname')
+    else:
+        host, _, port = spec.partition(':')
+        params = {'host': host, 'port': port}
+    return {**defaults, **{key: value for key, value in params.items() if value}}
+
+
+# ------------------------
+# Shared process-wide pool
+# ------------------------
+_pool = None
+_pool_config = None
+_replica_set = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(config=None):
+    """Return the shared pool, creating it from `config` (default: Config()) on first use."""
+    global _pool, _pool_config
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = config or Config()
+                _pool_config = config
+                _pool = ConnectionPool(
+                    minconn=config.DB_POOL_MIN,
+                    maxconn=config.DB_POOL_MAX,
+                    timeout=config.DB_POOL_TIMEOUT,
+                    idle_timeout=config.DB_POOL_IDLE_TIMEOUT,
+                    health_check_after=config.DB_POOL_HEALTH_CHECK_AFTER,
+                    host=config.DB_HOST,
+                    port=config.DB_PORT,
+                    database=config.DB_NAME,
+                    user=config.DB_USER,
+                    password=config.DB_PASSWORD,
+                )
+                logger.info(f"Created database pool (min={config.DB_POOL_MIN}, max={config.DB_POOL_MAX})")
+    return _pool
+
+
+def get_replica_set(config=None):
+    """Return the shared ReplicaSet for DB_REPLICAS, or None when none are configured."""
+    global _replica_set
+    config = config or Config()
+    if not config.DB_REPLICAS:
+        return None
+    if _replica_set is None:
+        primary = get_pool(config)
+        with _pool_lock:
+            if _replica_set is None:
+                defaults = {
+                    'host': config.DB_HOST,
+                    'port': config.DB_PORT,
+                    'database': config.DB_NAME,
+                    'user': config.DB_USER,
+                    'password': config.DB_PASSWORD,
+                    # Fail over to another replica quickly instead of hanging on a dead host
+                    'connect_timeout': 5,
+                }
+                replicas = []
+                for spec in config.DB_REPLICAS:
+                    kwargs = replica_connect_kwargs(spec, defaults)
+                    # minconn=0: an unreachable replica must not stop the app from starting
+                    pool = ConnectionPool(
+                        minconn=0,
+                        maxconn=config.DB_REPLICA_POOL_MAX,
+                        timeout=config.DB_POOL_TIMEOUT,
+                        idle_timeout=config.DB_POOL_IDLE_TIMEOUT,
+                        health_check_after=config.DB_POOL_HEALTH_CHECK_AFTER,
+                        **kwargs,
+                    )
+                    replicas.append(Replica(f"{kwargs['host']}:{kwargs['port']}", pool))
+                _replica_set = ReplicaSet(
+                    replicas,
+                    selection=config.DB_REPLICA_SELECTION,
+                    eject_for=config.DB_REPLICA_EJECT_SECONDS,
+                    check_interval=config.DB_REPLICA_CHECK_INTERVAL,
+                    max_lag_bytes=config.DB_REPLICA_MAX_LAG_BYTES,
+                    primary_pool=primary,
+                )
+                logger.info(f"Routing reads to {len(replicas)} replica(s) ({config.DB_REPLICA_SELECTION})")
+    return _replica_set
+
+
+def configure_pools(config):
+    """Close the shared pools if they were built from other settings than `config`.
+
+    They are then rebuilt from `config` on next use (see database.configure_database()).
+    """
+    if _pool_config is not None and not _pool_config.same_as(config):
+        logger.info("Database settings changed, closing the shared pools")
+        close_pool()
+
+
+def close_pool():
+    """Close the shared pool and replica pools (used on shutdown and in scripts)."""
+    global _pool, _pool_config, _replica_set
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _pool_config = None
+        if _replica_set is not None:
+            _replica_set.closeall()
+            _replica_set = None
@@ -0,0 +1,344 @@
+import re
+import datetime
+from decimal import Decimal
+
+from psycopg2 import sql
+
+
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+# Fields the API accepts; only the ones that exist as columns are written
+WRITABLE_FIELDS = ('name', 'email', 'department', 'department_id', 'salary', 'hire_date', 'join_date')
+
+
+class EmployeeNotFound(Exception):
+    """Raised when one or more employee ids do not exist."""
+
+    def __init__(self, ids):
+        super().__init__(f"Employee(s) not found: {ids}")
+        self.ids = ids
+
+
+def serialize_employee(row):
+    """Convert a DB row into JSON-friendly values (Decimal -> float, dates -> ISO)."""
+    out = {}
+    for key, value in row.items():
+        if isinstance(value, Decimal):
+            value = float(value)
+        elif isinstance(value, (datetime.date, datetime.datetime)):
+            value = value.isoformat()
+        out[key] = value
+    return out
+
+
+def validate_employee(data, columns, partial=False):
+    """Validate an employee payload against the columns the table really has.
+
+    Returns (clean, errors). `clean` only contains writable fields that exist
+    in `columns`. With partial=False the fields required on create must be present.
+    """
+    if not isinstance(data, dict):
+        return {}, ['Request body must be a JSON object']
+
+    errors = []
+    clean = {}
+
+    for field in WRITABLE_FIELDS:
+        if field in data and field in columns:
+            clean[field] = data[field]
+
+    if 'name' in clean:
+        name = str(clean['name'] or '').strip()
+        if len(name) < 2:
+            errors.append('name must be at least 2 characters')
+        clean['name'] = name
+
+    if 'email' in clean:
+        email = str(clean['email'] or '').strip().lower()
+        if not EMAIL_RE.match(email):
+            errors.append('email must be a valid email address')
+        clean['email'] = email
+
+    if 'department' in clean:
+        department = str(clean['department'] or '').strip()
+        if len(department) < 2:
+            errors.append('department must be at least 2 characters')
+        clean['department'] = department
+
+    if 'department_id' in clean:
+        try:
+            clean['department_id'] = int(clean['department_id'])
+            if clean['department_id'] <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            errors.append('department_id must be a positive integer')
+
+    if 'salary' in clean:
+        try:
+            clean['salary'] = float(clean['salary'])
+            if clean['salary'] <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            errors.append('salary must be greater than 0')
+
+    for field in ('hire_date', 'join_date'):
+        if field in clean:
+            try:
+                datetime.date.fromisoformat(str(clean[field]))
+            except ValueError:
+                errors.append(f'{field} must be a date in YYYY-MM-DD format')
+
+    if partial:
+        if not clean and not errors:
+            errors.append('At least one field must be provided')
+    else:
+        required = ['name', 'salary']
+        if 'email' in columns:
+            required.append('email')
+        if 'department' in columns and 'department_id' not in clean:
+            required.append('department')
+        elif 'department_id' in columns and 'department' not in clean:
+            required.append('department_id')
+        for field in required:
+            if field not in clean and field not in data:
+                errors.append(f'{field} is required')
+
+    return clean, errors
+
+
+# ------------------------
+# Data access
+# ------------------------
+def list_employees(db):
+    return db.execute_query("SELECT * FROM employees ORDER BY id ASC")
+
+
+def get_employee(db, employee_id):
+    return db.fetch_one("SELECT * FROM employees WHERE id=%s", (employee_id,))
+
+
+# The query builders take the `sql` module to compose with, so the async app
+# can pass psycopg (3)'s identical sql module instead of psycopg2's.
+def insert_query(fields, sqlmod=sql):
+    return sqlmod.SQL("INSERT INTO employees ({cols}) VALUES ({vals}) RETURNING *").format(
+        cols=sqlmod.SQL(', ').join(sqlmod.Identifier(c) for c in fields),
+        vals=sqlmod.SQL(', ').join(sqlmod.Placeholder() * len(fields)),
+    )
+
+
+def update_query(fields, columns, sqlmod=sql):
+    assignments = [sqlmod.SQL("{} = %s").format(sqlmod.Identifier(f)) for f in fields]
+    if 'updated_at' in columns:
+        assignments.append(sqlmod.SQL("updated_at = CURRENT_TIMESTAMP"))
+    return sqlmod.SQL("UPDATE employees SET {sets} WHERE id = %s").format(
+        sets=sqlmod.SQL(', ').join(assignments),
+    )
+
+
+# ------------------------
+# Search
+# ------------------------
+SEARCH_COLUMNS = ('name', 'email', 'department')
+SEARCH_MATCHES = ('auto', 'prefix', 'contains')
+# Below this length `auto` matches prefixes; a 1-2 character substring matches too much to be useful
+MIN_CONTAINS_LENGTH = 3
+
+
+def parse_search_args(args, default_limit=50, max_limit=500):
+    """Validate /employees/search query parameters; returns (filters, errors)."""
+    errors = []
+    filters = {
+        'q': (args.get('q') or '').strip().lower(),
+        'match': args.get('match', 'auto'),
+        'department': (args.get('department') or '').strip() or None,
+        'department_id': None,
+        'min_salary': None,
+        'max_salary': None,
+        'after': 0,
+        'limit': default_limit,
+    }
+    if filters['match'] not in SEARCH_MATCHES:
+        errors.append(f"match must be one of {', '.join(SEARCH_MATCHES)}")
+    for field, cast in (('department_id', int), ('min_salary', float), ('max_salary', float),
+                        ('after', int), ('limit', int)):
+        if args.get(field) not in (None, ''):
+            try:
+                filters[field] = cast(args.get(field))
+            except ValueError:
+                errors.append(f'{field} must be a number')
+    filters['after'] = max(filters['after'], 0)
+    filters['limit'] = min(max(filters['limit'], 1), max_limit)
+    return filters, errors
+
+
+def _like_escape(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_query(columns, filters, sqlmod=sql):
+    """Build the keyset-paginated search statement; returns (query, params).
+
+    Text matching is `lower(col) LIKE pattern` on name/email/department, which
+    migration 0004 indexes: prefix patterns use the text_pattern_ops btree
+    indexes, substring patterns the pg_trgm GIN indexes (when installed).
+    """
+    conditions, params = [], []
+    q = filters['q']
+    searchable = [c for c in SEARCH_COLUMNS if c in columns]
+    if q and searchable:
+        match = filters['match']
+        if match == 'auto':
+            match = 'contains' if len(q) >= MIN_CONTAINS_LENGTH else 'prefix'
+        pattern = _like_escape(q) + '%'
+        if match == 'contains':
+            pattern = '%' + pattern
+        conditions.append(sqlmod.SQL('({})').format(sqlmod.SQL(' OR ').join(
+            sqlmod.SQL('lower({}) LIKE %s').format(sqlmod.Identifier(c)) for c in searchable
+        )))
+        params.extend([pattern] * len(searchable))
+    if filters['department'] and 'department' in columns:
+        conditions.append(sqlmod.SQL('lower(department) = lower(%s)'))
+        params.append(filters['department'])
+    if filters['department_id'] is not None and 'department_id' in columns:
+        conditions.append(sqlmod.SQL('department_id = %s'))
+        params.append(filters['department_id'])
+    if filters['min_salary'] is not None:
+        conditions.append(sqlmod.SQL('salary >= %s'))
+        params.append(filters['min_salary'])
+    if filters['max_salary'] is not None:
+        conditions.append(sqlmod.SQL('salary <= %s'))
+        params.append(filters['max_salary'])
+    conditions.append(sqlmod.SQL('id > %s'))
+    params.append(filters['after'])
+    # One extra row tells whether another page exists
+    params.append(filters['limit'] + 1)
+    query = sqlmod.SQL('SELECT * FROM employees WHERE {} ORDER BY id ASC LIMIT %s').format(
+        sqlmod.SQL(' AND ').join(conditions))
+    return query, params
+
+
+def search_page(rows, limit):
+    """Split limit+1 rows into (page, next_after)."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1]['id']
+    return rows, None
+
+
+def search_employees(db, columns, filters):
+    query, params = search_query(columns, filters)
+    return search_page(db.execute_query(query, params), filters['limit'])
+
+
+# ------------------------
+# Stats
+# ------------------------
+# employee_stats is maintained by triggers (migration 0005); one row per department
+STATS_QUERY = (
+    "SELECT department, employee_count, salary_sum, updated_at FROM employee_stats "
+    "WHERE employee_count > 0 ORDER BY department"
+)
+# Used until the migration has run: same shape, but scans the whole table
+LIVE_STATS_QUERY = (
+    "SELECT COALESCE({key}, '') AS department, count(*) AS employee_count, "
+    "COALESCE(sum(salary), 0) AS salary_sum, NULL AS updated_at FROM employees GROUP BY 1 ORDER BY 1"
+)
+
+
+def stats_query(stats_columns, columns):
+    """Pick the summary table when it exists, otherwise aggregate employees directly."""
+    if stats_columns:
+        return STATS_QUERY
+    key = 'department' if 'department' in columns else 'department_id::text' if 'department_id' in columns else "''"
+    return LIVE_STATS_QUERY.format(key=key)
+
+
+def summarize_stats(rows):
+    """Fold per-department rows into overall totals plus the breakdown."""
+    count = sum(row['employee_count'] for row in rows)
+    total = sum((row['salary_sum'] for row in rows), Decimal(0))
+    updated = [row['updated_at'] for row in rows if row['updated_at'] is not None]
+    return {
+        'count': count,
+        'sum': float(total),
+        'average': float(total / count) if count else None,
+        'updated_at': max(updated).isoformat() if updated else None,
+        'departments': [{
+            'department': row['department'],
+            'count': row['employee_count'],
+            'sum': float(row['salary_sum']),
+            'average': float(row['salary_sum'] / row['employee_count']),
+        } for row in rows],
+    }
+
+
+def employee_stats(db):
+    query = stats_query(db.get_table_columns('employee_stats'), db.get_table_columns('employees'))
+    return summarize_stats(db.execute_query(query))
+
+
+def create_employee(db, clean):
+    return db.fetch_one(insert_query(list(clean)), tuple(clean.values()))
+
+
+def update_employee(db, employee_id, clean, columns):
+    query = update_query(list(clean), columns) + sql.SQL(" RETURNING *")
+    return db.fetch_one(query, tuple(clean.values()) + (employee_id,))
+
+
+def delete_employee(db, employee_id):
+    return db.execute_query("DELETE FROM employees WHERE id=%s", (employee_id,), fetch=False)
+
+
+# ------------------------
+# Bulk operations (one transaction, few round trips)
+# ------------------------
+def _group_by_fields(records):
+    """Group validated records by their field set so each group is one statement."""
+    groups = {}
+    for index, record in records:
+        groups.setdefault(tuple(record), []).append((index, record))
+    return groups
+
+
+def bulk_create_employees(db, records, page_size=1000):
+    """Insert many employees with multi-row INSERT ... VALUES statements.
+
+    `records` are validated dicts; returns the new ids in input order.
+    """
+    ids = [None] * len(records)
+    with db.transaction():
+        for fields, group in _group_by_fields(enumerate(records)).items():
+            query = sql.SQL("INSERT INTO employees ({cols}) VALUES %s RETURNING id").format(
+                cols=sql.SQL(', ').join(sql.Identifier(c) for c in fields),
+            )
+            rows = db.execute_values(query, [tuple(r.values()) for _, r in group],
+                                     page_size=page_size, fetch=True)
+            # execute_values returns RETURNING rows in VALUES order
+            for (index, _), row in zip(group, rows):
+                ids[index] = row['id']
+    return ids
+
+
+def bulk_update_employees(db, records, columns, page_size=1000):
+    """Apply many partial updates; every record carries its own `id`.
+
+    Raises EmployeeNotFound (and rolls back) if any id does not exist.
+    """
+    ids = [employee_id for employee_id, _ in records]
+    with db.transaction():
+        found = db.execute_query("SELECT id FROM employees WHERE id = ANY(%s)", (ids,))
+        missing = sorted(set(ids) - {row['id'] for row in found})
+        if missing:
+            raise EmployeeNotFound(missing)
+        for fields, group in _group_by_fields((eid, clean) for eid, clean in records).items():
+            query = update_query(fields, columns)
+            db.execute_batch(query, [tuple(clean.values()) + (eid,) for eid, clean in group],
+                             page_size=page_size)
+    return len(records)
+
+
+def bulk_delete_employees(db, ids):
+    """Delete many employees in a single statement; returns the deleted count."""
+    with db.transaction():
+        return db.execute_query("DELETE FROM employees WHERE id = ANY(%s)", (list(ids),), fetch=False)
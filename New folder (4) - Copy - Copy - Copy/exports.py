@@ -0,0 +1,83 @@
+import csv
+import io
+import json
+import datetime
+from decimal import Decimal
+
+from psycopg2 import sql
+
+import employees
+
+
+# Columns written per exportable table; None means every column.
+# Passwords never leave the database through an export.
+EXPORT_COLUMNS = {
+    'users': ('id', 'username', 'role'),
+    'employees': None,
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def export_columns(db, table_name):
+    """The columns an export writes, in order.
+
+    Listed explicitly even for "every column", so the CSV header is known
+    before (and without) the first row: id, the writable fields, then the rest.
+    """
+    columns = EXPORT_COLUMNS[table_name]
+    if columns is not None:
+        return list(columns)
+    existing = db.get_table_columns(table_name)
+    leading = [c for c in ('id',) + employees.WRITABLE_FIELDS if c in existing]
+    return leading + sorted(existing - set(leading))
+
+
+def export_query(table_name, columns):
+    return sql.SQL("SELECT {cols} FROM {table} ORDER BY id ASC").format(
+        cols=sql.SQL(', ').join(sql.Identifier(c) for c in columns),
+        table=sql.Identifier(table_name),
+    )
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def csv_chunks(row_chunks, columns):
+    """Turn chunks of dict rows into CSV text, one string per chunk (header first).
+
+    The header is written even when there are no rows at all.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for rows in row_chunks:
+        writer.writerows([row[c] for c in columns] for row in rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def ndjson_chunks(row_chunks):
+    """Turn chunks of dict rows into newline-delimited JSON, one string per chunk."""
+    for rows in row_chunks:
+        yield ''.join(json.dumps(row, default=_json_default) + '\n' for row in rows)
+
+
+def stream_export(db, table_name, fmt, chunk_size=2000):
+    """Generator of encoded export chunks for `table_name` in `fmt` (csv/ndjson)."""
+    columns = export_columns(db, table_name)
+    row_chunks = db.stream_query(export_query(table_name, columns), chunk_size=chunk_size)
+    texts = csv_chunks(row_chunks, columns) if fmt == 'csv' else ndjson_chunks(row_chunks)
+    for text in texts:
+        yield text.encode('utf-8')
@@ -0,0 +1,116 @@
+"""
+Fragment caching for Jinja templates.
+
+    {% for user in users %}
+      {% cache 'user_row', user.id, user.row_version, columns_key %}
+        <tr>...</tr>
+      {% endcache %}
+    {% endfor %}
+
+The block's output is kept in environment.fragment_cache (a cache.TTLCache)
+under its key, so a page re-renders only the rows whose key changed. Keys
+should name everything the block depends on; with a row version in them no
+invalidation is needed, as a changed row simply gets a new key and the old
+entry ages out. A key containing None or an undefined value (e.g. rows
+loaded before migration 0009 added users.row_version) is never cached.
+
+Each compiled template gets its own key prefix, so editing a template (or
+deploying a new one) never serves fragments rendered by the old version.
+"""
+
+import hashlib
+import logging
+import os
+import uuid
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from jinja2.runtime import Undefined
+
+
+logger = logging.getLogger(__name__)
+
+
+def bytecode_cache(directory=None):
+    """A Jinja bytecode cache whose entries are also tied to this module's code.
+
+    Jinja only checks the template source, but compiled templates call into
+    FragmentCacheExtension, so bytecode built against an older version of it
+    must not be loaded. Returns None (templates are compiled in every process)
+    when `directory` cannot be created or written.
+    """
+    if directory is not None:
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"Template bytecode cache disabled: {e}")
+            return None
+        if not os.access(directory, os.W_OK | os.X_OK):
+            logger.warning(f"Template bytecode cache disabled: {directory} is not writable")
+            return None
+    with open(__file__, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:12]
+    return FileSystemBytecodeCache(directory, pattern=f'__jinja2_{digest}_%s.cache')
+
+
+def _freeze(part):
+    return tuple(part) if isinstance(part, list) else part
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        # None disables caching; blocks are then rendered every time
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        """Compile {% cache key %}body{% endcache %} to an inline lookup.
+
+        Roughly `{% set key, html = lookup(key) %}{% if html is none %}{% set html %}body{% endset %}
+        {% do store(key, html) %}{% endif %}{{ html }}`: a hit costs one call and, unlike
+        a call block, creates no macro per row, which would cost more than the row.
+        """
+        lineno = next(parser.stream).lineno
+        parts = parser.parse_tuple()
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        # Fixed when the template is compiled: a recompiled template never reuses old fragments
+        prefix = nodes.Const(f'{parser.name}:{lineno}:{uuid.uuid4().hex[:12]}')
+        key, html = f'_fragment_key_{lineno}', f'_fragment_{lineno}'
+        return [
+            nodes.Assign(nodes.Tuple([nodes.Name(key, 'store'), nodes.Name(html, 'store')], 'store'),
+                         self.call_method('_lookup', [prefix, parts])),
+            nodes.If(
+                nodes.Test(nodes.Name(html, 'load'), 'none', [], [], None, None),
+                [
+                    nodes.AssignBlock(nodes.Name(html, 'store'), None, body),
+                    nodes.ExprStmt(self.call_method('_store', [nodes.Name(key, 'load'), nodes.Name(html, 'load')])),
+                ],
+                [], [],
+            ),
+            nodes.Output([nodes.Name(html, 'load')]),
+        ]
+
+    def _lookup(self, prefix, parts):
+        """(key, cached html); key is None when the block must be rendered uncached."""
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return None, None
+        if type(parts) is not tuple:
+            parts = (parts,)
+        for part in parts:
+            if part is None or isinstance(part, Undefined):
+                return None, None
+        key = (prefix,) + parts
+        try:
+            return key, cache.get(key)
+        except TypeError:
+            # A list in the key; hash its contents instead
+            key = (prefix,) + tuple(_freeze(p) for p in parts)
+            return key, cache.get(key)
+
+    def _store(self, key, html):
+        if key is not None:
+            self.environment.fragment_cache.set(key, html)
+        return ''
@@ -0,0 +1,122 @@
+"""
+HTTP validators and response compression shared by app.py and asgi_app.py.
+
+GET views that only depend on a few tables get an ETag and Last-Modified
+derived from those tables' rows in table_versions (migrations 0006 and
+0010), which database triggers bump on every writing transaction. A client
+that sends the ETag back gets a 304 before the view queries or renders anything.
+"""
+
+import datetime
+import gzip
+import hashlib
+import os
+from email.utils import format_datetime, parsedate_to_datetime
+
+import statements
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+COMPRESSIBLE_TYPES = ('text/html', 'text/css', 'text/plain', 'text/csv',
+                      'application/json', 'application/javascript', 'text/javascript')
+
+
+def _build_id():
+    """Changes whenever templates or code are redeployed, so old ETags stop matching."""
+    paths = [os.path.join(BASE_DIR, name) for name in os.listdir(BASE_DIR) if name.endswith('.py')]
+    templates = os.path.join(BASE_DIR, 'templates')
+    if os.path.isdir(templates):
+        paths += [os.path.join(templates, name) for name in os.listdir(templates)]
+    return str(max(os.path.getmtime(p) for p in paths))
+
+
+BUILD_ID = Config().APP_BUILD_ID or _build_id()
+
+
+def table_state(rows, tables):
+    """(versions, last_modified) from table_versions rows, or None if a table has no row.
+
+    Since migration 0010 a table has several rows (slots); its version is
+    their sum and it was last modified when the newest of them was.
+    """
+    versions, modified = {}, {}
+    for row in rows:
+        name = row['table_name']
+        versions[name] = versions.get(name, 0) + row['version']
+        modified[name] = max(modified.get(name, row['modified_at']), row['modified_at'])
+    if any(name not in versions for name in tables):
+        return None
+    # HTTP dates have whole-second, UTC resolution
+    last_modified = max(modified[name] for name in tables)
+    last_modified = last_modified.astimezone(datetime.timezone.utc).replace(microsecond=0)
+    return tuple(versions[name] for name in tables), last_modified
+
+
+def load_table_state(db, tables):
+    """Read the tables' versions; None when migration 0006 has not run yet."""
+    if not db.get_table_columns('table_versions'):
+        return None
+    return table_state(db.execute_query(statements.TABLE_VERSIONS, (list(tables),)), tables)
+
+
+def make_etag(versions, *parts):
+    """Weak ETag over the table versions plus whatever else the body varies on."""
+    key = '|'.join([BUILD_ID, *map(str, versions), *map(str, parts)])
+    return 'W/"%s"' % hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+
+
+def not_modified(if_none_match, if_modified_since, etag, last_modified):
+    """RFC 9110 precedence: If-None-Match wins; If-Modified-Since only without it."""
+    if if_none_match:
+        if if_none_match.strip() == '*':
+            return True
+        # Weak comparison: W/"x" and "x" are the same validator
+        candidates = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return etag.removeprefix('W/') in candidates
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            return False
+        return last_modified <= since
+    return False
+
+
+def validator_headers(etag, last_modified):
+    return {
+        'ETag': etag,
+        'Last-Modified': format_datetime(last_modified, usegmt=True),
+        # Always revalidate (cheap: a 304), and never share one user's page with another
+        'Cache-Control': 'private, no-cache',
+        'Vary': 'Cookie, Authorization',
+    }
+
+
+def choose_encoding(accept_encoding):
+    accepted = {part.split(';')[0].strip().lower() for part in (accept_encoding or '').split(',')
+                if not part.strip().endswith(';q=0')}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compressible(mimetype, size, min_size):
+    return size >= min_size and mimetype in COMPRESSIBLE_TYPES
+
+
+def compress(data, encoding, level=6):
+    if encoding == 'br':
+        # Brotli quality runs 0-11; map the gzip-style 1-9 level onto it
+        return brotli.compress(data, quality=min(11, level + 1))
+    return gzip.compress(data, compresslevel=level)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Bulk CSV import into users/employees using COPY ... FROM STDIN.
+
+Rows are read from the CSV one at a time, validated, and the valid ones are
+buffered into chunks that are streamed to PostgreSQL with COPY. Memory use is
+bounded by the chunk size, not the file size.
+
+Usage:
+    python importer.py employees employees.csv [--chunk-size 5000]
+"""
+
+import argparse
+import csv
+import io
+import sys
+import time
+import logging
+
+import psycopg2
+from psycopg2 import sql
+
+import employees
+import passwords
+
+
+logger = logging.getLogger(__name__)
+
+USER_ROLES = ('admin', 'customer')
+USER_FIELDS = ('username', 'password', 'role')
+
+# Keep at most this many reject details in the report (all are counted)
+MAX_REPORTED_REJECTS = 1000
+
+
+class ImportResult:
+    """Outcome of one import run."""
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.inserted = 0
+        self.rejected = 0
+        self.rejects = []
+        self.elapsed = 0.0
+
+    def reject(self, line, errors):
+        self.rejected += 1
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append({'line': line, 'errors': errors})
+
+    @property
+    def rows_per_sec(self):
+        return round(self.inserted / self.elapsed, 1) if self.elapsed else 0.0
+
+    def to_dict(self):
+        return {
+            'table': self.table_name,
+            'inserted': self.inserted,
+            'rejected': self.rejected,
+            'rejects': self.rejects,
+            'elapsed_sec': round(self.elapsed, 3),
+            'rows_per_sec': self.rows_per_sec,
+        }
+
+
+# ------------------------
+# Row validation
+# ------------------------
+def validate_user(row):
+    clean, errors = {}, []
+    username = (row.get('username') or '').strip()
+    password = row.get('password') or ''
+    role = (row.get('role') or '').strip().lower()
+    if not username:
+        errors.append('username is required')
+    if not password:
+        errors.append('password is required')
+    if role not in USER_ROLES:
+        errors.append(f"role must be one of {', '.join(USER_ROLES)}")
+    clean.update(username=username, password=password, role=role)
+    return clean, errors
+
+
+def import_columns(db, table_name, header):
+    """Columns to COPY for this table, taken from the CSV header."""
+    header = [h.strip().lower() for h in header or []]
+    if table_name == 'users':
+        allowed = USER_FIELDS
+    else:
+        table_columns = db.get_table_columns(table_name)
+        allowed = [f for f in employees.WRITABLE_FIELDS if f in table_columns]
+    return [h for h in header if h in allowed]
+
+
+def make_validator(db, table_name, columns):
+    """Return a function row -> (values tuple, errors) for the given table."""
+    if table_name == 'users':
+        def validate(row):
+            clean, errors = validate_user(row)
+            return tuple(clean[c] for c in columns), errors
+        return validate
+
+    table_columns = db.get_table_columns(table_name)
+
+    def validate(row):
+        # Blank optional cells are left out so they load as NULL
+        data = {k: v for k, v in row.items() if k in columns and v not in (None, '')}
+        clean, errors = employees.validate_employee(data, table_columns)
+        return tuple(clean.get(c) for c in columns), errors
+    return validate
+
+
+# ------------------------
+# COPY pipeline
+# ------------------------
+def _copy_chunk(db, table_name, columns, chunk):
+    """COPY one chunk of (line, values) rows in its own transaction."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for _, values in chunk:
+        writer.writerow(['' if v is None else v for v in values])
+    buf.seek(0)
+    query = sql.SQL("COPY {table} ({cols}) FROM STDIN WITH (FORMAT csv)").format(
+        table=sql.Identifier(table_name),
+        cols=sql.SQL(', ').join(sql.Identifier(c) for c in columns),
+    )
+    db.copy_expert(query, buf)
+
+
+def _hash_passwords(columns, chunk):
+    """Replace plaintext passwords in a users chunk with hashes, in parallel."""
+    if 'password' not in columns:
+        return chunk
+    i = columns.index('password')
+    hashes = passwords.get_hash_pool().hash_many(values[i] for _, values in chunk)
+    return [(line, values[:i] + (h,) + values[i + 1:]) for (line, values), h in zip(chunk, hashes)]
+
+
+def _insert_rows(db, table_name, columns, chunk, result):
+    """Fallback for a chunk COPY rejected: insert row by row to find the bad ones."""
+    query = sql.SQL("INSERT INTO {table} ({cols}) VALUES ({vals})").format(
+        table=sql.Identifier(table_name),
+        cols=sql.SQL(', ').join(sql.Identifier(c) for c in columns),
+        vals=sql.SQL(', ').join(sql.Placeholder() * len(columns)),
+    )
+    with db.transaction():
+        for line, values in chunk:
+            db.execute_query("SAVEPOINT import_row", fetch=False)
+            try:
+                # A bad row is a reject in the report, not an error for the server log
+                with db.quiet_errors():
+                    db.execute_query(query, values, fetch=False)
+                db.execute_query("RELEASE SAVEPOINT import_row", fetch=False)
+                result.inserted += 1
+            except psycopg2.Error as e:
+                db.execute_query("ROLLBACK TO SAVEPOINT import_row", fetch=False)
+                logger.debug(f"Rejected line {line} of the {table_name} import: {e}")
+                result.reject(line, [e.diag.message_primary or str(e).strip()])
+
+
+def import_csv(db, table_name, stream, chunk_size=5000, progress=None):
+    """Validate and COPY rows from a CSV text stream into `table_name`.
+
+    Each chunk commits on its own; a chunk that PostgreSQL rejects (e.g. a
+    duplicate email) is retried row by row so only the offending rows are
+    reported as rejects. `progress(result)` is called after every chunk.
+    """
+    result = ImportResult(table_name)
+    started = time.perf_counter()
+
+    reader = csv.DictReader(stream)
+    reader.fieldnames = [f.strip().lower() for f in reader.fieldnames or []]
+    columns = import_columns(db, table_name, reader.fieldnames)
+    if not columns:
+        raise ValueError(f"CSV header has no importable columns for table {table_name}")
+    validate = make_validator(db, table_name, columns)
+
+    def flush(chunk):
+        if table_name == 'users':
+            chunk = _hash_passwords(columns, chunk)
+        try:
+            _copy_chunk(db, table_name, columns, chunk)
+            result.inserted += len(chunk)
+        except psycopg2.Error as e:
+            logger.warning(f"COPY chunk rejected ({e.pgcode}), retrying row by row")
+            _insert_rows(db, table_name, columns, chunk, result)
+        if progress:
+            progress(result)
+
+    chunk = []
+    # Line 1 is the header, so data rows start at line 2
+    for line, row in enumerate(reader, start=2):
+        values, errors = validate(row)
+        if errors:
+            result.reject(line, errors)
+            continue
+        chunk.append((line, values))
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    result.elapsed = time.perf_counter() - started
+    logger.info(
+        f"Imported {result.inserted} rows into {table_name} "
+        f"({result.rejected} rejected) at {result.rows_per_sec} rows/s"
+    )
+    return result
+
+
+def main(argv=None):
+    from database import db_instance
+    from config import Config
+    from logging_config import configure_logging
+
+    configure_logging(Config())
+
+    parser = argparse.ArgumentParser(description="Bulk import a CSV file with COPY")
+    parser.add_argument('table', choices=['users', 'employees'])
+    parser.add_argument('path', help="CSV file with a header row")
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    with open(args.path, newline='', encoding='utf-8') as f:
+        result = import_csv(db_instance, args.table, f, chunk_size=args.chunk_size)
+
+    print(f"Inserted: {result.inserted}")
+    print(f"Rejected: {result.rejected}")
+    for reject in result.rejects[:20]:
+        print(f"  line {reject['line']}: {'; '.join(reject['errors'])}")
+    print(f"Elapsed:  {result.elapsed:.2f}s ({result.rows_per_sec} rows/s)")
+    return 0 if result.rejected == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
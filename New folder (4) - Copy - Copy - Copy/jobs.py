@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+Background jobs for slow admin work (imports, exports, password rehashing,
+mass deletes), queued in the `jobs` table (migration 0008).
+
+The web app only inserts a row and answers 202 with the job's status URL.
+Worker processes claim queued rows with `SELECT ... FOR UPDATE SKIP LOCKED`,
+so any number of them can poll the same table without handing one job to
+two workers. A worker wakes up on NOTIFY jobs_ready, or every
+JOB_POLL_INTERVAL seconds if it missed one.
+
+While a job runs its worker sends a heartbeat from a side thread, however
+long a single step takes: a job whose worker died is put back in the queue
+once its heartbeat is older than JOB_STALE_AFTER. Workers only finish jobs
+they still hold, so a worker that was given up on cannot overwrite the row.
+Failed jobs are retried with exponential backoff until max_attempts is
+reached.
+
+Usage:
+    python jobs.py worker [--processes 4]     # run workers until SIGTERM/Ctrl-C
+    python jobs.py list [--status queued]     # show recent jobs
+"""
+
+import argparse
+import datetime
+import io
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+import logging
+from decimal import Decimal
+
+from psycopg2 import sql
+from psycopg2.extras import Json
+
+from config import Config
+import exports
+import importer
+import passwords
+
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'jobs_ready'
+STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+
+# Batch size for mass deletes; each batch commits on its own
+DELETE_BATCH_SIZE = 1000
+
+
+class JobError(Exception):
+    """A job failed in a way retrying will not fix."""
+
+
+# ------------------------
+# Queue operations
+# ------------------------
+def enqueue(db, kind, payload, created_by=None, max_attempts=None):
+    """Insert a job and wake a worker; returns the new jobs row."""
+    handler = HANDLERS[kind]
+    max_attempts = max_attempts or handler.max_attempts
+    # One round trip: the insert, and the NOTIFY that is delivered when it commits
+    return db.fetch_one(
+        "WITH job AS ("
+        " INSERT INTO jobs (kind, payload, max_attempts, created_by) VALUES (%s, %s, %s, %s) RETURNING *"
+        ") SELECT job.*, pg_notify(%s, job.kind) AS notified FROM job",
+        (kind, Json(payload), max_attempts, created_by, CHANNEL),
+    )
+
+
+def claim(db, worker_id):
+    """Atomically take the oldest runnable job, or return None."""
+    return db.fetch_one(
+        "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = %s, "
+        "started_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP, error = NULL "
+        "WHERE id = ("
+        " SELECT id FROM jobs WHERE status = 'queued' AND run_after <= CURRENT_TIMESTAMP"
+        " ORDER BY run_after, id LIMIT 1 FOR UPDATE SKIP LOCKED"
+        ") RETURNING *",
+        (worker_id,),
+    )
+
+
+# Updates by the worker running a job only touch the row while that worker still holds it:
+# requeue_stale() may have requeued it (and another worker claimed it) or failed it meanwhile
+HELD = "id = %s AND status = 'running' AND worker = %s"
+
+
+def _lost(job, action):
+    logger.warning(f"Job {job['id']} ({job['kind']}) was taken from worker {job['worker']} "
+                   f"(requeued or failed as stale); not {action} it")
+
+
+def heartbeat(db, job):
+    """Mark the job as still running; returns False once this worker no longer holds it."""
+    return bool(db.execute_query(
+        "UPDATE jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE " + HELD,
+        (job['id'], job['worker']),
+        fetch=False,
+    ))
+
+
+def report_progress(db, job, fraction, message=None):
+    db.execute_query(
+        "UPDATE jobs SET progress = %s, progress_message = COALESCE(%s, progress_message), "
+        "heartbeat_at = CURRENT_TIMESTAMP WHERE " + HELD,
+        (min(max(fraction, 0.0), 1.0), message, job['id'], job['worker']),
+        fetch=False,
+    )
+
+
+def complete(db, job, result):
+    """Mark the job succeeded; returns False if this worker no longer held it."""
+    updated = db.execute_query(
+        "UPDATE jobs SET status = 'succeeded', progress = 1, result = %s, "
+        "finished_at = CURRENT_TIMESTAMP WHERE " + HELD,
+        (Json(result), job['id'], job['worker']),
+        fetch=False,
+    )
+    if not updated:
+        _lost(job, 'completing')
+    return bool(updated)
+
+
+def fail(db, job, error, config, retryable=True):
+    """Requeue the job with exponential backoff, or mark it failed for good."""
+    if retryable and job['attempts'] < job['max_attempts']:
+        delay = config.JOB_RETRY_DELAY * 2 ** (job['attempts'] - 1)
+        updated = db.execute_query(
+            "UPDATE jobs SET status = 'queued', error = %s, worker = NULL, "
+            "run_after = CURRENT_TIMESTAMP + %s * INTERVAL '1 second' WHERE " + HELD,
+            (error, delay, job['id'], job['worker']),
+            fetch=False,
+        )
+        if not updated:
+            _lost(job, 'retrying')
+            return
+        logger.warning(f"Job {job['id']} ({job['kind']}) failed, retrying in {delay:.0f}s: {error}")
+        return
+    updated = db.execute_query(
+        "UPDATE jobs SET status = 'failed', error = %s, finished_at = CURRENT_TIMESTAMP WHERE " + HELD,
+        (error, job['id'], job['worker']),
+        fetch=False,
+    )
+    if not updated:
+        # Whoever holds the row now owns its files too
+        _lost(job, 'failing')
+        return
+    logger.error(f"Job {job['id']} ({job['kind']}) failed after {job['attempts']} attempt(s): {error}")
+    if job['kind'] in HANDLERS:
+        HANDLERS[job['kind']].cleanup(job, config)
+
+
+def cancel(db, job_id, config):
+    """Cancel a job that has not started; returns the row, or None if it was not queued."""
+    job = db.fetch_one(
+        "UPDATE jobs SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP "
+        "WHERE id = %s AND status = 'queued' RETURNING *",
+        (job_id,),
+    )
+    if job:
+        HANDLERS[job['kind']].cleanup(job, config)
+    return job
+
+
+def requeue_stale(db, config):
+    """Put back running jobs whose worker stopped sending heartbeats."""
+    rows = db.execute_query(
+        "UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END, "
+        "error = 'worker stopped responding', worker = NULL, "
+        "finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE CURRENT_TIMESTAMP END "
+        "WHERE status = 'running' AND heartbeat_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second' "
+        "RETURNING *",
+        (config.JOB_STALE_AFTER,),
+    )
+    for row in rows:
+        logger.warning(f"Job {row['id']} lost its worker; now {row['status']}")
+        if row['status'] == 'failed' and row['kind'] in HANDLERS:
+            HANDLERS[row['kind']].cleanup(row, config)
+    return len(rows)
+
+
+def get_job(db, job_id):
+    return db.fetch_one("SELECT * FROM jobs WHERE id = %s", (job_id,))
+
+
+def list_jobs(db, status=None, limit=50):
+    if status:
+        return db.execute_query(
+            "SELECT * FROM jobs WHERE status = %s ORDER BY id DESC LIMIT %s", (status, limit))
+    return db.execute_query("SELECT * FROM jobs ORDER BY id DESC LIMIT %s", (limit,))
+
+
+def serialize_job(row):
+    out = {}
+    for key, value in row.items():
+        if key == 'notified':
+            continue
+        if isinstance(value, Decimal):
+            value = float(value)
+        elif isinstance(value, (datetime.date, datetime.datetime)):
+            value = value.isoformat()
+        out[key] = value
+    return out
+
+
+# ------------------------
+# Job kinds
+# ------------------------
+class JobContext:
+    """What a handler gets: the job row, the database, and a throttled progress reporter."""
+
+    def __init__(self, db, job, config, min_interval=1.0):
+        self.db = db
+        self.job = job
+        self.payload = job['payload']
+        self.config = config
+        self.min_interval = min_interval
+        self._last_report = 0.0
+
+    def progress(self, fraction, message=None):
+        now = time.monotonic()
+        if now - self._last_report >= self.min_interval:
+            self._last_report = now
+            report_progress(self.db, self.job, fraction, message)
+
+
+class JobHandler:
+    kind = None
+    max_attempts = 3
+
+    def validate(self, payload):
+        """Return (clean payload, errors) for a job submitted through the API."""
+        return payload, []
+
+    def run(self, ctx):
+        raise NotImplementedError
+
+    def cleanup(self, job, config):
+        """Called when the job will not run again (failed for good or cancelled)."""
+
+
+def job_file_path(config, name):
+    os.makedirs(config.JOB_FILES_DIR, exist_ok=True)
+    return os.path.join(config.JOB_FILES_DIR, name)
+
+
+class ImportJob(JobHandler):
+    """payload: {table, path} - a CSV saved by /admin/import/<table>?background=1."""
+    kind = 'import'
+    # Chunks commit as they go, so a blind retry would re-send the committed ones
+    max_attempts = 1
+
+    def run(self, ctx):
+        path = ctx.payload['path']
+        size = os.path.getsize(path) or 1
+        with open(path, 'rb') as raw:
+            stream = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+            try:
+                result = importer.import_csv(
+                    ctx.db, ctx.payload['table'], stream,
+                    progress=lambda r: ctx.progress(raw.tell() / size, f"{r.inserted} rows imported"),
+                )
+            except ValueError as e:
+                raise JobError(str(e))
+        self.cleanup(ctx.job, ctx.config)
+        if result.inserted and ctx.payload['table'] == 'users':
+            # Reaches the web workers' cached pages only with the shared (sqlite) cache backend
+            from cache import DataCache, create_backend
+            DataCache(create_backend(ctx.config)).bump('users')
+        return result.to_dict()
+
+    def cleanup(self, job, config):
+        try:
+            os.remove(job['payload']['path'])
+        except OSError:
+            pass
+
+
+class ExportJob(JobHandler):
+    """payload: {table, format}; the file is downloaded from /admin/jobs/<id>/download."""
+    kind = 'export'
+
+    def validate(self, payload):
+        errors = []
+        if payload.get('table') not in exports.EXPORT_COLUMNS:
+            errors.append(f"table must be one of {', '.join(exports.EXPORT_COLUMNS)}")
+        fmt = payload.setdefault('format', 'csv')
+        if fmt not in exports.FORMATS:
+            errors.append(f"format must be one of {', '.join(exports.FORMATS)}")
+        return {'table': payload.get('table'), 'format': fmt}, errors
+
+    def run(self, ctx):
+        table, fmt = ctx.payload['table'], ctx.payload['format']
+        total = ctx.db.fetch_one(
+            sql.SQL("SELECT count(*) AS n FROM {}").format(sql.Identifier(table)))['n'] or 1
+        path = job_file_path(ctx.config, f"export-{ctx.job['id']}.{fmt}")
+        chunk_size = 2000
+        written = 0
+        with open(path, 'wb') as f:
+            for i, chunk in enumerate(exports.stream_export(ctx.db, table, fmt, chunk_size=chunk_size), start=1):
+                f.write(chunk)
+                written += len(chunk)
+                ctx.progress(min(i * chunk_size / total, 1.0), f"{written} bytes written")
+        return {'path': path, 'filename': f"{table}.{fmt}", 'mimetype': exports.FORMATS[fmt], 'bytes': written}
+
+    def cleanup(self, job, config):
+        # Drop a partial file left by the last failed attempt
+        try:
+            os.remove(job_file_path(config, f"export-{job['id']}.{job['payload'].get('format')}"))
+        except OSError:
+            pass
+
+
+class RehashPasswordsJob(JobHandler):
+    """payload: {batch_size}. Safe to retry: already hashed rows are skipped."""
+    kind = 'rehash_passwords'
+
+    def validate(self, payload):
+        batch_size = payload.get('batch_size', 500)
+        if not isinstance(batch_size, int) or batch_size < 1:
+            return payload, ['batch_size must be a positive integer']
+        return {'batch_size': batch_size}, []
+
+    def run(self, ctx):
+        pending = ctx.db.fetch_one(
+            "SELECT count(*) AS n FROM users WHERE left(password, %s) <> %s",
+            (len(passwords.ALGORITHM) + 1, passwords.ALGORITHM + '$'),
+        )['n'] or 1
+        total = passwords.rehash_legacy_passwords(
+            ctx.db, batch_size=ctx.payload.get('batch_size', 500),
+            progress=lambda done: ctx.progress(done / pending, f"{done} passwords rehashed"),
+        )
+        return {'rehashed': total}
+
+
+class DeleteEmployeesJob(JobHandler):
+    """payload: {ids: [...]} or {department: name}; deletes in committed batches."""
+    kind = 'delete_employees'
+
+    def validate(self, payload):
+        ids, department = payload.get('ids'), payload.get('department')
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+                return payload, ['ids must be a list of integers']
+            return {'ids': ids}, []
+        if isinstance(department, str) and department.strip():
+            return {'department': department.strip()}, []
+        return payload, ['Provide ids (list of integers) or department']
+
+    def run(self, ctx):
+        deleted = 0
+        if 'ids' in ctx.payload:
+            ids = ctx.payload['ids']
+            for start in range(0, len(ids), DELETE_BATCH_SIZE):
+                deleted += ctx.db.execute_query(
+                    "DELETE FROM employees WHERE id = ANY(%s)", (ids[start:start + DELETE_BATCH_SIZE],),
+                    fetch=False)
+                ctx.progress((start + DELETE_BATCH_SIZE) / max(len(ids), 1), f"{deleted} deleted")
+            return {'deleted': deleted}
+
+        department = ctx.payload['department']
+        total = ctx.db.fetch_one(
+            "SELECT count(*) AS n FROM employees WHERE department = %s", (department,))['n'] or 1
+        while True:
+            count = ctx.db.execute_query(
+                "DELETE FROM employees WHERE id IN ("
+                " SELECT id FROM employees WHERE department = %s ORDER BY id LIMIT %s)",
+                (department, DELETE_BATCH_SIZE), fetch=False)
+            if not count:
+                return {'deleted': deleted}
+            deleted += count
+            ctx.progress(deleted / total, f"{deleted} deleted")
+
+
+HANDLERS = {handler.kind: handler for handler in (
+    ImportJob(), ExportJob(), RehashPasswordsJob(), DeleteEmployeesJob())}
+
+# Kinds that POST /admin/jobs accepts; imports come in through /admin/import/<table>
+API_KINDS = ('export', 'rehash_passwords', 'delete_employees')
+
+
+# ------------------------
+# Worker
+# ------------------------
+def _send_heartbeats(db, job, interval, done):
+    """Keep the job's heartbeat fresh until `done` is set, so one long step is not a dead worker."""
+    try:
+        while not done.wait(interval):
+            try:
+                if not heartbeat(db, job):
+                    _lost(job, 'sending heartbeats for')
+                    return
+            except Exception as e:
+                logger.warning(f"Heartbeat for job {job['id']} failed: {e}")
+    finally:
+        # This thread checked out its own connection
+        db.disconnect()
+
+
+def run_job(db, job, config):
+    handler = HANDLERS.get(job['kind'])
+    if handler is None:
+        fail(db, job, f"Unknown job kind: {job['kind']}", config, retryable=False)
+        return
+    logger.info(f"Running job {job['id']} ({job['kind']}), attempt {job['attempts']}/{job['max_attempts']}")
+    started = time.perf_counter()
+    done = threading.Event()
+    beats = threading.Thread(target=_send_heartbeats, args=(db, job, config.JOB_STALE_AFTER / 3, done),
+                             name=f"job-{job['id']}-heartbeat", daemon=True)
+    beats.start()
+    try:
+        try:
+            result = handler.run(JobContext(db, job, config))
+        finally:
+            done.set()
+            beats.join()
+    except JobError as e:
+        fail(db, job, str(e), config, retryable=False)
+    except Exception as e:
+        logger.debug(traceback.format_exc())
+        fail(db, job, f"{type(e).__name__}: {e}", config)
+    else:
+        if complete(db, job, result):
+            logger.info(f"Job {job['id']} ({job['kind']}) succeeded in {time.perf_counter() - started:.1f}s")
+
+
+def worker_loop(db, config, stop_event, worker_id=None):
+    """Claim and run jobs until stop_event is set."""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    wake = threading.Event()
+    try:
+        from notifications import get_listener
+        get_listener().subscribe(CHANNEL, lambda channel, payload: wake.set())
+    except Exception as e:
+        logger.warning(f"Could not LISTEN for {CHANNEL}, polling only: {e}")
+
+    last_sweep = 0.0
+    while not stop_event.is_set():
+        if time.monotonic() - last_sweep > config.JOB_STALE_AFTER / 2:
+            requeue_stale(db, config)
+            last_sweep = time.monotonic()
+        job = claim(db, worker_id)
+        if job is None:
+            wake.wait(config.JOB_POLL_INTERVAL)
+            wake.clear()
+            continue
+        run_job(db, job, config)
+
+
+def _worker_process(index, config):
+    from database import configure_database
+    from logging_config import configure_logging
+
+    configure_logging(config)
+    stop_event = threading.Event()
+    # Finish the current job, then exit
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    worker_loop(configure_database(config), config, stop_event, worker_id=f"{socket.gethostname()}:{os.getpid()}:{index}")
+
+
+def run_workers(processes, config):
+    """Start `processes` workers and restart any that die, until SIGTERM/SIGINT."""
+    ctx = multiprocessing.get_context('spawn')
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+
+    workers = {}
+    while not stopping.is_set():
+        for index in range(processes):
+            proc = workers.get(index)
+            if proc is None or not proc.is_alive():
+                if proc is not None:
+                    logger.warning(f"Job worker {index} exited ({proc.exitcode}); restarting")
+                proc = ctx.Process(target=_worker_process, args=(index, config), name=f'job-worker-{index}')
+                proc.start()
+                workers[index] = proc
+        stopping.wait(1.0)
+
+    for proc in workers.values():
+        proc.terminate()
+    for proc in workers.values():
+        proc.join()
+
+
+def main(argv=None, config=None):
+    from database import configure_database
+    from logging_config import configure_logging
+
+    config = config or Config()
+    configure_logging(config)
+
+    parser = argparse.ArgumentParser(description="Background job workers")
+    sub = parser.add_subparsers(dest='command', required=True)
+    worker = sub.add_parser('worker', help="Run job worker processes")
+    worker.add_argument('--processes', type=int, default=config.JOB_WORKERS)
+    listing = sub.add_parser('list', help="Show recent jobs")
+    listing.add_argument('--status', choices=STATUSES)
+    listing.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.command == 'worker':
+        run_workers(args.processes, config)
+        return 0
+
+    for job in list_jobs(configure_database(config), args.status, args.limit):
+        print(f"{job['id']:>6} {job['kind']:<18} {job['status']:<10} {job['progress'] * 100:5.1f}% "
+              f"attempts={job['attempts']}/{job['max_attempts']} {job['error'] or ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+In-process request and query metrics, rendered in the Prometheus text format.
+
+app.py opens a per-request scope with start_request()/finish_request();
+database.Database reports every statement through record_query() and every
+pool checkout through record_acquire(). Statements slower than
+Config.SLOW_QUERY_MS are written to the `slow_query` logger with their
+literals stripped, so similar statements group together.
+"""
+
+import logging
+import re
+import threading
+import time
+
+from config import Config
+
+
+slow_query_logger = logging.getLogger('slow_query')
+
+# Seconds; roughly logarithmic from 1 ms to 10 s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}   # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = _format_labels(self.labelnames, labels, ('le', bound))
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                inf = _format_labels(self.labelnames, labels, ('le', '+Inf'))
+                lines.append(f"{self.name}_bucket{inf} {series[-1]}")
+                label_str = _format_labels(self.labelnames, labels)
+                lines.append(f"{self.name}_sum{label_str} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{label_str} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time."""
+
+    def __init__(self, name, help, fn):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.fn()}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.register(Histogram(
+    'http_request_duration_seconds', 'Time spent in the request handler',
+    ('method', 'endpoint', 'status')))
+REQUEST_DB_QUERIES = registry.register(Histogram(
+    'http_request_db_queries', 'Database statements issued per request',
+    ('endpoint',), buckets=COUNT_BUCKETS))
+REQUEST_DB_TIME = registry.register(Histogram(
+    'http_request_db_seconds', 'Database time (acquire + statements) per request', ('endpoint',)))
+QUERY_DURATION = registry.register(Histogram(
+    'db_query_duration_seconds', 'Duration of single database statements'))
+ACQUIRE_DURATION = registry.register(Histogram(
+    'db_pool_acquire_seconds', 'Time spent waiting for a pooled connection'))
+SLOW_QUERIES = registry.register(Counter(
+    'db_slow_queries_total', 'Statements slower than SLOW_QUERY_MS'))
+RATE_LIMITED = registry.register(Counter(
+    'http_rate_limited_total', 'Requests refused with 429 by a rate limit', ('limit',)))
+LOAD_SHED = registry.register(Counter(
+    'http_load_shed_total', 'Requests refused with 503 by a concurrency limit', ('limit',)))
+
+
+# ------------------------
+# Per-request scope
+# ------------------------
+_local = threading.local()
+_slow_query_seconds = Config().SLOW_QUERY_MS / 1000.0
+
+
+def start_request():
+    _local.started = time.perf_counter()
+    _local.queries = 0
+    _local.db_time = 0.0
+
+
+def finish_request(method, endpoint, status):
+    """Close the current request scope; returns (handler seconds, db seconds, queries)."""
+    started = getattr(_local, 'started', None)
+    if started is None:
+        return None
+    elapsed = time.perf_counter() - started
+    queries, db_time = _local.queries, _local.db_time
+    _local.started = None
+    REQUEST_DURATION.observe(elapsed, method, endpoint, str(status))
+    REQUEST_DB_QUERIES.observe(queries, endpoint)
+    REQUEST_DB_TIME.observe(db_time, endpoint)
+    return elapsed, db_time, queries
+
+
+def record_acquire(duration):
+    ACQUIRE_DURATION.observe(duration)
+    if getattr(_local, 'started', None) is not None:
+        _local.db_time += duration
+
+
+def record_query(duration, sql_text):
+    """Record one statement; `sql_text` is a callable only evaluated for slow ones."""
+    QUERY_DURATION.observe(duration)
+    if getattr(_local, 'started', None) is not None:
+        _local.queries += 1
+        _local.db_time += duration
+    if duration >= _slow_query_seconds:
+        SLOW_QUERIES.inc()
+        slow_query_logger.warning(f"{duration * 1000:.1f} ms: {normalize_sql(sql_text())}")
+
+
+# ------------------------
+# Slow-query log
+# ------------------------
+_PARAM_RE = re.compile(r"%\(\w+\)s|%s")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.$])-?\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_RE = re.compile(r"(VALUES\s*\(\?\))(?:\s*,\s*\(\?\))+", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(text):
+    """Replace literals with ? and collapse IN/VALUES lists, e.g.
+
+    "SELECT * FROM users WHERE id IN (1, 2, 3) AND name = 'x'"
+        -> "SELECT * FROM users WHERE id IN (?) AND name = ?"
+    """
+    text = _PARAM_RE.sub('?', text)
+    text = _STRING_RE.sub('?', text)
+    text = _NUMBER_RE.sub('?', text)
+    text = _LIST_RE.sub('(?)', text)
+    text = _VALUES_RE.sub(r'\1, ...', text)
+    return _SPACE_RE.sub(' ', text).strip()
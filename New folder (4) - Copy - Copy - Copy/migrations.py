@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+Schema migrations for the app's own tables and indexes.
+
+The app never changes the schema on startup; run this script once per
+deploy instead. Each migration runs once and is recorded in schema_migrations.
+
+Usage:
+    python migrations.py            # apply pending migrations
+    python migrations.py --list     # show applied / pending
+"""
+
+import argparse
+import re
+import sys
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+# Rows per table in table_versions (migration 0010); writers to a table contend on one in this many
+TABLE_VERSION_SLOTS = 16
+
+_CONCURRENT_INDEX_RE = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE)
+
+
+def _index_valid(cur, name):
+    """pg_index.indisvalid for index `name`, or None if there is no such index."""
+    cur.execute(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = %s AND pg_table_is_visible(c.oid)", (name,)
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _execute(cur, statement):
+    """Run one migration statement, making sure a concurrent index build leaves a valid index.
+
+    A failed CREATE INDEX CONCURRENTLY (e.g. a unique index over duplicate
+    values) leaves an INVALID index behind, which IF NOT EXISTS would skip on
+    the next run: the migration would be recorded while the index is never used
+    or enforced. Such a leftover is dropped and built again instead.
+    """
+    match = _CONCURRENT_INDEX_RE.search(statement)
+    if match and _index_valid(cur, match.group(1)) is False:
+        logger.warning(f"Rebuilding index {match.group(1)}, left invalid by an earlier failed build")
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(1)}")
+    cur.execute(statement)
+    if match and not _index_valid(cur, match.group(1)):
+        raise RuntimeError(f"Index {match.group(1)} was not built; it is missing or invalid")
+
+
+def _employee_search_indexes(cur):
+    """Indexes behind /employees/search (see employees.search_query).
+
+    Prefix matches use text_pattern_ops btree indexes, which need nothing
+    beyond core PostgreSQL. Substring matches need pg_trgm's GIN indexes; if
+    the extension cannot be installed they fall back to a sequential scan.
+    """
+    cur.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = 'public' AND table_name = 'employees' "
+        "AND column_name IN ('name', 'email', 'department')"
+    )
+    columns = [row[0] for row in cur.fetchall()]
+    cur.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    trigram = cur.fetchone() is not None
+    if trigram:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    else:
+        logger.warning("pg_trgm is not available; substring search on employees will not be indexed")
+    for column in columns:
+        _execute(
+            cur,
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS employees_{column}_prefix_idx "
+            f"ON employees (lower({column}) text_pattern_ops)"
+        )
+        if trigram:
+            _execute(
+                cur,
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS employees_{column}_trgm_idx "
+                f"ON employees USING gin (lower({column}) gin_trgm_ops)"
+            )
+
+
+def _employee_stats(cur):
+    """Summary table behind /employees/stats, kept current by triggers.
+
+    Statement-level triggers with transition tables fold a whole INSERT,
+    UPDATE, DELETE or COPY into one upsert per department, so bulk loads pay
+    one aggregate per statement rather than one per row. Departments are
+    upserted in sorted order so concurrent writers lock them consistently.
+    """
+    cur.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = 'public' AND table_name = 'employees' "
+        "AND column_name IN ('department', 'department_id')"
+    )
+    columns = {row[0] for row in cur.fetchall()}
+    key = "department" if 'department' in columns else "department_id::text" if columns else "''"
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS employee_stats (
+            department TEXT PRIMARY KEY,
+            employee_count BIGINT NOT NULL DEFAULT 0,
+            salary_sum NUMERIC NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    upsert = """
+            INSERT INTO employee_stats AS s (department, employee_count, salary_sum)
+            SELECT COALESCE(dept, ''), sum(n), sum(amount) FROM ({rows}) AS d
+            GROUP BY 1 ORDER BY 1
+            ON CONFLICT (department) DO UPDATE SET
+                employee_count = s.employee_count + EXCLUDED.employee_count,
+                salary_sum = s.salary_sum + EXCLUDED.salary_sum,
+                updated_at = CURRENT_TIMESTAMP;"""
+    added = f"SELECT {key} AS dept, 1 AS n, salary AS amount FROM new_rows"
+    removed = f"SELECT {key} AS dept, -1 AS n, -salary AS amount FROM old_rows"
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION employee_stats_apply() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN{upsert.format(rows=added)}
+            ELSIF TG_OP = 'DELETE' THEN{upsert.format(rows=removed)}
+            ELSE{upsert.format(rows=added + ' UNION ALL ' + removed)}
+            END IF;
+            RETURN NULL;
+        END $$
+    """)
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION employee_stats_rebuild() RETURNS void
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            -- Blocks employee writes (not reads) while the totals are recomputed
+            LOCK TABLE employees IN SHARE MODE;
+            DELETE FROM employee_stats;
+            INSERT INTO employee_stats (department, employee_count, salary_sum)
+            SELECT COALESCE({key}, ''), count(*), COALESCE(sum(salary), 0) FROM employees GROUP BY 1;
+        END $$
+    """)
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION employee_stats_truncate() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            DELETE FROM employee_stats;
+            RETURN NULL;
+        END $$
+    """)
+    cur.execute("BEGIN")
+    try:
+        _create_employee_stats_triggers(cur)
+    except Exception:
+        cur.execute("ROLLBACK")
+        raise
+    cur.execute("COMMIT")
+
+
+def _create_employee_stats_triggers(cur):
+    for event, referencing in (('INSERT', 'NEW TABLE AS new_rows'),
+                               ('UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+                               ('DELETE', 'OLD TABLE AS old_rows')):
+        cur.execute(f"DROP TRIGGER IF EXISTS employee_stats_{event.lower()} ON employees")
+        cur.execute(
+            f"CREATE TRIGGER employee_stats_{event.lower()} AFTER {event} ON employees "
+            f"REFERENCING {referencing} FOR EACH STATEMENT EXECUTE FUNCTION employee_stats_apply()"
+        )
+    cur.execute("DROP TRIGGER IF EXISTS employee_stats_truncate ON employees")
+    cur.execute(
+        "CREATE TRIGGER employee_stats_truncate AFTER TRUNCATE ON employees "
+        "FOR EACH STATEMENT EXECUTE FUNCTION employee_stats_truncate()"
+    )
+    # Backfill in the same transaction as the triggers, so no write is missed or counted twice
+    cur.execute("SELECT employee_stats_rebuild()")
+
+
+def _row_change_notify(cur):
+    """Triggers behind the /events change feed (see change_feed.py).
+
+    Each writing statement NOTIFYs one message per changed row on
+    'table_changes', carrying the table, operation and row (never the
+    password). Statements touching more than 100 rows, and rows too large
+    for a NOTIFY payload, send a single 'reload' message instead, so bulk
+    loads do not flood the listener.
+    """
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION notify_row_changes() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            changed INTEGER;
+            payload TEXT;
+            r RECORD;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                SELECT count(*) INTO changed FROM old_rows;
+            ELSE
+                SELECT count(*) INTO changed FROM new_rows;
+            END IF;
+            IF changed = 0 THEN
+                RETURN NULL;
+            END IF;
+            IF changed > 100 THEN
+                PERFORM pg_notify('table_changes', json_build_object(
+                    'table', TG_TABLE_NAME, 'op', 'reload', 'count', changed)::text);
+                RETURN NULL;
+            END IF;
+            IF TG_OP = 'DELETE' THEN
+                FOR r IN SELECT to_jsonb(o) - 'password' AS row FROM old_rows o LOOP
+                    PERFORM pg_notify('table_changes', json_build_object(
+                        'table', TG_TABLE_NAME, 'op', TG_OP, 'id', r.row->'id')::text);
+                END LOOP;
+            ELSE
+                FOR r IN SELECT to_jsonb(n) - 'password' AS row FROM new_rows n LOOP
+                    payload := json_build_object(
+                        'table', TG_TABLE_NAME, 'op', TG_OP, 'id', r.row->'id', 'row', r.row)::text;
+                    IF octet_length(payload) > 7900 THEN
+                        -- NOTIFY payloads are capped at 8000 bytes
+                        payload := json_build_object(
+                            'table', TG_TABLE_NAME, 'op', 'reload', 'count', 1)::text;
+                    END IF;
+                    PERFORM pg_notify('table_changes', payload);
+                END LOOP;
+            END IF;
+            RETURN NULL;
+        END $$
+    """)
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION notify_table_reload() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM pg_notify('table_changes', json_build_object('table', TG_TABLE_NAME, 'op', 'reload')::text);
+            RETURN NULL;
+        END $$
+    """)
+    cur.execute("BEGIN")
+    try:
+        for table in ('users', 'employees'):
+            cur.execute(f"DROP TRIGGER IF EXISTS {table}_notify_truncate ON {table}")
+            cur.execute(
+                f"CREATE TRIGGER {table}_notify_truncate AFTER TRUNCATE ON {table} "
+                f"FOR EACH STATEMENT EXECUTE FUNCTION notify_table_reload()"
+            )
+            for event, referencing in (('INSERT', 'NEW TABLE AS new_rows'),
+                                       ('UPDATE', 'NEW TABLE AS new_rows'),
+                                       ('DELETE', 'OLD TABLE AS old_rows')):
+                name = f"{table}_notify_{event.lower()}"
+                cur.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+                cur.execute(
+                    f"CREATE TRIGGER {name} AFTER {event} ON {table} REFERENCING {referencing} "
+                    f"FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes()"
+                )
+    except Exception:
+        cur.execute("ROLLBACK")
+        raise
+    cur.execute("COMMIT")
+
+
+def _table_version_slots(cur):
+    """Spread each table's table_versions counter over TABLE_VERSION_SLOTS rows.
+
+    Migration 0006 bumped one row per table on every writing statement, so
+    every writer to a table queued on that row's lock until it committed.
+    Now a transaction bumps a single row, picked by its transaction id, and
+    only once however many statements it runs. A table's version is the sum
+    of its rows (http_cache.table_state()), which still grows with every
+    commit and only then.
+    """
+    cur.execute("BEGIN")
+    try:
+        cur.execute("ALTER TABLE table_versions ADD COLUMN IF NOT EXISTS slot SMALLINT NOT NULL DEFAULT 0")
+        cur.execute("ALTER TABLE table_versions DROP CONSTRAINT IF EXISTS table_versions_pkey")
+        cur.execute("ALTER TABLE table_versions DROP CONSTRAINT IF EXISTS table_versions_slot_pkey")
+        cur.execute("ALTER TABLE table_versions ADD CONSTRAINT table_versions_slot_pkey "
+                    "PRIMARY KEY (table_name, slot)")
+        # Replaced in the same transaction as the key, so no write runs the old ON CONFLICT
+        cur.execute(f"""
+            CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            DECLARE
+                bumped TEXT := 'table_versions.' || TG_TABLE_NAME;
+            BEGIN
+                -- A transaction-local setting, so it resets at commit and with a rolled back savepoint
+                IF current_setting(bumped, true) = '1' THEN
+                    RETURN NULL;
+                END IF;
+                PERFORM set_config(bumped, '1', true);
+                INSERT INTO table_versions AS v (table_name, slot, version, modified_at)
+                VALUES (TG_TABLE_NAME, txid_current() % {TABLE_VERSION_SLOTS}, 1, clock_timestamp())
+                ON CONFLICT (table_name, slot) DO UPDATE SET
+                    version = v.version + 1, modified_at = clock_timestamp();
+                RETURN NULL;
+            END $$
+        """)
+    except Exception:
+        cur.execute("ROLLBACK")
+        raise
+    cur.execute("COMMIT")
+
+
+# (name, steps). A step is an SQL string or a callable taking the cursor.
+# Steps run in autocommit mode so that CREATE INDEX CONCURRENTLY can be used
+# without locking the table.
+MIGRATIONS = [
+    ('0001_users_password_width', [
+        # Hashed passwords are ~100 characters; widen narrow legacy columns
+        """
+        DO $$
+        BEGIN
+            IF (SELECT character_maximum_length FROM information_schema.columns
+                WHERE table_schema = 'public' AND table_name = 'users'
+                  AND column_name = 'password') < 255 THEN
+                ALTER TABLE users ALTER COLUMN password TYPE VARCHAR(255);
+            END IF;
+        END $$
+        """,
+    ]),
+    ('0002_users_username_unique', [
+        # Login looks users up by username only; this makes it an index probe
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS users_username_key ON users (username)",
+    ]),
+    ('0003_schema_changed_notify', [
+        # Lets running app processes refresh their schema cache after any DDL.
+        # Event triggers need a superuser; without one, migrations.py's own
+        # NOTIFY and the cache TTL still apply.
+        """
+        CREATE OR REPLACE FUNCTION notify_schema_changed() RETURNS event_trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM pg_notify('schema_changed', tg_tag);
+        END $$
+        """,
+        """
+        DO $$
+        BEGIN
+            IF (SELECT rolsuper FROM pg_roles WHERE rolname = current_user)
+               AND NOT EXISTS (SELECT 1 FROM pg_event_trigger WHERE evtname = 'schema_changed_notify') THEN
+                CREATE EVENT TRIGGER schema_changed_notify ON ddl_command_end
+                    EXECUTE FUNCTION notify_schema_changed();
+            END IF;
+        END $$
+        """,
+    ]),
+    ('0004_employees_search_indexes', [
+        _employee_search_indexes,
+    ]),
+    ('0005_employee_stats', [
+        _employee_stats,
+    ]),
+    ('0006_table_versions', [
+        # Per-table change counter behind the HTTP ETag/Last-Modified headers (http_cache.py).
+        # Bumped once per writing statement and only visible once it commits.
+        """
+        CREATE TABLE IF NOT EXISTS table_versions (
+            table_name TEXT PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            modified_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO table_versions AS v (table_name, version, modified_at)
+            VALUES (TG_TABLE_NAME, 1, clock_timestamp())
+            ON CONFLICT (table_name) DO UPDATE SET
+                version = v.version + 1, modified_at = clock_timestamp();
+            RETURN NULL;
+        END $$
+        """,
+        "DROP TRIGGER IF EXISTS users_version ON users",
+        "CREATE TRIGGER users_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON users "
+        "FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()",
+        "DROP TRIGGER IF EXISTS employees_version ON employees",
+        "CREATE TRIGGER employees_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON employees "
+        "FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()",
+        "INSERT INTO table_versions (table_name, version) VALUES ('users', 1), ('employees', 1) "
+        "ON CONFLICT (table_name) DO NOTHING",
+    ]),
+    ('0007_row_change_notify', [
+        _row_change_notify,
+    ]),
+    ('0008_jobs', [
+        # Background job queue (jobs.py). Workers claim rows with FOR UPDATE SKIP LOCKED.
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id BIGSERIAL PRIMARY KEY,
+            kind VARCHAR(50) NOT NULL,
+            payload JSONB NOT NULL DEFAULT '{}',
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            run_after TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            progress REAL NOT NULL DEFAULT 0,
+            progress_message TEXT,
+            result JSONB,
+            error TEXT,
+            worker VARCHAR(255),
+            created_by VARCHAR(255),
+            created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMPTZ,
+            heartbeat_at TIMESTAMPTZ,
+            finished_at TIMESTAMPTZ
+        )
+        """,
+        # Only queued rows are ever searched for work, so the index stays small
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS jobs_queued_idx ON jobs (run_after, id) WHERE status = 'queued'",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS jobs_running_idx ON jobs (heartbeat_at) WHERE status = 'running'",
+    ]),
+    ('0009_users_row_version', [
+        # Per-row update counter; the dashboards cache each rendered user under (id, row_version).
+        # A constant default makes ADD COLUMN a catalog-only change, with no table rewrite.
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS row_version BIGINT NOT NULL DEFAULT 1",
+        """
+        CREATE OR REPLACE FUNCTION bump_row_version() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.row_version := OLD.row_version + 1;
+            RETURN NEW;
+        END $$
+        """,
+        "DROP TRIGGER IF EXISTS users_row_version ON users",
+        "CREATE TRIGGER users_row_version BEFORE UPDATE ON users "
+        "FOR EACH ROW EXECUTE FUNCTION bump_row_version()",
+    ]),
+    ('0010_table_version_slots', [
+        _table_version_slots,
+    ]),
+]
+
+
+def _ensure_table(cur):
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " name VARCHAR(255) PRIMARY KEY,"
+        " applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+
+
+def applied_migrations(cur):
+    _ensure_table(cur)
+    cur.execute("SELECT name FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def run_migrations(pool):
+    """Apply every pending migration in order; returns the names applied."""
+    conn = pool.acquire()
+    applied = []
+    try:
+        conn.autocommit = True
+        cur = conn.cursor()
+        done = applied_migrations(cur)
+        for name, steps in MIGRATIONS:
+            if name in done:
+                continue
+            logger.info(f"Applying migration {name}")
+            for step in steps:
+                if callable(step):
+                    step(cur)
+                else:
+                    _execute(cur, step)
+            cur.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+            applied.append(name)
+        if applied:
+            # Running app processes reload their schema cache (see schema_cache.py)
+            cur.execute("SELECT pg_notify('schema_changed', 'migrations')")
+        cur.close()
+    finally:
+        conn.autocommit = False
+        pool.release(conn)
+    return applied
+
+
+def main(argv=None):
+    from db_pool import get_pool
+    from config import Config
+    from logging_config import configure_logging
+
+    configure_logging(Config())
+
+    parser = argparse.ArgumentParser(description="Apply schema migrations")
+    parser.add_argument('--list', action='store_true', help="Show migration status and exit")
+    args = parser.parse_args(argv)
+
+    pool = get_pool()
+    if args.list:
+        with pool.connection() as conn:
+            cur = conn.cursor()
+            done = applied_migrations(cur)
+            conn.commit()
+        for name, _ in MIGRATIONS:
+            print(f"[{'x' if name in done else ' '}] {name}")
+        return 0
+
+    applied = run_migrations(pool)
+    print(f"Applied {len(applied)} migration(s)" + (f": {', '.join(applied)}" if applied else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+One LISTEN connection per process for PostgreSQL NOTIFY events.
+
+Components subscribe a callback to a channel; a single daemon thread holds a
+dedicated (unpooled) connection, LISTENs on every subscribed channel and
+calls `callback(channel, payload)` for each notification. If the connection
+drops, it reconnects with backoff and calls every callback with
+payload=None, since notifications sent meanwhile were lost; subscribers
+should treat that as "resynchronise everything".
+"""
+
+import os
+import select
+import threading
+import time
+import logging
+
+import psycopg2
+from psycopg2 import sql
+
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationListener:
+    def __init__(self, connect_kwargs, poll_interval=5.0, max_backoff=30.0):
+        self.connect_kwargs = connect_kwargs
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self._callbacks = {}          # channel -> [callback, ...]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake_r, self._wake_w = os.pipe()
+        self._thread = None
+        self.connected = False
+
+    def subscribe(self, channel, callback):
+        with self._lock:
+            self._callbacks.setdefault(channel, []).append(callback)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='pg-listener', daemon=True)
+                self._thread.start()
+        self._wake()
+
+    def unsubscribe(self, channel, callback):
+        with self._lock:
+            callbacks = self._callbacks.get(channel, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._callbacks.pop(channel, None)
+        self._wake()
+
+    def stop(self):
+        self._stop.set()
+        self._wake()
+
+    def _wake(self):
+        os.write(self._wake_w, b'x')
+
+    def _dispatch(self, channel, payload):
+        with self._lock:
+            callbacks = list(self._callbacks.get(channel, ()))
+        for callback in callbacks:
+            try:
+                callback(channel, payload)
+            except Exception as e:
+                logger.error(f"Notification handler for {channel} failed: {e}")
+
+    def _sync_channels(self, cur, listening):
+        with self._lock:
+            wanted = set(self._callbacks)
+        for channel in wanted - listening:
+            cur.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+        for channel in listening - wanted:
+            cur.execute(sql.SQL("UNLISTEN {}").format(sql.Identifier(channel)))
+        return wanted
+
+    def _run(self):
+        backoff = 1.0
+        first = True
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.connect_kwargs)
+                conn.autocommit = True
+                cur = conn.cursor()
+                listening = self._sync_channels(cur, set())
+                self.connected = True
+                backoff = 1.0
+                if not first:
+                    logger.info("Notification listener reconnected")
+                    for channel in listening:
+                        self._dispatch(channel, None)
+                first = False
+
+                while not self._stop.is_set():
+                    readable, _, _ = select.select([conn, self._wake_r], [], [], self.poll_interval)
+                    if self._wake_r in readable:
+                        os.read(self._wake_r, 1024)
+                        listening = self._sync_channels(cur, listening)
+                    # poll() also notices a dead connection during quiet periods
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self._dispatch(notify.channel, notify.payload)
+            except psycopg2.Error as e:
+                self.connected = False
+                logger.warning(f"Notification listener disconnected ({e}); retrying in {backoff:.0f}s")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            finally:
+                self.connected = False
+                if conn is not None and not conn.closed:
+                    conn.close()
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def get_listener():
+    """Return the process-wide listener, connecting with the pool's settings."""
+    global _listener
+    if _listener is None:
+        with _listener_lock:
+            if _listener is None:
+                from db_pool import get_pool
+                _listener = NotificationListener(get_pool().connect_kwargs)
+    return _listener
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Password hashing for the users table.
+
+Hashes are PBKDF2-HMAC-SHA256 strings of the form
+    pbkdf2_sha256$<iterations>$<salt>$<hash>
+so the cost can be raised later: verify_password() reports when a stored
+hash (or a legacy plaintext password) should be rehashed at the current cost.
+
+Usage:
+    python passwords.py migrate [--batch-size 500]
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import os
+import sys
+import threading
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+
+
+logger = logging.getLogger(__name__)
+
+ALGORITHM = 'pbkdf2_sha256'
+SALT_BYTES = 16
+
+
+class HashPoolBusy(Exception):
+    """Raised when too many hash jobs are already queued."""
+
+
+def is_hashed(stored):
+    return bool(stored) and stored.startswith(ALGORITHM + '$')
+
+
+def hash_password(password, iterations=None):
+    iterations = iterations or Config().PASSWORD_HASH_ITERATIONS
+    salt = base64.b64encode(os.urandom(SALT_BYTES)).decode('ascii').rstrip('=')
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('ascii'), iterations)
+    return f"{ALGORITHM}${iterations}${salt}${base64.b64encode(digest).decode('ascii')}"
+
+
+def verify_password(password, stored, iterations=None):
+    """Check `password` against a stored hash (or legacy plaintext).
+
+    Returns (ok, needs_rehash). needs_rehash is True for legacy plaintext
+    rows and for hashes made with a different iteration count.
+    """
+    iterations = iterations or Config().PASSWORD_HASH_ITERATIONS
+    if not stored:
+        return False, False
+    if not is_hashed(stored):
+        ok = hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8'))
+        return ok, ok
+    try:
+        _, rounds, salt, expected = stored.split('$', 3)
+        rounds = int(rounds)
+    except ValueError:
+        return False, False
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('ascii'), rounds)
+    ok = hmac.compare_digest(base64.b64encode(digest).decode('ascii'), expected)
+    return ok, ok and rounds != iterations
+
+
+class HashPool:
+    """Bounded thread pool for password hashing.
+
+    hashlib releases the GIL while it runs PBKDF2, so up to `workers` hashes
+    run in parallel without blocking other request threads. At most
+    `max_pending` jobs may be queued or running; beyond that submit() raises
+    HashPoolBusy so a login burst is rejected instead of piling up.
+    `iterations` is the PBKDF2 cost it hashes with (default: Config's).
+    """
+
+    def __init__(self, workers=4, max_pending=64, iterations=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.iterations = iterations
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pw-hash')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(self, fn, *args, timeout=1.0):
+        if not self._slots.acquire(timeout=timeout):
+            raise HashPoolBusy("Too many password checks in progress")
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def verify(self, password, stored, timeout=None):
+        return self.submit(verify_password, password, stored, self.iterations).result(timeout)
+
+    def hash(self, password, timeout=None):
+        return self.submit(hash_password, password, self.iterations).result(timeout)
+
+    def hash_many(self, passwords):
+        """Hash a batch of passwords in parallel, preserving order.
+
+        Takes the same slots as logins, but waits for them instead of raising
+        HashPoolBusy, and keeps at most `workers` of its hashes queued or
+        running, so an import never holds more slots than it can use at once.
+        """
+        hashes, pending = [], deque()
+        for password in passwords:
+            if len(pending) >= self.workers:
+                hashes.append(pending.popleft().result())
+            pending.append(self.submit(hash_password, password, self.iterations, timeout=None))
+        hashes.extend(future.result() for future in pending)
+        return hashes
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _create_hash_pool(config):
+    return HashPool(workers=config.PASSWORD_HASH_WORKERS, max_pending=config.PASSWORD_HASH_MAX_PENDING,
+                    iterations=config.PASSWORD_HASH_ITERATIONS)
+
+
+def get_hash_pool(config=None):
+    """Return the shared HashPool, created from `config` (default: Config()) on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _create_hash_pool(config or Config())
+    return _pool
+
+
+def configure_hash_pool(config):
+    """Make the shared HashPool one sized by `config`; create_app() calls this."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and (_pool.workers, _pool.max_pending, _pool.iterations) == (
+                config.PASSWORD_HASH_WORKERS, config.PASSWORD_HASH_MAX_PENDING, config.PASSWORD_HASH_ITERATIONS):
+            return _pool
+        previous, _pool = _pool, _create_hash_pool(config)
+    if previous is not None:
+        # Hashes already submitted still finish on the old pool's threads
+        previous.shutdown()
+    return _pool
+
+
+# A hash to verify against when the username does not exist, so unknown
+# users take as long to reject as wrong passwords.
+_dummy_hash = None
+
+
+def dummy_hash():
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(base64.b64encode(os.urandom(12)).decode('ascii'))
+    return _dummy_hash
+
+
+# ------------------------
+# Legacy plaintext migration
+# ------------------------
+def rehash_legacy_passwords(db, batch_size=500, pool=None, stop_event=None, progress=None):
+    """Replace plaintext passwords with hashes, one batch per transaction.
+
+    Walks users by id so each batch is an index range scan. A row is only
+    updated if its password is still the plaintext value that was read, so a
+    concurrent edit_user or login rehash is never overwritten.
+    Returns the number of rows rehashed.
+    """
+    pool = pool or get_hash_pool()
+    last_id = 0
+    total = 0
+    while not (stop_event and stop_event.is_set()):
+        rows = db.execute_query(
+            "SELECT id, password FROM users WHERE id > %s AND left(password, %s) <> %s "
+            "ORDER BY id ASC LIMIT %s",
+            (last_id, len(ALGORITHM) + 1, ALGORITHM + '$', batch_size),
+        )
+        if not rows:
+            break
+        hashes = pool.hash_many([r['password'] for r in rows])
+        db.execute_batch(
+            "UPDATE users SET password = %s WHERE id = %s AND password = %s",
+            [(h, r['id'], r['password']) for h, r in zip(hashes, rows)],
+        )
+        last_id = rows[-1]['id']
+        total += len(rows)
+        logger.info(f"Rehashed {total} legacy passwords (up to id {last_id})")
+        if progress:
+            progress(total)
+    return total
+
+
+def start_background_rehash(db, batch_size=500):
+    """Run rehash_legacy_passwords() in a daemon thread; returns (thread, stop_event)."""
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=rehash_legacy_passwords,
+        kwargs={'db': db, 'batch_size': batch_size, 'stop_event': stop_event},
+        name='password-rehash',
+        daemon=True,
+    )
+    thread.start()
+    return thread, stop_event
+
+
+def main(argv=None):
+    from database import db_instance
+    from logging_config import configure_logging
+
+    configure_logging(Config())
+
+    parser = argparse.ArgumentParser(description="Password hashing maintenance")
+    sub = parser.add_subparsers(dest='command', required=True)
+    migrate = sub.add_parser('migrate', help="Hash all legacy plaintext passwords")
+    migrate.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    if args.command == 'migrate':
+        total = rehash_legacy_passwords(db_instance, batch_size=args.batch_size)
+        print(f"Rehashed {total} legacy passwords")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
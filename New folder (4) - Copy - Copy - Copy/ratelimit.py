@@ -0,0 +1,281 @@
+"""
+Rate limits and concurrency limits for the expensive routes (login, admin writes).
+
+RateLimiter is a token bucket per key (a client IP, a username): the bucket
+holds up to `burst` tokens and refills at `rate` tokens per second, every
+request takes one, and a request that finds it empty is refused with the
+seconds until the next token. Buckets live in a store: LocalRateLimitStore
+keeps them per process; SQLiteRateLimitStore keeps them in a file shared by
+every worker on the host, so four workers do not allow four times the rate.
+
+ConcurrencyLimiter admits a request of one kind only while the connection
+pool has room: nobody is queueing for a connection and more than `reserve`
+are free (pool_busy()). A fixed `limit` on how many run at once in this
+process can be set on top. A request waits up to `timeout` for both and is
+then shed instead of queueing for the pool, which leaves connections (and
+threads) for the dashboards when logins arrive in a burst.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class Overloaded(Exception):
+    """Raised when a ConcurrencyLimiter has no free slot within its timeout."""
+
+
+def _take(tokens, updated, now, rate, burst):
+    """Refill a bucket up to `now` and take one token.
+
+    Returns (allowed, tokens left, seconds until a token is available).
+    """
+    tokens = min(burst, tokens + max(now - updated, 0.0) * rate)
+    if tokens >= 1.0:
+        return True, tokens - 1.0, 0.0
+    return False, tokens, (1.0 - tokens) / rate
+
+
+# ------------------------
+# Bucket stores
+# ------------------------
+class RateLimitStore:
+    """Interface for token bucket state; take() must be atomic per key."""
+
+    def take(self, key, rate, burst):
+        """Take a token from `key`'s bucket; returns (allowed, retry_after seconds)."""
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+class LocalRateLimitStore(RateLimitStore):
+    """In-process buckets; each worker process enforces its own limits.
+
+    At most `maxsize` buckets are kept. Evicting the least recently used one
+    only resets it to full, which is what an idle bucket refills to anyway.
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()   # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            allowed, tokens, retry_after = _take(tokens, updated, now, rate, burst)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+    def stats(self):
+        return {'store': 'local', 'buckets': len(self._buckets), 'max_buckets': self.maxsize}
+
+
+class SQLiteRateLimitStore(RateLimitStore):
+    """Buckets in a SQLite file shared by every worker on the host.
+
+    Each take() is one short BEGIN IMMEDIATE transaction, so concurrent
+    workers never lose an update. A row is only needed until its bucket has
+    refilled (`full_at`); such rows are purged every `purge_every` writes.
+    """
+
+    def __init__(self, path, purge_every=1000):
+        self.path = path
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS buckets "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, rate, burst):
+        # Wall clock, not monotonic: the timestamps are compared across processes
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            allowed, tokens, retry_after = _take(tokens, updated, now, rate, burst)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)",
+                (key, tokens, now, now + (burst - tokens) / rate),
+            )
+            with self._lock:
+                self._writes += 1
+                purge = self._writes % self.purge_every == 0
+            if purge:
+                conn.execute("DELETE FROM buckets WHERE full_at <= ?", (now,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
+
+    def stats(self):
+        buckets = self._conn().execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+        return {'store': 'sqlite', 'path': self.path, 'buckets': buckets}
+
+
+def create_store(config):
+    """Build the store selected by Config.RATE_LIMIT_STORE ('local' or 'sqlite')."""
+    if config.RATE_LIMIT_STORE == 'sqlite':
+        return SQLiteRateLimitStore(config.RATE_LIMIT_SQLITE_PATH)
+    if config.RATE_LIMIT_STORE == 'local':
+        return LocalRateLimitStore()
+    raise ValueError(f"Unknown RATE_LIMIT_STORE: {config.RATE_LIMIT_STORE}")
+
+
+# ------------------------
+# Limiters
+# ------------------------
+class RateLimiter:
+    """A named token bucket limit: `burst` requests at once, `rate` per second after that.
+
+    A rate of 0 disables the limit.
+    """
+
+    def __init__(self, store, name, rate, burst):
+        self.store = store
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    def hit(self, key):
+        """Count one request for `key`; returns 0 if allowed, else seconds to wait."""
+        if self.rate <= 0:
+            return 0.0
+        # Client-supplied keys (usernames) are bounded before they reach the store
+        allowed, retry_after = self.store.take(f"{self.name}:{str(key)[:200]}", self.rate, self.burst)
+        with self._lock:
+            if allowed:
+                self.allowed += 1
+            else:
+                self.limited += 1
+        return 0.0 if allowed else retry_after
+
+    def stats(self):
+        with self._lock:
+            return {'rate': self.rate, 'burst': self.burst, 'allowed': self.allowed, 'limited': self.limited}
+
+
+def pool_busy(stats, reserve):
+    """Whether a connection pool's stats() leave no room for a sheddable request.
+
+    Busy once anyone waits for a connection or at most `reserve` are free.
+    Pools without a size limit (SQLite's) are never busy.
+    """
+    if stats.get('waiting'):
+        return True
+    max_size = stats.get('max_size')
+    return max_size is not None and max_size - stats['in_use'] <= reserve
+
+
+class ConcurrencyLimiter:
+    """Admit requests into slot() while `busy()` is false, and at most `limit` at once.
+
+    `busy` is polled every `poll` seconds until `timeout`; a limit of 0
+    means no fixed cap.
+    """
+
+    def __init__(self, limit, timeout=0.0, busy=None, poll=0.01):
+        self.limit = limit
+        self.timeout = timeout
+        self.busy = busy
+        self.poll = poll
+        self._slots = threading.BoundedSemaphore(limit) if limit > 0 else None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+        self.shed_busy = 0
+
+    def _wait_for_room(self, deadline):
+        while self.busy():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll)
+        return True
+
+    @contextmanager
+    def slot(self):
+        """Hold a slot for the duration of the block; raises Overloaded if none frees up in time."""
+        deadline = time.monotonic() + self.timeout
+        if self._slots is not None and not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.shed += 1
+            raise Overloaded("Too many requests in progress")
+        if self.busy is not None and not self._wait_for_room(deadline):
+            if self._slots is not None:
+                self._slots.release()
+            with self._lock:
+                self.shed += 1
+                self.shed_busy += 1
+            raise Overloaded("Connection pool is busy")
+        with self._lock:
+            self.in_flight += 1
+            self.admitted += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            if self._slots is not None:
+                self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {'limit': self.limit, 'timeout': self.timeout, 'in_flight': self.in_flight,
+                    'admitted': self.admitted, 'shed': self.shed, 'shed_pool_busy': self.shed_busy}
+
+
+def create_rate_limiters(config):
+    """The app's rate limits by name, sharing one store."""
+    store = create_store(config)
+    enabled = config.RATE_LIMIT_ENABLED
+    limits = {
+        'login_ip': (config.LOGIN_RATE_PER_IP, config.LOGIN_BURST_PER_IP),
+        'login_user': (config.LOGIN_RATE_PER_USER, config.LOGIN_BURST_PER_USER),
+        'admin_write': (config.ADMIN_WRITE_RATE, config.ADMIN_WRITE_BURST),
+    }
+    return {name: RateLimiter(store, name, rate if enabled else 0, burst)
+            for name, (rate, burst) in limits.items()}
+
+
+def create_concurrency_limiters(config, pool_stats=None):
+    """Per-process admission for logins and admin writes, by name.
+
+    `pool_stats` returns the connection pool's stats(); without it only the
+    fixed limits apply.
+    """
+    busy = None
+    if pool_stats is not None and config.ADMISSION_POOL_RESERVE >= 0:
+        def busy():
+            return pool_busy(pool_stats(), config.ADMISSION_POOL_RESERVE)
+    return {
+        'login': ConcurrencyLimiter(config.LOGIN_CONCURRENCY, config.ADMISSION_TIMEOUT, busy),
+        'admin_write': ConcurrencyLimiter(config.ADMIN_WRITE_CONCURRENCY, config.ADMISSION_TIMEOUT, busy),
+    }
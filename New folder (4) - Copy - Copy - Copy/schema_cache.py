@@ -0,0 +1,75 @@
+import threading
+import time
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY channel raised by the schema_changed_notify event trigger (migration 0003)
+# and by migrations.py after it applies migrations
+SCHEMA_CHANNEL = 'schema_changed'
+
+
+class SchemaCache:
+    """Process-wide map of table name -> column names for the public schema.
+
+    All tables are loaded with one catalog query; lookups are then dict
+    lookups. The map is reloaded when it is older than `ttl` seconds, when
+    invalidate() is called, or when a NOTIFY arrives on SCHEMA_CHANNEL.
+    """
+
+    def __init__(self, db, ttl=300.0, listen=True):
+        self.db = db
+        self.ttl = ttl
+        self.listen = listen
+        self._tables = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._subscribed = False
+        self.loads = 0
+
+    def columns(self, table_name):
+        """Lowercased column names of `table_name` (empty if it does not exist)."""
+        tables = self._tables
+        if tables is None or time.monotonic() - self._loaded_at > self.ttl:
+            tables = self.load()
+        return tables.get(table_name, frozenset())
+
+    def load(self):
+        """(Re)load every table's columns in a single query."""
+        with self._lock:
+            rows = self.db.load_table_columns()
+            tables = {}
+            for row in rows:
+                tables.setdefault(row['table_name'], set()).add(row['column_name'].lower())
+            self._tables = {name: frozenset(cols) for name, cols in tables.items()}
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+            if self.listen and not self._subscribed:
+                self._subscribe()
+            return self._tables
+
+    def invalidate(self):
+        self._tables = None
+
+    def _subscribe(self):
+        from notifications import get_listener
+        try:
+            get_listener().subscribe(SCHEMA_CHANNEL, self._on_notify)
+            self._subscribed = True
+        except Exception as e:
+            # TTL expiry still refreshes the cache
+            logger.warning(f"Could not LISTEN for schema changes: {e}")
+
+    def _on_notify(self, channel, payload):
+        logger.info(f"Schema changed ({payload or 'listener reconnected'}); reloading columns")
+        self.invalidate()
+
+    def stats(self):
+        return {
+            'tables': len(self._tables or ()),
+            'age_sec': round(time.monotonic() - self._loaded_at, 1) if self._tables is not None else None,
+            'ttl': self.ttl,
+            'loads': self.loads,
+            'listening': self._subscribed,
+        }
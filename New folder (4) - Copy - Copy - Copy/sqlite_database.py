@@ -0,0 +1,574 @@
+"""
+Embedded SQLite engine with the same interface as database.Database.
+
+Selected with DB_BACKEND=sqlite: one local file, no server and no network
+round trips, for edge deployments and fast CI benchmarks. The app's queries
+stay in the PostgreSQL dialect they are written in; each distinct SQL text
+is translated once (%s -> ?, `= ANY(%s)` -> `IN (...)`, LIKE with a
+backslash ESCAPE, casts dropped), and SQLite errors are re-raised as the
+matching psycopg2 exceptions, so views that catch
+psycopg2.errors.UniqueViolation run unchanged.
+
+The file is opened in WAL mode, so readers never block the writer, and each
+thread keeps its own connection open for reuse. The tables and the triggers
+behind table_versions and employee_stats are created on first use.
+
+PostgreSQL-only features have no SQLite counterpart: LISTEN/NOTIFY (the
+/events change feed, background jobs), read replicas and server-side
+prepared statements.
+"""
+
+import csv
+import datetime
+import logging
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import lru_cache
+
+import psycopg2
+import psycopg2.errors
+from psycopg2 import sql
+
+import metrics
+from database import BaseDatabase
+from schema_cache import SchemaCache
+from statements import Statement
+
+
+logger = logging.getLogger(__name__)
+
+# Same tables as the PostgreSQL schema, plus the trigger-maintained tables and
+# columns that migrations 0005 (employee_stats), 0006 (table_versions) and 0009
+# (users.row_version) add there
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(100) NOT NULL UNIQUE,
+    password VARCHAR(255) NOT NULL,
+    role VARCHAR(20) NOT NULL,
+    row_version INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS employees (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(100) NOT NULL,
+    email VARCHAR(100) NOT NULL UNIQUE,
+    department VARCHAR(50) NOT NULL,
+    salary DECIMAL(10,2) NOT NULL CHECK (salary > 0),
+    hire_date DATE DEFAULT CURRENT_DATE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    modified_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+INSERT OR IGNORE INTO table_versions (table_name) VALUES ('users'), ('employees');
+
+CREATE TABLE IF NOT EXISTS employee_stats (
+    department TEXT PRIMARY KEY,
+    employee_count INTEGER NOT NULL DEFAULT 0,
+    salary_sum DECIMAL NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+INSERT OR IGNORE INTO employee_stats (department, employee_count, salary_sum)
+SELECT COALESCE(department, ''), count(*), COALESCE(sum(salary), 0) FROM employees GROUP BY 1;
+
+CREATE TRIGGER IF NOT EXISTS employee_stats_insert AFTER INSERT ON employees BEGIN
+    INSERT INTO employee_stats (department, employee_count, salary_sum)
+    VALUES (COALESCE(NEW.department, ''), 1, NEW.salary)
+    ON CONFLICT (department) DO UPDATE SET
+        employee_count = employee_count + 1,
+        salary_sum = salary_sum + excluded.salary_sum,
+        updated_at = CURRENT_TIMESTAMP;
+END;
+CREATE TRIGGER IF NOT EXISTS employee_stats_delete AFTER DELETE ON employees BEGIN
+    UPDATE employee_stats
+    SET employee_count = employee_count - 1, salary_sum = salary_sum - OLD.salary,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE department = COALESCE(OLD.department, '');
+END;
+CREATE TRIGGER IF NOT EXISTS employee_stats_update AFTER UPDATE OF department, salary ON employees BEGIN
+    UPDATE employee_stats
+    SET employee_count = employee_count - 1, salary_sum = salary_sum - OLD.salary,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE department = COALESCE(OLD.department, '');
+    INSERT INTO employee_stats (department, employee_count, salary_sum)
+    VALUES (COALESCE(NEW.department, ''), 1, NEW.salary)
+    ON CONFLICT (department) DO UPDATE SET
+        employee_count = employee_count + 1,
+        salary_sum = salary_sum + excluded.salary_sum,
+        updated_at = CURRENT_TIMESTAMP;
+END;
+
+-- Migration 0009: per-row update counter (recursive triggers are off, so this fires once)
+CREATE TRIGGER IF NOT EXISTS users_row_version AFTER UPDATE OF username, password, role ON users BEGIN
+    UPDATE users SET row_version = OLD.row_version + 1 WHERE id = NEW.id;
+END;
+"""
+
+# table_versions is bumped by one trigger per table and operation
+for _table in ('users', 'employees'):
+    for _event in ('INSERT', 'UPDATE', 'DELETE'):
+        SCHEMA += (
+            f"CREATE TRIGGER IF NOT EXISTS {_table}_version_{_event.lower()} AFTER {_event} ON {_table} BEGIN\n"
+            f"    UPDATE table_versions SET version = version + 1, modified_at = CURRENT_TIMESTAMP\n"
+            f"    WHERE table_name = '{_table}';\n"
+            f"END;\n"
+        )
+
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+# ------------------------
+# Types
+# ------------------------
+def _timestamptz(value):
+    parsed = datetime.datetime.fromisoformat(value.decode())
+    # CURRENT_TIMESTAMP is UTC without an offset
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=datetime.timezone.utc)
+
+
+# Registered process-wide; they only apply to connections opened with PARSE_DECLTYPES
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime.date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('DECIMAL', lambda value: Decimal(value.decode()))
+sqlite3.register_converter('DATE', lambda value: datetime.date.fromisoformat(value.decode()))
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('TIMESTAMPTZ', _timestamptz)
+
+
+def _dict_row(cursor, row):
+    """Rows as plain dicts, like psycopg2's RealDictCursor."""
+    return dict(zip([column[0] for column in cursor.description], row))
+
+
+def _left(text, length):
+    """PostgreSQL's left() (LEFT is a keyword in SQLite, so queries call it pg_left)."""
+    return None if text is None else text[:length]
+
+
+# ------------------------
+# Dialect translation
+# ------------------------
+_PARAM, _ANY, _LIKE = object(), object(), object()
+
+# Spots where PostgreSQL/psycopg2 SQL differs from SQLite's
+_PARAM_RE = re.compile(r"=\s*ANY\s*\(\s*%s\s*\)|\bLIKE\s+%s(?!\s+ESCAPE)|%s|%%|::\w+(?:\[\])?", re.IGNORECASE)
+_CAST_RE = re.compile(r"::\w+(?:\[\])?")
+_LEFT_RE = re.compile(r"\bleft\s*\(", re.IGNORECASE)
+
+
+def _quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _literal(value):
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def render(query):
+    """SQL text of a string, Statement or psycopg2.sql composition (no connection needed)."""
+    if isinstance(query, str):
+        return query
+    if isinstance(query, bytes):
+        return query.decode('utf-8')
+    if isinstance(query, Statement):
+        return query.sql
+    if isinstance(query, sql.Composed):
+        return ''.join(render(part) for part in query.seq)
+    if isinstance(query, sql.SQL):
+        return query.string
+    if isinstance(query, sql.Identifier):
+        return '.'.join(_quote_identifier(name) for name in query.strings)
+    if isinstance(query, sql.Placeholder):
+        if query.name:
+            raise psycopg2.NotSupportedError("Named placeholders are not supported by the SQLite backend")
+        return '%s'
+    if isinstance(query, sql.Literal):
+        return _literal(query.wrapped)
+    raise TypeError(f"Cannot render {type(query).__name__} as SQL")
+
+
+@lru_cache(maxsize=1024)
+def _compile(text, with_params):
+    """Split PostgreSQL-dialect SQL into SQLite text and parameter slots."""
+    text = _LEFT_RE.sub('pg_left(', text)
+    if not with_params:
+        # psycopg2 leaves % alone when no parameters are passed
+        return (_CAST_RE.sub('', text),)
+    parts, position = [], 0
+    for match in _PARAM_RE.finditer(text):
+        parts.append(text[position:match.start()])
+        token = match.group(0)
+        if token == '%s':
+            parts.append(_PARAM)
+        elif token == '%%':
+            parts.append('%')
+        elif token.startswith('='):
+            parts.append(_ANY)
+        elif token[0] in 'Ll':
+            parts.append(_LIKE)
+        # ::casts are dropped; SQLite converts by column affinity
+        position = match.end()
+    parts.append(text[position:])
+    return tuple(part for part in parts if part != '')
+
+
+def translate(query, params=None):
+    """(SQLite SQL, parameters) for a query written for psycopg2."""
+    text = render(query)
+    parts = _compile(text, params is not None)
+    if params is None:
+        return parts[0] if parts else '', ()
+    out, args = [], []
+    values = iter(params)
+    for part in parts:
+        if part is _PARAM:
+            out.append('?')
+            args.append(next(values))
+        elif part is _LIKE:
+            # PostgreSQL's LIKE escapes with a backslash by default; SQLite's has no escape
+            out.append("LIKE ? ESCAPE '\\'")
+            args.append(next(values))
+        elif part is _ANY:
+            items = list(next(values))
+            out.append(f"IN ({', '.join('?' * len(items))})" if items else "IN (NULL)")
+            args.extend(items)
+        else:
+            out.append(part)
+    return ''.join(out), args
+
+
+def _translate_error(error):
+    """The psycopg2 exception the rest of the app expects for a sqlite3 error."""
+    message = str(error)
+    if isinstance(error, sqlite3.IntegrityError):
+        for prefix, cls in (('UNIQUE', psycopg2.errors.UniqueViolation),
+                            ('CHECK', psycopg2.errors.CheckViolation),
+                            ('NOT NULL', psycopg2.errors.NotNullViolation),
+                            ('FOREIGN KEY', psycopg2.errors.ForeignKeyViolation)):
+            if message.startswith(prefix):
+                return cls(message)
+        return psycopg2.IntegrityError(message)
+    if isinstance(error, sqlite3.OperationalError):
+        if message.startswith('no such table'):
+            return psycopg2.errors.UndefinedTable(message)
+        if message.startswith('no such column'):
+            return psycopg2.errors.UndefinedColumn(message)
+        if 'syntax error' in message:
+            return psycopg2.errors.SyntaxError(message)
+        if 'locked' in message or 'busy' in message:
+            return psycopg2.errors.LockNotAvailable(message)
+        return psycopg2.OperationalError(message)
+    if isinstance(error, (sqlite3.InterfaceError, sqlite3.ProgrammingError)):
+        return psycopg2.ProgrammingError(message)
+    if isinstance(error, sqlite3.DataError):
+        return psycopg2.DataError(message)
+    return psycopg2.DatabaseError(message)
+
+
+@contextmanager
+def _sqlite_errors():
+    try:
+        yield
+    except sqlite3.Error as e:
+        raise _translate_error(e) from e
+
+
+# ------------------------
+# Connections
+# ------------------------
+class ThreadConnections:
+    """Per-thread cache of open connections to one database file.
+
+    A thread opens its connection the first time it needs one and keeps
+    reusing it; connections of threads that have exited are closed the next
+    time a connection is opened.
+    """
+
+    def __init__(self, path, busy_timeout=5.0, synchronous='NORMAL', cache_size_kb=65536):
+        if synchronous not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"SQLITE_SYNCHRONOUS must be one of {', '.join(SYNCHRONOUS_LEVELS)}")
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.pragmas = (
+            "PRAGMA journal_mode=WAL",
+            f"PRAGMA synchronous={synchronous}",
+            f"PRAGMA cache_size=-{cache_size_kb}",
+            "PRAGMA temp_store=MEMORY",
+            "PRAGMA mmap_size=268435456",
+            "PRAGMA foreign_keys=ON",
+        )
+        self._local = threading.local()
+        self._connections = {}       # thread -> connection
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.closed = 0
+
+    def current(self):
+        """The current thread's connection if it has opened one, else None."""
+        return getattr(self._local, 'connection', None)
+
+    def get(self):
+        """The current thread's connection."""
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            conn = self.open()
+            self._local.connection = conn
+            with self._lock:
+                self._close_orphans()
+                self._connections[threading.current_thread()] = conn
+        return conn
+
+    def open(self):
+        """A new connection with the pragmas applied (owned by the caller)."""
+        with _sqlite_errors():
+            # isolation_level=None: autocommit unless a transaction is opened with BEGIN
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False,
+                                   cached_statements=256)
+            conn.row_factory = _dict_row
+            for pragma in self.pragmas:
+                conn.execute(pragma)
+            conn.create_function('pg_left', 2, _left, deterministic=True)
+        self.opened += 1
+        return conn
+
+    def _close_orphans(self):
+        for thread in [t for t in self._connections if not t.is_alive()]:
+            self._connections.pop(thread).close()
+            self.closed += 1
+
+    def closeall(self):
+        with self._lock:
+            for conn in self._connections.values():
+                conn.close()
+            self.closed += len(self._connections)
+            self._connections.clear()
+        self._local = threading.local()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._connections)
+            in_use = sum(1 for conn in self._connections.values() if conn.in_transaction)
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'size': size,
+            'in_use': in_use,
+            'idle': size - in_use,
+            'waiting': 0,
+            'opened': self.opened,
+            'closed': self.closed,
+        }
+
+
+# ------------------------
+# Engine
+# ------------------------
+_VALUES_RE = re.compile(r"\bVALUES\s+%s", re.IGNORECASE)
+_COPY_FROM_RE = re.compile(r"^\s*COPY\s+(.+?)\s*\((.*?)\)\s+FROM\s+STDIN\b(.*)$", re.IGNORECASE | re.DOTALL)
+
+
+class SQLiteDatabase(BaseDatabase):
+    """Database API over one SQLite file; see the module docstring."""
+
+    def __init__(self, path, pool=None, config=None):
+        super().__init__(config)
+        self.path = path
+        self.pool = pool or ThreadConnections(
+            path,
+            busy_timeout=self.config.SQLITE_BUSY_TIMEOUT,
+            synchronous=self.config.SQLITE_SYNCHRONOUS,
+            cache_size_kb=self.config.SQLITE_CACHE_SIZE_KB,
+        )
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        # Nothing to LISTEN to; the TTL alone refreshes the column cache
+        self.schema = SchemaCache(self, ttl=self.config.SCHEMA_CACHE_TTL, listen=False)
+
+    @property
+    def connection(self):
+        return self.pool.current()
+
+    def connect(self):
+        """The current thread's connection; creates the schema on first use."""
+        conn = self.pool.get()
+        if not self._schema_ready:
+            self.create_schema(conn)
+        return conn
+
+    def disconnect(self):
+        """End a transaction a handler left open; the connection stays cached."""
+        conn = self.connection
+        self._local.depth = 0
+        if conn is not None and conn.in_transaction:
+            conn.execute("ROLLBACK")
+
+    def create_schema(self, conn=None):
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            conn = conn or self.pool.get()
+            with _sqlite_errors():
+                columns = {row['name'] for row in conn.execute("PRAGMA table_info(users)")}
+                if columns and 'row_version' not in columns:
+                    # File created before users.row_version existed
+                    conn.execute("ALTER TABLE users ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1")
+                conn.executescript(SCHEMA)
+            self._schema_ready = True
+            logger.info(f"SQLite database ready at {self.path}")
+
+    def close(self):
+        self.pool.closeall()
+
+    @contextmanager
+    def transaction(self):
+        """Same contract as Database.transaction(); nested blocks join the outer one."""
+        if self.in_transaction:
+            self._local.depth += 1
+            try:
+                yield self
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self.connect()
+        with _sqlite_errors():
+            # IMMEDIATE takes the write lock up front, so two writers never
+            # deadlock trying to upgrade their read locks
+            conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield self
+            with _sqlite_errors():
+                conn.execute("COMMIT")
+            self._count_round_trips()
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._local.depth = 0
+
+    def load_table_columns(self):
+        return self.execute_query(
+            "SELECT m.name AS table_name, p.name AS column_name "
+            "FROM sqlite_master AS m JOIN pragma_table_info(m.name) AS p "
+            "WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'"
+        )
+
+    def execute_query(self, query, params=None, fetch=True):
+        """Same contract as Database.execute_query(); outside transaction() each statement commits."""
+        text, args = translate(query, params)
+        conn = self.connect()
+        self._count_round_trips()
+        started = time.perf_counter()
+        try:
+            with _sqlite_errors():
+                cursor = conn.execute(text, args)
+                # RETURNING rows must be read for the statement to finish
+                rows = cursor.fetchall() if cursor.description is not None else None
+        except psycopg2.Error as e:
+            self._log_query_error(e)
+            raise
+        finally:
+            metrics.record_query(time.perf_counter() - started, lambda: text)
+        if fetch and rows is not None:
+            return rows
+        return cursor.rowcount
+
+    def stream_query(self, query, params=None, chunk_size=2000):
+        """Yield the rows of a SELECT in lists of `chunk_size` rows.
+
+        Reads through a connection of its own, so the caller's thread can go
+        on writing while the generator is open (WAL keeps the read consistent).
+        """
+        text, args = translate(query, params)
+        self.connect()
+        conn = self.pool.open()
+        try:
+            started = time.perf_counter()
+            with _sqlite_errors():
+                cursor = conn.execute(text, args)
+            metrics.record_query(time.perf_counter() - started, lambda: text)
+            while True:
+                with _sqlite_errors():
+                    rows = cursor.fetchmany(chunk_size)
+                self._count_round_trips()
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+    def _execute_many(self, text, argslist):
+        """One executemany() for a statement run with many parameter sets."""
+        if not argslist:
+            return 0
+        parts = _compile(text, True)
+        with self.transaction():
+            conn = self.connection
+            self._count_round_trips()
+            started = time.perf_counter()
+            try:
+                with _sqlite_errors():
+                    if _ANY in parts:
+                        # Lists expand to a different number of placeholders per row
+                        return sum(conn.execute(*translate(text, args)).rowcount for args in argslist)
+                    sqlite_text, _ = translate(text, argslist[0])
+                    return conn.executemany(sqlite_text, argslist).rowcount
+            finally:
+                metrics.record_query(time.perf_counter() - started, lambda: text)
+
+    def execute_values(self, query, argslist, template=None, page_size=1000, fetch=False):
+        """Run an `INSERT ... VALUES %s` for many rows in one transaction.
+
+        With fetch=True each row is inserted on its own, so the RETURNING
+        rows come back in input order; otherwise it is one executemany().
+        """
+        if not argslist:
+            return [] if fetch else None
+        row_template = template or '(' + ', '.join(['%s'] * len(argslist[0])) + ')'
+        text = _VALUES_RE.sub(lambda _: 'VALUES ' + row_template, render(query), count=1)
+        if not fetch:
+            self._execute_many(text, argslist)
+            return None
+        with self.transaction():
+            return [row for args in argslist for row in self.execute_query(text, args)]
+
+    def execute_batch(self, query, argslist, page_size=1000):
+        """Run one statement for many parameter sets with executemany()."""
+        self._execute_many(render(query), argslist)
+
+    def copy_expert(self, query, file):
+        """Load `COPY table (cols) FROM STDIN WITH (FORMAT csv)` input with executemany().
+
+        As with PostgreSQL's CSV format, empty fields load as NULL.
+        """
+        match = _COPY_FROM_RE.match(render(query))
+        if not match or 'CSV' not in match.group(3).upper():
+            raise psycopg2.NotSupportedError("The SQLite backend only supports COPY ... FROM STDIN in CSV format")
+        table, columns, options = match.groups()
+        reader = csv.reader(file)
+        if 'HEADER' in options.upper():
+            next(reader, None)
+        rows = [[value if value != '' else None for value in row] for row in reader]
+        columns = [c.strip() for c in columns.split(',')]
+        insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        self._execute_many(insert, rows)
+        return len(rows)
@@ -0,0 +1,90 @@
+"""
+Registry of the fixed SQL statements the app runs on every request.
+
+Each statement is declared once with psycopg2-style %s placeholders and run
+through Database.execute_query() like any other query. The first time a
+pooled connection sees a statement it is PREPAREd there; from then on only
+`EXECUTE name(...)` is sent, so PostgreSQL skips parsing and, once it settles
+on a generic plan, planning.
+
+Set DB_PREPARED_STATEMENTS=False when connecting through a pooler that does
+not keep sessions (e.g. PgBouncer in transaction mode); the statements are
+then sent as plain text.
+"""
+
+import re
+
+from config import Config
+
+
+_PLACEHOLDER_RE = re.compile(r'%s')
+
+
+class Statement:
+    """One named SQL statement."""
+
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+        self.param_count = sql.count('%s')
+        # PREPARE uses $n parameters; EXECUTE passes values through psycopg2
+        counter = iter(range(1, self.param_count + 1))
+        self.prepare_sql = f"PREPARE {name} AS " + _PLACEHOLDER_RE.sub(lambda _: f"${next(counter)}", sql)
+        args = ', '.join(['%s'] * self.param_count)
+        self.execute_sql = f"EXECUTE {name}({args})" if args else f"EXECUTE {name}"
+
+    def as_string(self, context=None):
+        # Lets metrics/slow-query logging treat a Statement like a psycopg2.sql object
+        return self.sql
+
+    def __repr__(self):
+        return f"Statement({self.name!r})"
+
+
+class StatementRegistry:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._statements = {}
+
+    def register(self, name, sql):
+        if name in self._statements:
+            raise ValueError(f"Statement {name} is already registered")
+        statement = Statement(name, sql)
+        self._statements[name] = statement
+        return statement
+
+    def __getitem__(self, name):
+        return self._statements[name]
+
+    def __iter__(self):
+        return iter(self._statements.values())
+
+
+registry = StatementRegistry(enabled=Config().DB_PREPARED_STATEMENTS)
+
+USER_BY_USERNAME = registry.register(
+    'user_by_username', "SELECT id, username, role FROM users WHERE username = %s")
+USER_FOR_LOGIN = registry.register(
+    'user_for_login', "SELECT id, username, password, role FROM users WHERE username = %s LIMIT 1")
+USER_BY_ID = registry.register(
+    'user_by_id', "SELECT id, username, role FROM users WHERE id = %s")
+USER_PAGE = registry.register(
+    'user_page', "SELECT id, username, role FROM users WHERE id > %s ORDER BY id ASC LIMIT %s")
+# Same, with the row version the dashboards key their cached fragments on (migration 0009)
+USER_BY_USERNAME_VERSIONED = registry.register(
+    'user_by_username_versioned', "SELECT id, username, role, row_version FROM users WHERE username = %s")
+USER_PAGE_VERSIONED = registry.register(
+    'user_page_versioned',
+    "SELECT id, username, role, row_version FROM users WHERE id > %s ORDER BY id ASC LIMIT %s")
+INSERT_USER = registry.register(
+    'insert_user', "INSERT INTO users (username, password, role) VALUES (%s, %s, %s)")
+UPDATE_USER = registry.register(
+    'update_user', "UPDATE users SET username = %s, password = %s, role = %s WHERE id = %s")
+UPDATE_USER_KEEP_PASSWORD = registry.register(
+    'update_user_keep_password', "UPDATE users SET username = %s, role = %s WHERE id = %s")
+UPGRADE_PASSWORD = registry.register(
+    'upgrade_password', "UPDATE users SET password = %s WHERE id = %s AND password = %s")
+DELETE_USER = registry.register(
+    'delete_user', "DELETE FROM users WHERE id = %s")
+TABLE_VERSIONS = registry.register(
+    'table_versions', "SELECT table_name, version, modified_at FROM table_versions WHERE table_name = ANY(%s)")
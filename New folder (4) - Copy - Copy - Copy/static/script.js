@@ -20,9 +20,18 @@ function toast(message, type = 'ok') {
 
 async function fetchJSON(url, options) {
     options = Object.assign({}, options);
-    // By default, send same-origin credentials (cookies) so HttpOnly JWT cookie is included.
-    if (!options.credentials) options.credentials = 'same-origin';
+    // Always send the HttpOnly JWT cookie, also when apiBase points at another origin;
+    // employee writes need an admin token.
+    if (!options.credentials) options.credentials = 'include';
+    // A missing or expired token is answered with a redirect to /login; don't follow it
+    // (its HTML page would look like a successful empty response)
+    options.redirect = 'manual';
     const res = await fetch(url, options);
+    if (res.type === 'opaqueredirect') {
+        const err = new Error('Sign in as an admin to make changes');
+        err.status = 401;
+        throw err;
+    }
     const data = await res.json().catch(() => ({}));
     if (!res.ok) {
         const err = new Error(data.error || 'Request failed');
@@ -33,31 +42,51 @@ async function fetchJSON(url, options) {
     return data;
 }
 
-async function loadEmployees() {
-    const status = $('#list-status');
-    setStatus(status, 'Loading...');
+const PAGE_SIZE = 100;
+// Rows shown so far and the keyset cursor for the next page of the current search
+let loadedEmployees = [];
+let nextAfter = null;
+let searchSeq = 0;
+
+function searchUrl(after) {
+    const params = new URLSearchParams({ limit: PAGE_SIZE });
+    const q = (document.querySelector('#search')?.value || '').trim();
+    if (q) params.set('q', q);
+    if (after) params.set('after', after);
+    return `${apiBase}/employees/search?${params}`;
+}
+
+function loadMoreButton() {
+    let btn = document.querySelector('#load-more');
+    if (!btn) {
+        btn = document.createElement('button');
+        btn.id = 'load-more';
+        btn.type = 'button';
+        btn.textContent = 'Load more';
+        btn.addEventListener('click', () => loadEmployees(true));
+        $('#employees-table').after(btn);
+    }
+    return btn;
+}
+
+// Totals come from the server-maintained summary, not from the rows on screen
+async function loadStats() {
+    const fmt = (n) => n.toLocaleString(undefined, { maximumFractionDigits: 2 });
+    const setText = (id, val) => { const el = document.getElementById(id); if (el) el.textContent = val; };
     try {
-        const data = await fetchJSON(`${apiBase}/employees`);
-        const tbody = $('#employees-table tbody');
-        tbody.innerHTML = '';
-        const q = (document.querySelector('#search')?.value || '').toLowerCase();
-        const filtered = (data.data || []).filter(emp => {
-            const hay = [emp.name, emp.email, emp.department, emp.department_id].join(' ').toLowerCase();
-            return hay.includes(q);
-        });
-
-        // Stats
-        const total = filtered.length;
-        const avg = total ? (filtered.reduce((s, e) => s + (Number(e.salary) || 0), 0) / total) : 0;
-        const fmt = (n) => n.toLocaleString(undefined, { maximumFractionDigits: 2 });
-        const setText = (id, val) => { const el = document.getElementById(id); if (el) el.textContent = val; };
-        setText('total-count', fmt(total));
-        setText('avg-salary', total ? `$${fmt(avg)}` : '—');
+        const { data } = await fetchJSON(`${apiBase}/employees/stats`);
+        setText('total-count', fmt(data.count));
+        setText('avg-salary', data.average !== null ? `$${fmt(data.average)}` : '—');
         setText('last-refresh', new Date().toLocaleTimeString());
+    } catch (e) {
+        setText('avg-salary', '—');
+    }
+}
 
-        filtered.forEach(emp => {
-            const tr = document.createElement('tr');
-            tr.innerHTML = `
+function renderRow(emp) {
+    const tr = document.createElement('tr');
+    tr.dataset.id = emp.id;
+    tr.innerHTML = `
         <td>${emp.id}</td>
         <td>${emp.name}</td>
         <td>${emp.email}</td>
@@ -70,47 +99,110 @@ async function loadEmployees() {
           <button data-del="${emp.id}">Delete</button>
         </td>
       `;
-            tbody.appendChild(tr);
-        });
-
-        // Wire delete buttons
-        $$('#employees-table [data-del]').forEach(btn => {
-            btn.addEventListener('click', async () => {
-                const id = btn.getAttribute('data-del');
-                if (!confirm(`Delete employee #${id}?`)) return;
-                try {
-                    await fetchJSON(`${apiBase}/employees/${id}`, { method: 'DELETE' });
-                    await loadEmployees();
-                    toast('Deleted');
-                } catch (e) {
-                    toast(e.message, 'err');
-                }
-            });
-        });
-
-        // Wire save buttons (inline salary update)
-        $$('#employees-table [data-save]').forEach(btn => {
-            btn.addEventListener('click', async () => {
-                const id = btn.getAttribute('data-save');
-                const tr = btn.closest('tr');
-                const salaryInput = tr.querySelector('.inline-salary');
-                const newSalary = Number(salaryInput.value);
-                if (!(newSalary > 0)) { toast('Enter valid salary', 'err'); return; }
-                try {
-                    await fetchJSON(`${apiBase}/employees/${id}`, {
-                        method: 'PUT',
-                        headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify({ salary: newSalary })
-                    });
-                    toast('Saved');
-                    await loadEmployees();
-                } catch (e) {
-                    toast(e.message, 'err');
-                }
-            });
-        });
+    return tr;
+}
 
-        setStatus(status, `Loaded ${data.count} employees`, 'ok');
+// Save/Delete clicks are handled once on the tbody, so rows can be added and replaced freely
+function wireRowActions() {
+    $('#employees-table tbody').addEventListener('click', async (e) => {
+        const del = e.target.closest('[data-del]');
+        const save = e.target.closest('[data-save]');
+        if (del) {
+            const id = del.getAttribute('data-del');
+            if (!confirm(`Delete employee #${id}?`)) return;
+            try {
+                await fetchJSON(`${apiBase}/employees/${id}`, { method: 'DELETE' });
+                if (!feedLive) await loadEmployees();
+                toast('Deleted');
+            } catch (err) {
+                toast(err.message, 'err');
+            }
+        } else if (save) {
+            const id = save.getAttribute('data-save');
+            const salaryInput = save.closest('tr').querySelector('.inline-salary');
+            const newSalary = Number(salaryInput.value);
+            if (!(newSalary > 0)) { toast('Enter valid salary', 'err'); return; }
+            try {
+                await fetchJSON(`${apiBase}/employees/${id}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ salary: newSalary })
+                });
+                toast('Saved');
+                if (!feedLive) await loadEmployees();
+            } catch (err) {
+                toast(err.message, 'err');
+            }
+        }
+    });
+}
+
+// ------------------------
+// Live updates: row deltas pushed over /events (Server-Sent Events)
+// ------------------------
+let feedLive = false;
+let statsTimer = null;
+
+function applyChange(change) {
+    if (change.op === 'reload') { loadEmployees(); return; }
+    if (change.table !== 'employees') return;
+    const tbody = $('#employees-table tbody');
+    const existing = tbody.querySelector(`tr[data-id="${change.id}"]`);
+    const searching = (document.querySelector('#search')?.value || '').trim() !== '';
+    if (change.op === 'DELETE') {
+        if (existing) existing.remove();
+        loadedEmployees = loadedEmployees.filter(e => e.id !== change.id);
+    } else if (existing) {
+        // Leave a row alone while its salary is being edited
+        if (!existing.contains(document.activeElement)) existing.replaceWith(renderRow(change.row));
+        loadedEmployees = loadedEmployees.map(e => e.id === change.id ? change.row : e);
+    } else if (change.op === 'INSERT' && !nextAfter && !searching) {
+        // New ids sort last, so the row belongs on screen only once the last page is loaded
+        tbody.appendChild(renderRow(change.row));
+        loadedEmployees.push(change.row);
+    }
+    // Coalesce bursts of changes into one stats request
+    clearTimeout(statsTimer);
+    statsTimer = setTimeout(loadStats, 500);
+}
+
+function connectFeed() {
+    if (!window.EventSource) return;
+    const source = new EventSource(`${apiBase}/events?tables=employees`);
+    // Saves stop reloading the list only once an event has actually arrived: an open stream
+    // alone does not prove changes are delivered. EventSource reconnects by itself (sending
+    // Last-Event-ID) and gives up on a 503; until the next event saves reload the list again
+    source.addEventListener('error', () => { feedLive = false; });
+    source.addEventListener('change', (e) => {
+        feedLive = true;
+        applyChange(JSON.parse(e.data));
+    });
+}
+
+async function loadEmployees(append = false) {
+    const status = $('#list-status');
+    setStatus(status, 'Loading...');
+    if (!append) loadStats();
+    // Searching is done server-side; drop responses that a newer search has overtaken
+    const seq = ++searchSeq;
+    try {
+        const data = await fetchJSON(searchUrl(append ? nextAfter : null));
+        if (seq !== searchSeq) return;
+        const tbody = $('#employees-table tbody');
+        if (!append) {
+            tbody.innerHTML = '';
+            loadedEmployees = [];
+        }
+        const page = data.data || [];
+        loadedEmployees = loadedEmployees.concat(page);
+        nextAfter = data.next_after;
+        loadMoreButton().hidden = !nextAfter;
+
+        const total = loadedEmployees.length;
+
+        page.forEach(emp => tbody.appendChild(renderRow(emp)));
+
+        setStatus(status, `Loaded ${total} employees${nextAfter ? ' (more available)' : ''}`, 'ok');
     } catch (e) {
         setStatus(status, e.message, 'err');
     }
@@ -142,7 +234,7 @@ function wireCreateForm() {
             setStatus(status, 'Employee created', 'ok');
             toast('Employee created');
             form.reset();
-            await loadEmployees();
+            if (!feedLive) await loadEmployees();
         } catch (e) {
             setStatus(status, e.message + (e.details ? `: ${e.details.join(', ')}` : ''), 'err');
             toast(e.message, 'err');
@@ -174,7 +266,7 @@ function wireUpdateForm() {
             });
             setStatus(status, 'Employee updated', 'ok');
             toast('Employee updated');
-            await loadEmployees();
+            if (!feedLive) await loadEmployees();
         } catch (e) {
             setStatus(status, e.message + (e.details ? `: ${e.details.join(', ')}` : ''), 'err');
             toast(e.message, 'err');
@@ -183,12 +275,19 @@ function wireUpdateForm() {
 }
 
 document.addEventListener('DOMContentLoaded', () => {
-    $('#refresh-btn').addEventListener('click', loadEmployees);
+    $('#refresh-btn').addEventListener('click', () => loadEmployees());
     const s = document.querySelector('#search');
-    if (s) s.addEventListener('input', () => loadEmployees());
+    // Debounced so typing sends one request per pause, not per keystroke
+    let searchTimer = null;
+    if (s) s.addEventListener('input', () => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => loadEmployees(), 250);
+    });
     wireCreateForm();
     wireUpdateForm();
+    wireRowActions();
     loadEmployees();
+    connectFeed();
 
     // Modal logic
     const modal = document.getElementById('modal');
@@ -222,7 +321,7 @@ document.addEventListener('DOMContentLoaded', () => {
             });
             toast('Employee created');
             closeModal();
-            await loadEmployees();
+            if (!feedLive) await loadEmployees();
         } catch (e) {
             toast(e.message, 'err');
         }